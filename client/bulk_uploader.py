@@ -0,0 +1,309 @@
+"""
+bulk_uploader.py - Subida masiva de contactos a /import
+
+Recibe las filas de un archivo ya leído (cualquier iterable, sin cargarlo
+entero) y las envía en lotes de tamaño fijo, comprimidos con gzip, sobre
+una sola requests.Session con pool de conexiones. Hasta `max_workers`
+lotes viajan en paralelo; los fallos transitorios (red, 502/503/504) se
+reintentan con espera exponencial. Un 500 no se reintenta: /import no es
+idempotente y el lote pudo quedar guardado.
+
+/import acepta IMPORT_RATE_LIMIT_PER_MINUTE (10) lotes por minuto, así que
+desde ASYNC_MIN_ROWS filas el archivo se sube como un solo job ?async=1
+(NDJSON en gzip) y se sigue su progreso en /import/jobs/<id>. Las esperas
+por 429 respetan Retry-After y no cuentan como reintentos.
+
+Los teléfonos se validan antes de enviar con las mismas reglas que el
+servidor (phone_utils.normalize_phones); las filas rechazadas, aquí o en
+el servidor, quedan en el informe final con su número de fila del archivo.
+"""
+import gzip
+import json
+import logging
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain, islice
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from phone_utils import normalize_phones
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_WORKERS = 3
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+GZIP_LEVEL = 5
+RETRY_STATUS = {502, 503, 504}  # Solo errores de proxy/disponibilidad: el lote no se procesó
+RATE_LIMIT_MAX_WAIT_SECONDS = 900  # Espera total por 429 antes de abandonar un envío
+ASYNC_MIN_ROWS = 10 * BATCH_SIZE  # Desde aquí un solo job ?async=1 en vez de lotes
+JOB_POLL_SECONDS = 2
+
+_SERVER_ROW = re.compile(r'^Row (\d+): ')
+
+
+class UploadReport:
+    """Resultado acumulado de una subida (se actualiza desde varios hilos)"""
+
+    def __init__(self, total_rows=None):
+        self.total_rows = total_rows
+        self.processed_rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates_merged = 0
+        self.errors = []  # "Fila N: mensaje" (N = fila del archivo, desde 1)
+        self.unlisted_errors = 0  # Errores que el servidor contó pero no guardó (jobs)
+        self.failed_batches = 0
+        self.lock = threading.Lock()
+
+    def add_errors(self, messages):
+        with self.lock:
+            self.errors.extend(messages)
+
+    def summary_text(self, max_errors=15):
+        """Texto para el diálogo final"""
+        lines = [
+            f"Nuevos: {self.inserted}",
+            f"Actualizados: {self.updated} ({self.duplicates_merged} duplicados)",
+            f"Errores: {len(self.errors) + self.unlisted_errors}",
+        ]
+        if self.failed_batches:
+            lines.append(f"Lotes no enviados: {self.failed_batches}")
+        if self.errors:
+            lines.append('')
+            lines.extend(sorted(self.errors, key=_error_row)[:max_errors])
+            hidden = len(self.errors) + self.unlisted_errors - max_errors
+            if hidden > 0:
+                lines.append(f"... y {hidden} más")
+        return '\n'.join(lines)
+
+    def write_errors(self, path):
+        """Guardar todos los errores (uno por línea) en `path`"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(sorted(self.errors, key=_error_row)) + '\n')
+
+
+def _error_row(message):
+    match = re.match(r'^Fila (\d+):', message)
+    return int(match.group(1)) if match else 0
+
+
+class BulkUploader:
+    """Envía filas de contactos a POST /import en lotes gzip paralelos o como un job asíncrono"""
+
+    def __init__(self, server_url, headers, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, timeout=120, async_min_rows=ASYNC_MIN_ROWS):
+        self.server_url = server_url.rstrip('/')
+        self.url = f"{self.server_url}/import"
+        self.auth_headers = dict(headers)
+        self.headers = {
+            **headers,
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+        }
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.async_min_rows = async_min_rows
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def upload(self, rows, total_rows=None, progress=None):
+        """
+        Subir `rows` (iterable de dicts). `progress(processed, total)` se
+        llama desde los hilos de envío tras cada lote (o cada consulta del
+        job). Sin `total_rows` se leen hasta async_min_rows filas para
+        decidir entre lotes y job. Retorna UploadReport.
+        """
+        report = UploadReport(total_rows)
+        rows = iter(rows)
+        if total_rows is None:
+            head = list(islice(rows, self.async_min_rows))
+            use_job = len(head) >= self.async_min_rows
+            rows = chain(head, rows)
+        else:
+            use_job = total_rows >= self.async_min_rows
+
+        if use_job:
+            self._upload_job(rows, report, progress)
+        else:
+            self._upload_batches(rows, report, progress)
+        self.session.close()
+        logger.info(
+            f"📥 Subida terminada: {report.inserted} nuevos, {report.updated} actualizados, "
+            f"{len(report.errors) + report.unlisted_errors} errores"
+        )
+        return report
+
+    def _upload_batches(self, rows, report, progress):
+        """Lotes de batch_size filas, hasta max_workers en paralelo"""
+        offset = 0
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                # No leer más del archivo de lo que se puede enviar
+                if len(pending) >= self.max_workers * 2:
+                    _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                pending.add(executor.submit(self._upload_batch, offset, batch, report, progress))
+                offset += len(batch)
+            wait(pending)
+
+    def _upload_job(self, rows, report, progress):
+        """
+        Todas las filas en un job ?async=1: NDJSON en gzip a un archivo
+        temporal (reenviable si hay que reintentar) y consulta del progreso
+        hasta que termina. Los teléfonos los valida el servidor, así sus
+        "Row N" son las filas del archivo.
+        """
+        headers = {**self.headers, 'Content-Type': 'application/x-ndjson'}
+        try:
+            with tempfile.TemporaryFile() as spool:
+                with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=GZIP_LEVEL) as body:
+                    for row in rows:
+                        body.write(json.dumps(row, default=str).encode('utf-8') + b'\n')
+                job = self._send('POST', self.url, data=spool, headers=headers, params={'async': '1'})
+            logger.info(f"📥 Importación encolada como job {job['job_id']}")
+
+            status_url = f"{self.server_url}{job['status_url']}"
+            while job['status'] not in ('done', 'failed'):
+                time.sleep(JOB_POLL_SECONDS)
+                job = self._send('GET', status_url, headers=self.auth_headers)
+                report.processed_rows = job['rows_done']
+                if progress:
+                    progress(job['rows_done'], report.total_rows or job['total_rows'])
+        except Exception as e:
+            logger.error(f"Importación asíncrona no completada: {e}")
+            report.add_errors([f"Archivo no importado ({e})"])
+            report.failed_batches += 1
+            return
+
+        report.inserted = job['inserted']
+        report.updated = job['updated']
+        report.duplicates_merged = job['duplicates_merged']
+        errors = []
+        for message in job['errors']:
+            match = _SERVER_ROW.match(message)
+            errors.append(f"Fila {int(match.group(1)) + 1}: {message[match.end():]}" if match else message)
+        report.add_errors(errors)
+        report.unlisted_errors = max(job['error_count'] - len(errors), 0)
+        if job['status'] == 'failed':
+            report.add_errors([f"Importación interrumpida en la fila {job['rows_done'] + 1}: {job['error']}"])
+            report.failed_batches += 1
+
+    def _upload_batch(self, offset, batch, report, progress):
+        """Validar teléfonos, enviar el lote y acumular el resultado"""
+        phones = [str(c.get('phone', '')).strip() if isinstance(c, dict) else '' for c in batch]
+        ids, phone_errors = normalize_phones(phones)
+        valid = []
+        positions = []  # Índice en el lote enviado -> fila del archivo (desde 1)
+        local_errors = []
+        for i, (row, cid, error) in enumerate(zip(batch, ids, phone_errors)):
+            if cid:
+                valid.append(row)
+                positions.append(offset + i + 1)
+            else:
+                local_errors.append(f"Fila {offset + i + 1}: {error}")
+        report.add_errors(local_errors)
+
+        if valid:
+            try:
+                result = self._post(valid)
+                server_errors = []
+                for message in result.get('errors', []):
+                    match = _SERVER_ROW.match(message)
+                    if match and int(match.group(1)) < len(positions):
+                        message = f"Fila {positions[int(match.group(1))]}: {message[match.end():]}"
+                    server_errors.append(message)
+                report.add_errors(server_errors)
+                with report.lock:
+                    report.inserted += result.get('inserted', 0)
+                    report.updated += result.get('updated', 0)
+                    report.duplicates_merged += result.get('duplicates_merged', 0)
+            except Exception as e:
+                logger.error(f"Lote en fila {offset + 1} no enviado: {e}")
+                report.add_errors([f"Filas {offset + 1}-{offset + len(batch)}: no enviadas ({e})"])
+                with report.lock:
+                    report.failed_batches += 1
+
+        with report.lock:
+            report.processed_rows += len(batch)
+            processed = report.processed_rows
+        if progress:
+            progress(processed, report.total_rows)
+
+    def _post(self, rows):
+        """POST de un lote con reintentos; retorna el JSON de la respuesta"""
+        body = gzip.compress(json.dumps(rows, default=str).encode('utf-8'), compresslevel=GZIP_LEVEL)
+        return self._send('POST', self.url, data=body, headers=self.headers)
+
+    def _send(self, method, url, data=None, **kwargs):
+        """
+        Request con reintentos (red y RETRY_STATUS, hasta max_retries) y
+        esperas por 429 que no cuentan como reintento; retorna el JSON.
+        `data` puede ser un archivo: se rebobina en cada intento.
+        """
+        attempt = 0
+        throttled = 0
+        rate_limited = 0.0
+        while True:
+            if hasattr(data, 'seek'):
+                data.seek(0)
+            try:
+                response = self.session.request(method, url, data=data, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                logger.warning(f"Error de red ({e}); reintento en {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 429 and rate_limited < RATE_LIMIT_MAX_WAIT_SECONDS:
+                # El límite por minuto se libera solo: esperar no es un fallo del lote
+                delay = self._backoff(throttled, response.headers.get('Retry-After'))
+                throttled += 1
+                rate_limited += delay
+                logger.warning(f"{url} respondió 429; esperando {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                attempt += 1
+                logger.warning(f"{url} respondió {response.status_code}; reintento en {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code >= 400:
+                try:
+                    message = response.json().get('error', response.text)
+                except ValueError:
+                    message = response.text
+                raise RuntimeError(f"HTTP {response.status_code}: {message}")
+            return response.json()
+
+    @staticmethod
+    def _backoff(attempt, retry_after=None):
+        """Segundos de espera: Retry-After si viene, si no exponencial con jitter"""
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        delay = min(BACKOFF_BASE_SECONDS * (2 ** attempt), BACKOFF_MAX_SECONDS)
+        return delay * (0.5 + random.random() / 2)
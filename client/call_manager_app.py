@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+﻿#!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
 CallManager v2.0 - Versión Corregida
@@ -20,10 +20,13 @@ from pathlib import Path
 # Agregar directorios al path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 ui_dir = os.path.join(current_dir, 'ui')
+root_dir = os.path.dirname(current_dir)  # Módulos compartidos con el servidor (phone_utils)
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 if ui_dir not in sys.path:
     sys.path.insert(0, ui_dir)
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
 
 # Importar desde config
 try:
@@ -56,6 +59,12 @@ try:
 except:
     tracking_available = False
 
+# Sesión HTTP con GET condicional (ETag / If-None-Match)
+from http_cache import get_http_session
+from bulk_uploader import BulkUploader
+from spreadsheet_reader import open_import_file
+from contact_export import export_contacts
+
 # Importar Dashboard de Métricas
 try:
     from ui.metrics_dashboard import MetricsDashboard
@@ -88,6 +97,10 @@ COLOR_CARD = "#2d2d44"
 COLOR_TEXT = "#ffffff"
 COLOR_TEXT_SECONDARY = "#cccccc"
 
+# Búsqueda remota (/contacts/search): mínimo de caracteres y espera tras la última tecla
+SEARCH_REMOTE_MIN_CHARS = 3
+SEARCH_DEBOUNCE_MS = 300
+
 # Configuración
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -143,11 +156,12 @@ class ModernContactCard(ctk.CTkFrame):
         )
         phone.pack(anchor='w', pady=(0, 4))
         
-        # Notas si existen
-        if contact.get('notes'):
+        # Notas si existen (la lista recibe note_preview; los eventos en vivo traen note)
+        note = contact.get('note_preview') or contact.get('note')
+        if note:
             notes = ctk.CTkLabel(
                 main,
-                text=f"📝 {contact.get('notes', '')[:60]}...",
+                text=f"📝 {note[:60]}...",
                 font=("Segoe UI", 9),
                 text_color=COLOR_TEXT_SECONDARY,
                 wraplength=300
@@ -414,6 +428,12 @@ class CallManagerApp(ctk.CTk):
         # Datos
         self.contacts = {}
         self.filtered_contacts = []
+        self.server_seq = None  # Secuencia del servidor de la última sincronización (delta sync)
+        self._sync_lock = threading.Lock()
+        self._resync_pending = False  # Hay una sincronización pedida por un salto de versión
+        self.http = get_http_session()  # Revalida los GET con ETag
+        self._search_after_id = None
+        self._search_token = 0
         self.generator_window = None
         
         # InterPhone
@@ -627,12 +647,22 @@ class CallManagerApp(ctk.CTk):
             logger.warning('❌ Desconectado de Socket.IO')
             self.status_bar.set_connected(False)
 
-        @self.sio.on('contact_updated')
-        def on_contact_updated(data):
-            logger.debug(f"Contacto actualizado: {data.get('id')}")
-            if 'contact' in data:
-                contact = data['contact']
-                self.contacts[contact['id']] = contact
+        @self.sio.on('contacts_patched')
+        def on_contacts_patched(data):
+            patches = data.get('patches', [])
+            logger.debug(f"Contactos modificados: {len(patches)}")
+            gap = False
+            for patch in patches:
+                contact = self.contacts.get(patch['id'])
+                version = contact.get('version', 1) if contact else None
+                if contact is None or version < patch['from_version']:
+                    gap = True  # Contacto nuevo o cambio perdido: pedir el estado al servidor
+                elif version < patch['version']:
+                    contact.update(patch['fields'])
+                    contact['version'] = patch['version']
+                # version >= patch['version']: ya aplicado (llegó por una sincronización)
+            if gap:
+                self._request_resync()
             self.after(0, self.render_contacts)
 
         @self.sio.on('contact_deleted')
@@ -643,6 +673,15 @@ class CallManagerApp(ctk.CTk):
                 del self.contacts[contact_id]
             self.after(0, self.render_contacts)
 
+        @self.sio.on('contacts_aged')
+        def on_contacts_aged(data):
+            logger.debug(f"Estados por visibilidad actualizados: {data.get('count')} contactos")
+            for status, ids in data.get('changes', {}).items():
+                for contact_id in ids:
+                    if contact_id in self.contacts:
+                        self.contacts[contact_id]['status'] = status
+            self.after(0, self.render_contacts)
+
         # Intentar conectar en thread para no bloquear UI
         threading.Thread(target=self._connect_socket, daemon=True).start()
     
@@ -659,23 +698,32 @@ class CallManagerApp(ctk.CTk):
             logger.warning(f"Socket.IO no disponible: {e}")
             self.after(0, lambda: self.status_bar.set_connected(False))
     
+    def _request_resync(self):
+        """Sincronizar en background (delta sync) sin encolar más de una a la vez"""
+        if self._resync_pending or self.server_seq is None:
+            return
+        self._resync_pending = True
+        
+        def resync():
+            self._resync_pending = False  # Un salto durante la sincronización pide otra
+            self.load_contacts()
+        
+        threading.Thread(target=resync, daemon=True).start()
+    
     def load_contacts(self):
-        """Cargar contactos desde API o JSON local"""
+        """Cargar contactos desde API (incremental tras la primera carga) o JSON local"""
         try:
             # Intentar cargar desde API
             try:
-                response = requests.get(
-                    f'{SERVER_URL}/contacts',
-                    headers=self.headers,
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    self.contacts = {c['id']: c for c in data}
-                    logger.info(f"✅ {len(self.contacts)} contactos cargados desde API")
-                else:
-                    raise Exception("Error de API")
+                with self._sync_lock:
+                    if self.server_seq is None or not self._sync_contact_changes():
+                        self._load_all_contacts()
             except:
+                if self.server_seq is not None:
+                    # Ya hay datos del servidor: conservarlos hasta la próxima sincronización
+                    logger.warning("⚠️ No se pudo sincronizar contactos con el servidor")
+                    return
+                
                 # Fallback a JSON local
                 contacts_file = Path(__file__).parent.parent / 'demo_contacts.json'
                 
@@ -705,6 +753,67 @@ class CallManagerApp(ctk.CTk):
             logger.error(f"Error cargando contactos: {e}")
             self.after(0, lambda: messagebox.showerror("Error", f"No se pudieron cargar los contactos:\n{e}"))
     
+    def _load_all_contacts(self):
+        """Carga completa paginada desde GET /contacts"""
+        contacts = {}
+        server_seq = None
+        cursor = None
+        while True:
+            params = {'view': 'summary', 'cursor': cursor} if cursor else {'view': 'summary'}
+            response = self.http.get(
+                f'{SERVER_URL}/contacts',
+                params=params,
+                headers=self.headers,
+                timeout=5
+            )
+            if response.status_code != 200:
+                raise Exception("Error de API")
+            page = response.json()
+            if server_seq is None:
+                # La secuencia de la primera página cubre los cambios durante la paginación
+                server_seq = page.get('server_seq')
+            for c in page['items']:
+                contacts[c['id']] = c
+            cursor = page.get('next_cursor')
+            if not cursor:
+                break
+        self.contacts = contacts
+        self.server_seq = server_seq
+        logger.info(f"✅ {len(self.contacts)} contactos cargados desde API")
+    
+    def _sync_contact_changes(self):
+        """
+        Sincronización incremental con GET /contacts/changes.
+        Retorna False si el servidor pide recarga completa.
+        """
+        response = self.http.get(
+            f'{SERVER_URL}/contacts/changes',
+            params={'since': self.server_seq, 'view': 'summary'},
+            headers=self.headers,
+            timeout=5
+        )
+        if response.status_code != 200:
+            raise Exception("Error de API")
+        data = response.json()
+        if data.get('resync_required'):
+            logger.info("🔄 Delta sync no disponible, recargando todos los contactos")
+            return False
+        
+        for contact_id in data['deletes']:
+            self.contacts.pop(contact_id, None)
+        for c in data['upserts']:
+            self.contacts[c['id']] = c
+        
+        if data['upserts']:
+            # Mantener el mismo orden que el servidor (priority, updated_at, id)
+            self.contacts = dict(sorted(
+                self.contacts.items(),
+                key=lambda item: (item[1].get('priority', 999), item[1].get('updated_at') or '', str(item[0]))
+            ))
+        self.server_seq = data['server_seq']
+        logger.info(f"✅ Delta sync: {len(data['upserts'])} actualizados, {len(data['deletes'])} borrados")
+        return True
+    
     def render_contacts(self):
         """Renderizar lista de contactos"""
         try:
@@ -738,7 +847,12 @@ class CallManagerApp(ctk.CTk):
             logger.error(f"Error renderizando: {e}")
     
     def filter_contacts(self, query):
-        """Filtrar contactos por búsqueda"""
+        """
+        Filtrar contactos por búsqueda. El filtro local es inmediato; con
+        SEARCH_REMOTE_MIN_CHARS o más caracteres se consulta además
+        /contacts/search (con debounce) para encontrar contactos no cargados.
+        """
+        raw_query = query.strip()
         query = query.lower()
         self.filtered_contacts = {
             cid: c for cid, c in self.contacts.items()
@@ -746,6 +860,45 @@ class CallManagerApp(ctk.CTk):
         }
         self.render_contacts()
         self.status_bar.update_status(True, len(self.filtered_contacts if query else self.contacts))
+        
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+            self._search_after_id = None
+        self._search_token += 1
+        if len(raw_query) >= SEARCH_REMOTE_MIN_CHARS and self.server_seq is not None:
+            token = self._search_token
+            self._search_after_id = self.after(
+                SEARCH_DEBOUNCE_MS, lambda: self._start_remote_search(raw_query, token)
+            )
+    
+    def _start_remote_search(self, query, token):
+        """Lanzar la búsqueda remota al vencer el debounce"""
+        self._search_after_id = None
+        threading.Thread(target=self._remote_search, args=(query, token), daemon=True).start()
+    
+    def _remote_search(self, query, token):
+        """Buscar en el servidor (FTS) y mostrar resultados si siguen vigentes"""
+        try:
+            response = self.http.get(
+                f'{SERVER_URL}/contacts/search',
+                params={'q': query, 'view': 'summary'},
+                headers=self.headers,
+                timeout=5
+            )
+            if response.status_code != 200:
+                return
+            results = {c['id']: c for c in response.json()['items']}
+        except Exception as e:
+            logger.warning(f"Búsqueda remota falló, se mantiene el filtro local: {e}")
+            return
+        
+        def apply():
+            if token != self._search_token:
+                return  # El usuario siguió escribiendo
+            self.filtered_contacts = results
+            self.render_contacts()
+            self.status_bar.update_status(True, len(results))
+        self.after(0, apply)
     
     def show_provider_menu(self):
         """Muestra menú de selección de proveedor de llamadas"""
@@ -918,9 +1071,37 @@ class CallManagerApp(ctk.CTk):
             logger.error(f'Error en llamada: {e}')
             messagebox.showerror('Error', f'Error en la llamada: {e}')
     
+    def _fetch_contact_details(self, contact):
+        """
+        La lista trae la vista resumida: pedir el contacto completo
+        (GET /contacts/<id>) antes de editar. Retorna None si falla: el
+        resumen no trae la nota y guardarlo la borraría.
+        """
+        try:
+            response = self.http.get(
+                f"{SERVER_URL}/contacts/{contact.get('id')}",
+                headers=self.headers,
+                timeout=5
+            )
+            if response.status_code == 200:
+                return response.json()
+            logger.warning(f"Detalle del contacto {contact.get('id')}: HTTP {response.status_code}")
+        except Exception as e:
+            logger.warning(f"No se pudo obtener el detalle del contacto {contact.get('id')}: {e}")
+        return None
+    
     def edit_contact(self, contact):
         """Editar contacto con diálogo"""
         try:
+            details = self._fetch_contact_details(contact)
+            if details is None:
+                messagebox.showerror(
+                    'Error',
+                    f"No se pudo cargar {contact.get('name')} desde el servidor.\nIntente editarlo de nuevo."
+                )
+                return
+            contact = details
+            
             # Crear ventana de edición
             edit_window = ctk.CTkToplevel(self)
             edit_window.title(f"Editar: {contact.get('name')}")
@@ -945,6 +1126,7 @@ class CallManagerApp(ctk.CTk):
             ctk.CTkLabel(main_frame, text="Teléfono:", font=("Segoe UI", 12, "bold")).pack(anchor='w', pady=(10, 0))
             entry_phone = ctk.CTkEntry(main_frame, placeholder_text="Número telefónico")
             entry_phone.insert(0, contact.get('phone', ''))
+            entry_phone.configure(state='disabled')  # El teléfono es el id del contacto
             entry_phone.pack(fill='x', pady=(5, 10))
             
             # Estado
@@ -961,7 +1143,7 @@ class CallManagerApp(ctk.CTk):
             ctk.CTkLabel(main_frame, text="Notas:", font=("Segoe UI", 12, "bold")).pack(anchor='w', pady=(10, 0))
             text_notes = ctk.CTkTextbox(main_frame, height=150, font=("Segoe UI", 11))
             text_notes.pack(fill='both', expand=True, pady=(5, 10))
-            text_notes.insert('1.0', contact.get('notes', ''))
+            text_notes.insert('1.0', contact.get('note') or contact.get('notes', ''))
             
             # Botones
             button_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
@@ -970,12 +1152,14 @@ class CallManagerApp(ctk.CTk):
             def save_changes():
                 """Guardar cambios en base de datos"""
                 try:
+                    # El teléfono es el id del contacto: no se edita aquí
                     updated_data = {
                         'name': entry_name.get(),
-                        'phone': entry_phone.get(),
                         'status': status_var.get(),
-                        'notes': text_notes.get('1.0', 'end-1c')
+                        'version': contact.get('version')  # Rechazado (409) si otro lo cambió antes
                     }
+                    if 'note' in contact:  # Solo si la nota se cargó: si no, se borraría
+                        updated_data['note'] = text_notes.get('1.0', 'end-1c')
                     
                     # Actualizar en API
                     contact_id = contact.get('id')
@@ -987,15 +1171,25 @@ class CallManagerApp(ctk.CTk):
                     )
                     
                     if response.status_code == 200:
-                        # Actualizar localmente
-                        for cid, c in self.contacts.items():
-                            if c.get('id') == contact_id:
-                                c.update(updated_data)
-                                break
+                        # Actualizar localmente con la fila guardada (nueva versión)
+                        updated = response.json()
+                        if contact_id in self.contacts:
+                            local = self.contacts[contact_id]
+                            local.update({k: v for k, v in updated.items() if k in local or k == 'note'})
+                            local.pop('note_preview', None)  # La tarjeta usa note si no hay vista previa
                         self.render_contacts()
                         edit_window.destroy()
                         messagebox.showinfo('Éxito', f'✅ {entry_name.get()} actualizado')
                         logger.info(f"✏️ Contacto {contact_id} actualizado")
+                    elif response.status_code == 409:
+                        conflict = response.json()
+                        current = conflict.get('contact') or {}
+                        contact.update(current)  # Guardar de nuevo aplica sobre la versión actual
+                        messagebox.showwarning(
+                            'Contacto modificado',
+                            f"{conflict.get('error')}.\n\nValores actuales: {current.get('name')} - "
+                            f"{current.get('status')}\nRevise los cambios y guarde de nuevo."
+                        )
                     else:
                         messagebox.showerror('Error', f'Error actualizando contacto: {response.text}')
                 
@@ -1074,26 +1268,40 @@ class CallManagerApp(ctk.CTk):
     def _update_contact_status(self, contact_id, status):
         """Actualizar estado de contacto en background"""
         try:
+            # Con la versión local el servidor rechaza el cambio si otro escribió antes
+            local = self.contacts.get(contact_id, {})
             response = requests.put(
                 f'{SERVER_URL}/contacts/{contact_id}',
-                json={'status': status},
+                json={'status': status, 'version': local.get('version')},
                 headers=self.headers,
                 timeout=10
             )
             
             if response.status_code == 200:
-                # Actualizar localmente
-                for cid, c in self.contacts.items():
-                    if c.get('id') == contact_id:
-                        c['status'] = status
-                        self.after(0, self.render_contacts)
-                        break
+                # Actualizar localmente (la versión nueva hace que el parche en vivo se ignore)
+                updated = response.json()
+                if contact_id in self.contacts:
+                    self.contacts[contact_id]['status'] = updated.get('status', status)
+                    self.contacts[contact_id]['version'] = updated.get('version')
+                    self.after(0, self.render_contacts)
                 logger.info(f"📝 Estado actualizado: {contact_id} -> {status}")
+            elif response.status_code == 409:
+                # Otro usuario lo cambió o lo tiene bloqueado: mostrar la fila actual
+                conflict = response.json()
+                current = conflict.get('contact')
+                if current and contact_id in self.contacts:
+                    self.contacts[contact_id].update({k: v for k, v in current.items() if k in self.contacts[contact_id]})
+                    self.after(0, self.render_contacts)
+                logger.warning(f"Conflicto actualizando {contact_id}: {conflict.get('error')}")
+                self.after(0, lambda: messagebox.showwarning(
+                    "Contacto modificado",
+                    f"{conflict.get('error')}.\nSe muestra el estado actual; vuelva a intentarlo."
+                ))
         except Exception as e:
             logger.warning(f"No se pudo actualizar estado en API: {e}")
     
     def import_contacts(self):
-        """Importar contactos desde archivo"""
+        """Importar contactos desde archivo (subida por lotes a /import)"""
         try:
             file = filedialog.askopenfilename(
                 title="Importar contactos",
@@ -1102,105 +1310,111 @@ class CallManagerApp(ctk.CTk):
             if not file:
                 return
             
-            # Leer archivo
-            try:
-                if file.endswith('.json'):
-                    with open(file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    contacts_data = data if isinstance(data, list) else list(data.values())
-                elif file.endswith('.csv'):
-                    import csv
-                    with open(file, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        contacts_data = list(reader)
-                else:  # Excel
-                    import pandas as pd
-                    df = pd.read_excel(file)
-                    contacts_data = df.to_dict('records')
-                
-                # Enviar a API
-                threading.Thread(
-                    target=self._import_thread,
-                    args=(contacts_data,),
-                    daemon=True
-                ).start()
-                
-                messagebox.showinfo('Importación', f'Importando {len(contacts_data)} contactos...')
-            
-            except Exception as e:
-                logger.error(f"Error leyendo archivo: {e}")
-                messagebox.showerror('Error', f'Error leyendo archivo:\n{e}')
+            window, bar, label = self._show_import_progress(os.path.basename(file))
+            threading.Thread(
+                target=self._import_thread,
+                args=(file, window, bar, label),
+                daemon=True
+            ).start()
         
         except Exception as e:
             logger.error(f'Import error: {e}')
             messagebox.showerror('Error', f'Error en importación: {e}')
     
-    def _import_thread(self, contacts_data):
-        """Thread para importar en background"""
+    def _show_import_progress(self, filename):
+        """Ventana con barra de progreso de la importación"""
+        window = ctk.CTkToplevel(self)
+        window.title("📥 Importando contactos")
+        window.geometry('420x140')
+        window.resizable(False, False)
+        window.transient(self)
+        
+        frame = ctk.CTkFrame(window, fg_color=COLOR_BG)
+        frame.pack(fill='both', expand=True, padx=20, pady=20)
+        
+        ctk.CTkLabel(frame, text=filename, text_color=COLOR_TEXT, font=("Segoe UI", 12, "bold")).pack(pady=(0, 10))
+        bar = ctk.CTkProgressBar(frame, progress_color=COLOR_INFO)
+        bar.pack(fill='x')
+        bar.set(0)
+        label = ctk.CTkLabel(frame, text="Leyendo archivo...", text_color=COLOR_TEXT)
+        label.pack(pady=(10, 0))
+        return window, bar, label
+    
+    def _import_thread(self, file, window, bar, label):
+        """Thread para importar en background: lotes gzip paralelos a /import"""
+        def update_progress(done, total):
+            def apply():
+                if not window.winfo_exists():
+                    return
+                if total:
+                    bar.set(min(done / total, 1))
+                    label.configure(text=f"{done:,} / {total:,} filas")
+                else:
+                    label.configure(text=f"{done:,} filas")
+            self.after(0, apply)
+        
         try:
-            for contact in contacts_data:
-                try:
-                    response = requests.post(
-                        f'{SERVER_URL}/contacts',
-                        json=contact,
-                        headers=self.headers,
-                        timeout=10
-                    )
-                    if response.status_code == 201:
-                        new_contact = response.json()
-                        self.contacts[new_contact['id']] = new_contact
-                except:
-                    pass
+            rows, total = open_import_file(file)  # Lectura perezosa: el primer lote sale enseguida
+            update_progress(0, total)
             
-            self.after(0, self.render_contacts)
-            self.after(0, lambda: messagebox.showinfo('Éxito', '✅ Importación completada'))
-            logger.info(f"📥 Importados {len(contacts_data)} contactos")
+            report = BulkUploader(SERVER_URL, self.headers).upload(rows, total, progress=update_progress)
+            
+            summary = report.summary_text()
+            if report.errors:
+                errors_file = f"{os.path.splitext(file)[0]}_errores.txt"
+                report.write_errors(errors_file)
+                summary += f"\n\nInforme completo: {errors_file}"
+            
+            def finish():
+                if window.winfo_exists():
+                    window.destroy()
+                if report.errors:
+                    messagebox.showwarning('Importación', f'⚠️ Importación completada con errores\n\n{summary}')
+                else:
+                    messagebox.showinfo('Éxito', f'✅ Importación completada\n\n{summary}')
+            self.after(0, finish)
+            
+            self.load_contacts()  # Trae los cambios con la sincronización incremental
         except Exception as e:
             logger.error(f"Import thread error: {e}")
+            def fail(error=e):
+                if window.winfo_exists():
+                    window.destroy()
+                messagebox.showerror('Error', f'Error en importación: {error}')
+            self.after(0, fail)
     
     def export_contacts(self):
-        """Exportar contactos a archivo"""
+        """
+        Exportar contactos a archivo. Se descargan del servidor (GET /export,
+        o los contactos completos para .json): self.contacts solo tiene la
+        vista summary.
+        """
         try:
             file = filedialog.asksaveasfilename(
                 title="Exportar contactos",
                 defaultextension='.xlsx',
-                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("JSON files", "*.json")],
+                filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("NDJSON files", "*.ndjson"),
+                           ("JSON files", "*.json")],
                 initialfile=f"contactos_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             )
             if not file:
                 return
-            
-            # Exportar según formato
-            try:
-                contacts_list = list(self.contacts.values())
-                
-                if file.endswith('.json'):
-                    with open(file, 'w', encoding='utf-8') as f:
-                        json.dump(contacts_list, f, ensure_ascii=False, indent=2)
-                elif file.endswith('.csv'):
-                    import csv
-                    if contacts_list:
-                        keys = contacts_list[0].keys()
-                        with open(file, 'w', newline='', encoding='utf-8') as f:
-                            writer = csv.DictWriter(f, fieldnames=keys)
-                            writer.writeheader()
-                            writer.writerows(contacts_list)
-                else:  # Excel
-                    import pandas as pd
-                    df = pd.DataFrame(contacts_list)
-                    df.to_excel(file, index=False)
-                
-                messagebox.showinfo('Éxito', f'✅ Contactos exportados a:\n{file}')
-                logger.info(f"📤 Exportados {len(contacts_list)} contactos a {file}")
-            
-            except Exception as e:
-                logger.error(f"Error exportando: {e}")
-                messagebox.showerror('Error', f'Error exportando:\n{e}')
+            threading.Thread(target=self._export_thread, args=(file,), daemon=True).start()
         
         except Exception as e:
             logger.error(f'Export error: {e}')
             messagebox.showerror('Error', f'Error en exportación: {e}')
     
+    def _export_thread(self, file):
+        """Descarga del export en segundo plano"""
+        try:
+            export_contacts(SERVER_URL, self.headers, file)
+            self.after(0, lambda: messagebox.showinfo('Éxito', f'✅ Contactos exportados a:\n{file}'))
+            logger.info(f"📤 Contactos exportados a {file}")
+        except Exception as e:
+            logger.error(f"Error exportando: {e}")
+            self.after(0, lambda error=e: messagebox.showerror('Error', f'Error exportando:\n{error}'))
+    
     def open_generator(self):
         """Abrir generador de números telefónicos"""
         try:
@@ -10,6 +10,8 @@ import logging
 import json
 import requests
 
+from phone_utils import format_dial, format_e164
+
 logger = logging.getLogger(__name__)
 
 # ========== INTERFAZ BASE ==========
@@ -86,14 +88,8 @@ class InterPhoneProvider(CallProvider):
             return False, f"Error: {str(e)}"
     
     def normalize_number(self, phone_number: str) -> str:
-        """Normaliza número para InterPhone"""
-        import re
-        phone_number = phone_number.strip()
-        cleaned = re.sub(r'\D', '', phone_number)
-        # Remover prefijo país si existe
-        if len(cleaned) > 10:
-            cleaned = cleaned[-10:]
-        return cleaned
+        """Normaliza número para InterPhone (nacional, o 00 + código país)"""
+        return format_dial(phone_number)
 
 # ========== PROVEEDOR: SKYPE ==========
 
@@ -134,15 +130,8 @@ class SkypeProvider(CallProvider):
             return False, f"Error: {str(e)}"
     
     def normalize_number(self, phone_number: str) -> str:
-        """Normaliza número para Skype"""
-        import re
-        phone_number = phone_number.strip()
-        # Skype prefiere números con prefijo país
-        if not phone_number.startswith('+'):
-            cleaned = re.sub(r'\D', '', phone_number)
-            if len(cleaned) >= 10:
-                phone_number = f"+{cleaned}"
-        return phone_number
+        """Normaliza número para Skype (prefiere E.164 con prefijo país)"""
+        return format_e164(phone_number) or phone_number.strip()
 
 # ========== PROVEEDOR: GOOGLE MEET ==========
 
@@ -233,14 +222,8 @@ class TwilioProvider(CallProvider):
             return False, f"Error: {str(e)}"
     
     def normalize_number(self, phone_number: str) -> str:
-        """Normaliza número para Twilio"""
-        import re
-        phone_number = phone_number.strip()
-        cleaned = re.sub(r'\D', '', phone_number)
-        # Twilio prefiere formato +COUNTRYCODE...
-        if not phone_number.startswith('+'):
-            phone_number = f"+{cleaned}"
-        return phone_number
+        """Normaliza número para Twilio (formato E.164 +COUNTRYCODE...)"""
+        return format_e164(phone_number)
 
 # ========== PROVEEDOR: ZOOM ==========
 
@@ -331,13 +314,8 @@ class VonageProvider(CallProvider):
             return False, f"Error: {str(e)}"
     
     def normalize_number(self, phone_number: str) -> str:
-        """Normaliza número para Vonage"""
-        import re
-        phone_number = phone_number.strip()
-        cleaned = re.sub(r'\D', '', phone_number)
-        if not phone_number.startswith('+'):
-            phone_number = f"+{cleaned}"
-        return phone_number
+        """Normaliza número para Vonage (formato E.164)"""
+        return format_e164(phone_number)
 
 # ========== GESTOR DE PROVEEDORES ==========
 
@@ -0,0 +1,93 @@
+"""
+contact_export.py - Exportación de contactos a archivo desde el servidor
+
+La lista en memoria de la aplicación solo tiene la vista summary
+(note_preview, sin coords ni historial), así que no sirve para exportar.
+xlsx, csv y ndjson se descargan de GET /export (el servidor los genera en
+streaming o los sirve desde su caché). Para .json se leen los contactos
+completos de GET /contacts?stream=1 y se guardan como un arreglo.
+
+La descarga va a un archivo temporal junto al destino y se renombra al
+terminar: un error a mitad no deja un archivo truncado que parezca válido.
+"""
+import logging
+import os
+import tempfile
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'ndjson')  # Los que genera GET /export
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+TIMEOUT_SECONDS = (5, 300)  # (conexión, lectura): un export grande tarda en empezar
+
+
+def export_format(path):
+    """Formato a pedir según la extensión del archivo ('json' = contactos completos)"""
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in EXPORT_FORMATS or ext == 'json':
+        return ext
+    return 'xlsx'
+
+
+def _write_atomic(path, write):
+    """Llamar write(f) sobre un temporal en el mismo directorio y renombrarlo a `path`"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.export-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            result = write(f)
+        os.replace(temp_path, path)
+        return result
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _get(session, url, headers, params):
+    response = session.get(url, params=params, headers=headers, stream=True, timeout=TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        try:
+            message = response.json().get('error')
+        except ValueError:
+            message = None
+        response.close()
+        raise Exception(message or f'HTTP {response.status_code}')
+    return response
+
+
+def export_contacts(server_url, headers, path, statuses=None, session=None):
+    """
+    Descargar los contactos a `path` en el formato de su extensión.
+    `statuses` filtra por estado (solo formatos de /export).
+    Retorna los bytes escritos.
+    """
+    session = session or requests
+    fmt = export_format(path)
+
+    if fmt == 'json':
+        response = _get(session, f'{server_url}/contacts', headers, {'stream': 1})
+
+        def write(f):
+            f.write(b'[')
+            for n, line in enumerate(line for line in response.iter_lines() if line):
+                f.write((b',\n' if n else b'\n') + line)
+            f.write(b'\n]\n')
+            return f.tell()
+    else:
+        params = {'format': fmt}
+        if statuses:
+            params['status'] = ','.join(statuses)
+        response = _get(session, f'{server_url}/export', headers, params)
+
+        def write(f):
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+            return f.tell()
+
+    with response:
+        written = _write_atomic(path, write)
+    logger.info(f"Contactos exportados ({fmt}) a {path}: {written} bytes")
+    return written
+
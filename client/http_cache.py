@@ -0,0 +1,69 @@
+"""
+http_cache.py - Sesión HTTP con GET condicional (ETag / If-None-Match)
+
+Los paneles consultan los mismos endpoints en intervalos fijos. Esta sesión
+guarda la última respuesta 200 de cada GET que trae ETag y en la siguiente
+petición envía If-None-Match; si el servidor responde 304 se devuelve la
+respuesta guardada, sin volver a descargar ni parsear el cuerpo.
+"""
+import threading
+from collections import OrderedDict
+
+import requests
+
+
+class ETagSession(requests.Session):
+    """requests.Session que revalida los GET con If-None-Match"""
+
+    def __init__(self, max_entries: int = 256):
+        super().__init__()
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # (url, api_key) -> Response
+        self._cache_lock = threading.Lock()
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != 'GET':
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+
+        headers = dict(headers or {})
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        key = (full_url, headers.get('X-API-Key'))
+
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            headers['If-None-Match'] = cached.headers['ETag']
+
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            with self._cache_lock:
+                self._cache.move_to_end(key)
+            return cached
+
+        if response.status_code == 200 and response.headers.get('ETag'):
+            response.content  # Leer el cuerpo ahora: la respuesta se reutiliza
+            with self._cache_lock:
+                self._cache[key] = response
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return response
+
+    def clear_cache(self):
+        """Descartar todas las respuestas guardadas"""
+        with self._cache_lock:
+            self._cache.clear()
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> ETagSession:
+    """Sesión compartida por la aplicación (reutiliza conexiones y caché)"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = ETagSession()
+        return _http_session
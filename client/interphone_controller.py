@@ -1,8 +1,9 @@
 ﻿import logging
 import time
-import re
 from typing import Optional, Tuple
 
+from phone_utils import format_dial
+
 try:
     from pywinauto import Application, findwindows
     from pywinauto.findbestmatch import MatchError
@@ -27,39 +28,15 @@ CALL_TIMEOUT = 5
 
 def normalize_phone_for_interphone(phone_number: str) -> str:
     """
-    Normalizar número para InterPhone.
-    - Remover caracteres especiales
-    - Remover prefijo de país (+506, +1, etc.)
-    - Remover caracteres no válidos
+    Normalizar número para InterPhone (ver phone_utils.format_dial).
     
     Ejemplos de transformación:
     +506-5123-4567 → 51234567
-    +1-555-123-4567 → 5551234567
     (506) 5123-4567 → 51234567
     5123-4567 → 51234567
+    +1-555-123-4567 → 0015551234567
     """
-    if not phone_number:
-        return ""
-    
-    # Remover espacios
-    phone_number = phone_number.strip()
-    
-    # Remover todos los caracteres que no sean dígitos
-    cleaned = re.sub(r'\D', '', phone_number)
-    
-    if not cleaned:
-        return ""
-    
-    # Si comienza con prefijo de país (más de 10 dígitos típicamente)
-    # Remover primeros 1-3 dígitos (códigos de país)
-    if len(cleaned) > 10:
-        # Asumir que los primeros 1-3 dígitos son código de país
-        # Para +506 (Costa Rica): 506 = 3 dígitos
-        # Para +1 (USA): 1 = 1 dígito
-        # Para +34 (España): 34 = 2 dígitos
-        # Estrategia: si hay más de 10, remover primeros 3 y quedarse con los últimos 10
-        cleaned = cleaned[-10:]  # Tomar últimos 10 dígitos
-    
+    cleaned = format_dial(phone_number)
     logger.debug(f"Normalized phone: {phone_number} → {cleaned}")
     return cleaned
 
@@ -0,0 +1,114 @@
+"""
+spreadsheet_reader.py - Lectura en streaming de archivos a importar
+
+Genera las filas de un xlsx (openpyxl read_only), CSV (csv.reader) o JSON
+como dicts {columna: valor}, una a una, para que BulkUploader empiece a
+enviar el primer lote mientras el resto del archivo se sigue leyendo.
+No usa pandas: ni se carga el libro entero ni se duplica como lista de
+dicts.
+
+Las celdas vacías se omiten (el servidor aplica sus valores por defecto) y
+los números enteros guardados como float (88881111.0) se convierten a
+entero, para que un teléfono numérico no llegue como "88881111.0".
+"""
+import csv
+import json
+import os
+from datetime import date, datetime, time
+
+
+def _cell_value(value):
+    """Valor de celda listo para JSON"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _row_dict(header, values):
+    """Fila como dict omitiendo celdas vacías y columnas sin nombre"""
+    row = {}
+    for name, value in zip(header, values):
+        if not name or value is None:
+            continue
+        value = _cell_value(value)
+        if value != '':
+            row[name] = value
+    return row
+
+
+def _clean_header(values):
+    return [str(v).strip() if v is not None else '' for v in values]
+
+
+def iter_xlsx_rows(path):
+    """Filas de la primera hoja de un xlsx; la primera fila no vacía es la cabecera"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = None
+        for values in rows:
+            if header is None:
+                if any(v is not None for v in values):
+                    header = _clean_header(values)
+                continue
+            row = _row_dict(header, values)
+            if row:
+                yield row
+    finally:
+        workbook.close()  # read_only mantiene el archivo abierto hasta cerrar
+
+
+def xlsx_row_count(path):
+    """Filas de datos según la dimensión guardada en la hoja (None si no la tiene)"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+        return max(max_row - 1, 0) if max_row else None
+    finally:
+        workbook.close()
+
+
+def iter_csv_rows(path):
+    """Filas de un CSV con cabecera"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = _clean_header(next(reader, []))
+        for values in reader:
+            row = _row_dict(header, values)
+            if row:
+                yield row
+
+
+def csv_row_count(path):
+    """Filas de datos de un CSV (una pasada rápida sin construir dicts)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return sum(1 for values in reader if any(v.strip() for v in values))
+
+
+def open_import_file(path):
+    """
+    (filas, total) de un archivo de importación según su extensión.
+    `filas` es un iterador perezoso; `total` puede ser None si no se
+    conoce sin leer el archivo (xlsx sin dimensión).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        contacts_data = data if isinstance(data, list) else list(data.values())
+        return iter(contacts_data), len(contacts_data)
+    if ext == '.csv':
+        return iter_csv_rows(path), csv_row_count(path)
+    if ext in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(path), xlsx_row_count(path)
+    raise ValueError(f"Formato no soportado: {ext or path} (usar .xlsx, .csv o .json)")
@@ -16,6 +16,12 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import logging
 
+try:
+    from http_cache import get_http_session
+    http = get_http_session()  # GET condicional: 304 reutiliza la última respuesta
+except ImportError:
+    http = requests
+
 logger = logging.getLogger(__name__)
 
 # Colores del tema
@@ -137,7 +143,7 @@ class CallLogsTable(ctk.CTkToplevel):
     def _fetch_logs(self):
         """Obtener logs del servidor"""
         try:
-            response = requests.get(
+            response = http.get(
                 f"{self.base_url}/api/calls/log?limit=100",
                 headers=self.headers,
                 timeout=5
@@ -342,7 +348,7 @@ class MetricsDashboard(ctk.CTkToplevel):
         """Obtener métricas del servidor"""
         try:
             # Obtener métricas personales
-            response = requests.get(
+            response = http.get(
                 f"{self.base_url}/metrics/personal",
                 headers=self.headers,
                 timeout=5
@@ -355,7 +361,7 @@ class MetricsDashboard(ctk.CTkToplevel):
             # Si aplica, obtener métricas de equipo
             if self.user_role in ['supervisor', 'teamlead', 'ProjectManager', 'TI', 'admin']:
                 endpoint = '/metrics/team' if self.user_role != 'TI' else '/metrics/all'
-                response = requests.get(
+                response = http.get(
                     f"{self.base_url}{endpoint}",
                     headers=self.headers,
                     timeout=5
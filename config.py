@@ -51,11 +51,36 @@ if DEFAULT_API_KEY == 'dev-key-change-in-production' and os.environ.get('FLASK_E
 DEFAULT_LOCK_DURATION_MINUTES = 10
 MAX_LOCK_DURATION_MINUTES = 60
 CLEANUP_INTERVAL_SECONDS = 300  # Limpiar locks vencidos cada 5 minutos
+# memory: leases en memoria con vencimiento exacto y journal en la BD (un solo proceso).
+# database: locks solo en la BD, necesario con varios workers (SOCKETIO_MESSAGE_QUEUE)
+LOCK_BACKEND = os.environ.get('LOCK_BACKEND') or ('database' if os.environ.get('SOCKETIO_MESSAGE_QUEUE') else 'memory')
+# Cada cuánto se escriben en la BD los locks en memoria (menos que la duración mínima de un lock)
+LOCK_JOURNAL_INTERVAL_SECONDS = float(os.environ.get('LOCK_JOURNAL_INTERVAL_SECONDS', 1))
 
 # ========== SOCKET.IO ==========
 SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
 SOCKETIO_CORS_ORIGINS = os.environ.get('SOCKETIO_CORS_ORIGINS', "*")
 
+# Compresión de mensajes Socket.IO en transporte polling (engine.io): mínimo en bytes
+SOCKETIO_HTTP_COMPRESSION = os.environ.get('SOCKETIO_HTTP_COMPRESSION', 'true').lower() == 'true'
+SOCKETIO_COMPRESSION_THRESHOLD = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024))
+
+# Cola de mensajes para varios workers (ver socketio_queue.py): redis://host:6379/0,
+# amqp://..., unix:///ruta/directorio (misma máquina) o local:// (pruebas). Vacío = un solo proceso
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'callmanager')
+# Con varios workers solo el que tiene este lock corre las tareas de fondo (limpieza, backups, importaciones)
+BACKGROUND_TASKS_LOCK_FILE = os.environ.get('BACKGROUND_TASKS_LOCK_FILE', DATABASE_PATH + '.tasks.lock')
+
+# ========== COMPRESIÓN DE RESPUESTAS HTTP ==========
+# gzip (o brotli si está instalado) negociado con Accept-Encoding.
+# Niveles elegidos con scripts/benchmark_compression.py: gzip 5 queda a ~5% del
+# tamaño de gzip 9 con 1/6 del CPU (50k contactos: 29.9 MB -> 2.2 MB en ~300 ms)
+RESPONSE_COMPRESSION_ENABLED = os.environ.get('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+GZIP_COMPRESSION_LEVEL = int(os.environ.get('GZIP_COMPRESSION_LEVEL', 5))
+BROTLI_COMPRESSION_QUALITY = int(os.environ.get('BROTLI_COMPRESSION_QUALITY', 5))
+
 # ========== LOGGING ==========
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 LOG_FILE = os.environ.get('LOG_FILE', os.path.join(os.path.dirname(__file__), 'callmanager.log'))
@@ -89,6 +114,12 @@ STATUS_AUTO_RULES = {
     'SIN_RED': (6, 'Sin red - 6 meses sin visibilidad'),
     'NO_CONTACTO': (8, 'No quieren contacto - 8 meses sin visibilidad'),
 }
+# Estados que el envejecimiento automático nunca sobrescribe
+STATUS_AUTO_PROTECTED = ['INTERESADO', 'SERVICIOS_ACTIVOS', 'NO_EXISTE', 'SIN_RED', 'NO_CONTACTO']
+# Cada cuánto corre el job de envejecimiento (set-based) en background
+AGING_INTERVAL_SECONDS = int(os.environ.get('AGING_INTERVAL_SECONDS', 3600))
+# Cada cuánto el job ignora la marca de agua y revisa todas las filas (estados que dejaron de estar protegidos)
+AGING_FULL_PASS_HOURS = int(os.environ.get('AGING_FULL_PASS_HOURS', 24))
 
 # ========== PRIORIDADES DE ORDENAMIENTO AL CARGAR ==========
 # Menores números = Mayor visibilidad/prioridad
@@ -103,10 +134,46 @@ STATUS_PRIORITY = {
     'NO_CONTACTO': 22,         # No quieren contacto - MÍNIMA
 }
 
+# ========== PAGINACIÓN DE CONTACTOS ==========
+# GET /contacts pagina con cursor (keyset) sobre (priority, updated_at, id)
+CONTACTS_PAGE_SIZE = int(os.environ.get('CONTACTS_PAGE_SIZE', 500))
+CONTACTS_MAX_PAGE_SIZE = int(os.environ.get('CONTACTS_MAX_PAGE_SIZE', 5000))
+# GET /contacts/changes: si hay más cambios que esto, el cliente debe recargar completo
+CONTACT_CHANGES_MAX = int(os.environ.get('CONTACT_CHANGES_MAX', 5000))
+# Días que se conservan las lápidas (tombstones) de contactos borrados
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30))
+# GET /contacts/search (FTS5): resultados por defecto y máximo
+CONTACTS_SEARCH_LIMIT = int(os.environ.get('CONTACTS_SEARCH_LIMIT', 50))
+CONTACTS_SEARCH_MAX_LIMIT = int(os.environ.get('CONTACTS_SEARCH_MAX_LIMIT', 500))
+# Respuestas NDJSON (?stream=1): filas por lote de yield_per y por bloque enviado
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+# Contactos serializados que se mantienen en memoria (LRU por id, válidos por versión)
+CONTACT_JSON_CACHE_SIZE = int(os.environ.get('CONTACT_JSON_CACHE_SIZE', 50000))
+# Caracteres de la nota incluidos en la vista resumida (?view=summary, campo note_preview)
+CONTACT_NOTE_PREVIEW_LENGTH = int(os.environ.get('CONTACT_NOTE_PREVIEW_LENGTH', 60))
+# Ventana en la que los cambios de un contacto se juntan en un solo evento contacts_patched (0 = sin espera)
+CONTACT_PATCH_WINDOW_MS = int(os.environ.get('CONTACT_PATCH_WINDOW_MS', 100))
+# /export?format=xlsx: bytes del archivo que se mantienen en memoria antes de pasar a disco
+EXPORT_SPOOL_MAX_MEMORY = int(os.environ.get('EXPORT_SPOOL_MAX_MEMORY', 8 * 1024 * 1024))
+# Caché en disco de exportaciones por (formato, filtro, contact_seq); 0 = desactivada
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(os.path.dirname(DATABASE_PATH), 'export_cache'))
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Formatos que se regeneran en background tras importaciones grandes (vacío = ninguno)
+EXPORT_PREGENERATE_FORMATS = [f.strip() for f in os.environ.get('EXPORT_PREGENERATE_FORMATS', 'xlsx').split(',') if f.strip()]
+EXPORT_PREGENERATE_MIN_ROWS = int(os.environ.get('EXPORT_PREGENERATE_MIN_ROWS', 1000))
+
 # ========== RATE LIMITING ==========
 RATE_LIMIT_PER_HOUR = int(os.environ.get('RATE_LIMIT_PER_HOUR', 1000))
 IMPORT_RATE_LIMIT_PER_MINUTE = int(os.environ.get('IMPORT_RATE_LIMIT_PER_MINUTE', 10))
 
+# ========== IMPORTACIÓN MASIVA ==========
+# Filas por chunk en /import (un SELECT + un INSERT ... ON CONFLICT por chunk)
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+# Jobs asíncronos (/import?async=1): el cuerpo se guarda en disco y un worker lo procesa
+IMPORT_SPOOL_DIR = os.environ.get('IMPORT_SPOOL_DIR', os.path.join(os.path.dirname(__file__), 'import_spool'))
+IMPORT_JOB_POLL_SECONDS = int(os.environ.get('IMPORT_JOB_POLL_SECONDS', 2))
+IMPORT_JOB_MAX_ERRORS = int(os.environ.get('IMPORT_JOB_MAX_ERRORS', 1000))  # Errores guardados por job
+
 # ========== HTTPS / SSL ==========
 SSL_CONTEXT = os.environ.get('SSL_CONTEXT', 'none')  # 'adhoc', ruta a .pem, o 'none'
 ENABLE_HEALTH_CHECK = os.environ.get('ENABLE_HEALTH_CHECK', 'true').lower() == 'true'
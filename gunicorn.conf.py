@@ -0,0 +1,27 @@
+"""
+gunicorn.conf.py - Configuración de producción (ver Dockerfile)
+
+Cada proceso gunicorn corre GUNICORN_WORKERS workers eventlet (1 por
+defecto). El balanceo de gunicorn entre sus workers no es sticky y
+Socket.IO con long-polling necesita que cada cliente vuelva al mismo
+worker, así que para usar varios núcleos se levantan varias réplicas de
+un worker detrás de un balanceador sticky (nginx con ip_hash, ver
+nginx.conf y docker-compose.yml) con SOCKETIO_MESSAGE_QUEUE configurada.
+Más de un worker por proceso solo es seguro si todos los clientes usan
+transporte websocket.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('CALLMANAGER_PORT', '5000')}"
+worker_class = 'eventlet'
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    """Tareas de fondo: solo el worker que obtiene el lock las corre"""
+    from server import start_background_tasks
+    start_background_tasks()
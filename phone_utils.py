@@ -0,0 +1,246 @@
+"""
+phone_utils.py - Validación y normalización de teléfonos
+
+Motor único compartido por servidor y cliente: cada número se interpreta
+como código de país + número nacional (PhoneNumber) con la tabla
+COUNTRY_CODES, y de ahí salen el id del contacto, el formato E.164 y la
+cadena a marcar. Así el mismo número da siempre el mismo id y el mismo
+marcado, sin importar si llegó como "+506 8888-1111", "50688881111" u
+"8888-1111", o como "+1 555 123 4567" y "555-123-4567".
+
+Los ids cambiaron de esquema (PHONE_ID_SCHEME); legacy_phone_id() da el id
+que tenía una fila antes, para que el servidor migre los contactos
+existentes (server.rekey_contact_phone_ids).
+
+Funciones por fila (validate_phone, normalize_phone, parse_phone) y su
+versión por lote (normalize_phones) para las rutas masivas: /import,
+/api/generate_contacts y la importación del cliente. El lote da
+exactamente el mismo resultado que las funciones por fila (ver
+tests/test_phone_normalization.py), pero resuelve el caso común (dígitos
+ASCII, espacios, guiones y paréntesis) con str.translate en vez de una
+expresión regular por fila. Los números ya vistos salen de una caché LRU.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+PHONE_REGEX = r'^\+?[\d\s\-\(\)]{7,}$'  # Al menos 7 dígitos
+
+# País de los números escritos sin código (Costa Rica)
+DEFAULT_COUNTRY_CODE = '506'
+# Otros países cuyos números se reconocen sin + por su largo nacional
+# (o código + nacional): 555-123-4567 y 1-555-123-4567 son de NANP
+NATIONAL_COUNTRY_CODES = ('1',)
+# Versión de la regla de ids; al cambiarla el servidor re-calcula los ids guardados
+PHONE_ID_SCHEME = 2
+# Prefijo para marcar al extranjero desde la central
+INTERNATIONAL_DIAL_PREFIX = '00'
+PHONE_CACHE_SIZE = 16384
+
+# Código de país -> largos válidos del número nacional
+COUNTRY_CODES = {
+    '1': (10,),          # Estados Unidos, Canadá, Caribe (NANP)
+    '7': (10,),          # Rusia, Kazajistán
+    '33': (9,),          # Francia
+    '34': (9,),          # España
+    '39': (6, 7, 8, 9, 10, 11),  # Italia
+    '44': (10,),         # Reino Unido
+    '49': (7, 8, 9, 10, 11),     # Alemania
+    '51': (8, 9),        # Perú
+    '52': (10,),         # México
+    '53': (8,),          # Cuba
+    '54': (10, 11),      # Argentina
+    '55': (10, 11),      # Brasil
+    '56': (9,),          # Chile
+    '57': (10,),         # Colombia
+    '58': (10,),         # Venezuela
+    '502': (8,),         # Guatemala
+    '503': (8,),         # El Salvador
+    '504': (8,),         # Honduras
+    '505': (8,),         # Nicaragua
+    '506': (8,),         # Costa Rica
+    '507': (7, 8),       # Panamá
+    '591': (8,),         # Bolivia
+    '593': (8, 9),       # Ecuador
+    '595': (9,),         # Paraguay
+    '598': (8,),         # Uruguay
+}
+
+EMPTY_PHONE_ERROR = "Teléfono no válido o vacío"
+
+_ASCII_SEPARATORS = ' \t\n\r\x0b\x0c-()'
+# Borra los separadores: en un teléfono válido solo quedan dígitos y el +
+_DELETE_SEPARATORS = str.maketrans('', '', _ASCII_SEPARATORS)
+# Borra todo lo que admite PHONE_REGEX en ASCII: si queda algo, se usa la regex
+_DELETE_PHONE_CHARS = str.maketrans('', '', '0123456789' + _ASCII_SEPARATORS)
+
+
+def validate_phone(phone, pattern=PHONE_REGEX):
+    """Validar formato de teléfono"""
+    if not phone or not isinstance(phone, str):
+        return False, "Teléfono inválido: debe ser una cadena"
+    if not re.match(pattern, phone):
+        return False, f"Teléfono no cumple formato: {pattern}"
+    return True, ""
+
+
+class PhoneNumber(NamedTuple):
+    """Número interpretado: country_code vacío si no se pudo reconocer el país"""
+    country_code: str
+    national: str
+
+    @property
+    def id(self) -> str:
+        """Id de contacto: número nacional para el país por defecto, si no código + nacional"""
+        if self.country_code == DEFAULT_COUNTRY_CODE:
+            return self.national
+        return self.country_code + self.national
+
+    @property
+    def e164(self) -> str:
+        """+<código><nacional>, o "+" y los dígitos si no se reconoce el país"""
+        return f"+{self.country_code}{self.national}" if self.national else ""
+
+    @property
+    def dial(self) -> str:
+        """Cadena a marcar desde la central (InterPhone)"""
+        if self.country_code == DEFAULT_COUNTRY_CODE:
+            return self.national
+        if self.country_code:
+            return INTERNATIONAL_DIAL_PREFIX + self.country_code + self.national
+        return self.national
+
+
+def _split_country(digits):
+    """(código, nacional) si los dígitos empiezan por un código conocido con largo válido"""
+    for size in (1, 2, 3):
+        lengths = COUNTRY_CODES.get(digits[:size])
+        if lengths and len(digits) - size in lengths:
+            return digits[:size], digits[size:]
+    return None
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _parse_cleaned(cleaned: str) -> PhoneNumber:
+    """Interpretar un número ya limpio (solo dígitos y +)"""
+    international = cleaned.startswith('+')
+    digits = cleaned.replace('+', '')
+    if not international and digits.startswith(INTERNATIONAL_DIAL_PREFIX):
+        international = True
+        digits = digits[len(INTERNATIONAL_DIAL_PREFIX):]
+    if not digits:
+        return PhoneNumber('', '')
+
+    if international:
+        split = _split_country(digits)
+        if split:
+            return PhoneNumber(*split)
+        return PhoneNumber('', digits)
+
+    # Sin +: número nacional, o código + nacional sin el +, del país por
+    # defecto y luego de NATIONAL_COUNTRY_CODES
+    for code in (DEFAULT_COUNTRY_CODE,) + NATIONAL_COUNTRY_CODES:
+        lengths = COUNTRY_CODES[code]
+        if digits.startswith(code) and len(digits) - len(code) in lengths:
+            return PhoneNumber(code, digits[len(code):])
+        if len(digits) in lengths:
+            return PhoneNumber(code, digits)
+    return PhoneNumber('', digits)
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def _parse_text(phone: str) -> PhoneNumber:
+    # Remover todos los caracteres que no sean dígitos o +
+    return _parse_cleaned(re.sub(r'[^\d+]', '', phone))
+
+
+def parse_phone(phone) -> PhoneNumber:
+    """
+    Interpretar un teléfono en cualquier formato.
+
+    Ejemplos:
+    +506 5123-4567 → PhoneNumber('506', '51234567')
+    5123-4567      → PhoneNumber('506', '51234567')
+    +1-555-123-4567 → PhoneNumber('1', '5551234567')
+    """
+    if not phone:
+        return PhoneNumber('', '')
+    return _parse_text(str(phone))
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Id de contacto de un teléfono (ver PhoneNumber.id).
+
+    Ejemplos:
+    +506-5123-4567 → 51234567
+    50651234567    → 51234567
+    +1-555-123-4567 → 15551234567
+    555-123-4567 → 15551234567
+    """
+    return parse_phone(phone).id
+
+
+def legacy_phone_id(phone) -> str:
+    """
+    Id que daba normalize_phone antes de PHONE_ID_SCHEME 2: quitaba el + y,
+    con más de 10 dígitos, los 3 primeros. Solo para migrar filas existentes.
+    """
+    if not phone:
+        return ""
+    cleaned = re.sub(r'[^\d+]', '', str(phone))
+    if cleaned.startswith('+'):
+        cleaned = cleaned[1:]
+        if len(cleaned) > 10:
+            cleaned = cleaned[3:]
+    return cleaned
+
+
+def format_e164(phone: str) -> str:
+    """Teléfono en formato E.164 (+50651234567), para proveedores VoIP"""
+    return parse_phone(phone).e164
+
+
+def format_dial(phone: str) -> str:
+    """Cadena a marcar en InterPhone: nacional, o 00 + código para el extranjero"""
+    return parse_phone(phone).dial
+
+
+def normalize_phone_checked(phone, pattern=PHONE_REGEX):
+    """Validar y normalizar un teléfono: (id, None) o (None, mensaje de error)"""
+    valid, msg = validate_phone(phone, pattern)
+    if not valid:
+        return None, msg
+    cid = normalize_phone(phone)
+    if not cid:
+        return None, EMPTY_PHONE_ERROR
+    return cid, None
+
+
+def normalize_phones(phones, pattern=PHONE_REGEX):
+    """
+    Validar y normalizar una columna de teléfonos.
+
+    Retorna (ids, errors), dos listas alineadas con `phones`: ids[i] es el
+    id normalizado (o None) y errors[i] el mensaje de error (o None). El
+    resultado es idéntico a normalize_phone_checked() fila por fila.
+    """
+    ids = []
+    errors = []
+    add_id = ids.append
+    add_error = errors.append
+    fast = pattern == PHONE_REGEX  # El atajo reproduce solo la regex por defecto
+    for phone in phones:
+        if fast and type(phone) is str and phone:
+            body = phone[1:] if phone[0] == '+' else phone
+            if len(body) >= 7 and not body.translate(_DELETE_PHONE_CHARS):
+                cid = _parse_cleaned(phone.translate(_DELETE_SEPARATORS)).id
+                if cid:
+                    add_id(cid)
+                    add_error(None)
+                    continue
+        # Caracteres fuera de ASCII, inválidos u otra regex: camino por fila
+        cid, error = normalize_phone_checked(phone, pattern)
+        add_id(cid)
+        add_error(error)
+    return ids, errors
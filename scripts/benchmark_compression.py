@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de compresión de respuestas: gzip (y brotli si está instalado)
+sobre un payload de contactos con la forma de GET /contacts.
+
+Para cada nivel muestra tamaño, ratio, tiempo de compresión y tiempo total
+estimado (comprimir + transferir) en LAN de oficina y en un enlace lento.
+
+Uso:
+    python scripts/benchmark_compression.py
+    python scripts/benchmark_compression.py --contacts 50000 --view summary
+"""
+
+import argparse
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import serialization
+from benchmark_serialization import build_contacts, best_of
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SUMMARY_FIELDS = ('id', 'phone', 'name', 'status', 'note', 'priority', 'updated_at', 'version')
+
+# Enlaces de referencia (megabits por segundo)
+LINKS = {'LAN 100 Mbps': 100, 'WAN 5 Mbps': 5}
+
+
+def transfer_ms(size_bytes, mbps):
+    return size_bytes * 8 / (mbps * 1e6) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de respuestas')
+    parser.add_argument('--contacts', type=int, default=50000, help='Contactos en el payload')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    parser.add_argument('--view', choices=['full', 'summary'], default='full', help='Representación de contactos')
+    args = parser.parse_args()
+
+    contacts = build_contacts(args.contacts)
+    if args.view == 'summary':
+        contacts = [{k: c[k] for k in SUMMARY_FIELDS} for c in contacts]
+    payload = serialization.dumps_bytes({'items': contacts, 'next_cursor': None})
+
+    print("=" * 78)
+    print(f"BENCHMARK COMPRESIÓN - {args.contacts:,} contactos ({args.view}), "
+          f"JSON {len(payload) / 1e6:.1f} MB")
+    print("=" * 78)
+    header = f"  {'codec':<12}{'tamaño':>10}{'ratio':>8}{'comprimir':>12}"
+    for name in LINKS:
+        header += f"{name:>16}"
+    print(header)
+
+    rows = [('identity', len(payload), 0.0)]
+    for level in (1, 3, 5, 6, 9):
+        size = len(gzip.compress(payload, compresslevel=level))
+        seconds = best_of(lambda: gzip.compress(payload, compresslevel=level), args.repeat)
+        rows.append((f'gzip-{level}', size, seconds))
+    if brotli is not None:
+        for quality in (1, 4, 5, 6, 11):
+            size = len(brotli.compress(payload, quality=quality))
+            seconds = best_of(lambda: brotli.compress(payload, quality=quality), args.repeat)
+            rows.append((f'br-{quality}', size, seconds))
+    else:
+        print("  (brotli no instalado: solo gzip)")
+
+    for codec, size, seconds in rows:
+        line = f"  {codec:<12}{size / 1e6:>8.2f}MB{len(payload) / size:>7.1f}x{seconds * 1000:>10.0f}ms"
+        for mbps in LINKS.values():
+            line += f"{seconds * 1000 + transfer_ms(size, mbps):>14.0f}ms"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de serialización JSON: librería estándar vs orjson.
+
+Genera un payload con la misma forma que GET /contacts (datetimes sin
+convertir, coords y editors_history) y mide dumps/loads con cada backend
+de serialization.py.
+
+Uso:
+    python scripts/benchmark_serialization.py
+    python scripts/benchmark_serialization.py --contacts 100000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization
+
+STATUSES = ['NC', 'CUELGA', 'SIN GESTIONAR', 'INTERESADO', 'SERVICIOS_ACTIVOS', 'NO_EXISTE']
+NAMES = ['Juan García', 'María López', 'Carlos Rodríguez', 'Ana Martínez', 'Pedro Sánchez']
+
+
+def build_contacts(count, seed=42):
+    """Contactos con la forma de contact_to_dict()"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    contacts = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        contacts.append({
+            'id': f"8{i:07d}",
+            'phone': f"+506 8{i:07d}",
+            'name': rng.choice(NAMES),
+            'status': rng.choice(STATUSES),
+            'note': 'Llamar después de las 3pm' if i % 3 == 0 else '',
+            'coords': {'x': rng.randint(0, 1920), 'y': rng.randint(0, 1080)},
+            'locked_by': None,
+            'locked_until': None,
+            'reminder_time': None,
+            'last_called_by': 'agente1' if i % 2 else None,
+            'last_called_time': created + timedelta(days=3) if i % 2 else None,
+            'last_visibility_time': created,
+            'visibility_months_ago': rng.randint(0, 12),
+            'editors_history': [
+                {'user': 'agente1', 'field': 'status', 'time': (created + timedelta(hours=h)).isoformat()}
+                for h in range(rng.randint(0, 5))
+            ],
+            'created_at': created,
+            'updated_at': created + timedelta(days=1),
+            'version': rng.randint(1, 10),
+            'priority': STATUSES.index(rng.choice(STATUSES)) + 1
+        })
+    return contacts
+
+
+def best_of(fn, repeat):
+    """Mejor tiempo (segundos) de `repeat` ejecuciones"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=serialization._default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de serialización JSON')
+    parser.add_argument('--contacts', type=int, default=100000, help='Contactos en el payload')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    contacts = build_contacts(args.contacts)
+    payload = stdlib_dumps(contacts)
+
+    print("=" * 60)
+    print(f"BENCHMARK SERIALIZACIÓN - {args.contacts:,} contactos ({len(payload) / 1e6:.1f} MB)")
+    print("=" * 60)
+
+    results = {
+        'json dumps': best_of(lambda: stdlib_dumps(contacts), args.repeat),
+        'json loads': best_of(lambda: json.loads(payload), args.repeat),
+    }
+    if serialization.orjson is not None:
+        results['orjson dumps'] = best_of(lambda: serialization.dumps_bytes(contacts), args.repeat)
+        results['orjson loads'] = best_of(lambda: serialization.loads(payload), args.repeat)
+        assert json.loads(serialization.dumps_bytes(contacts)) == json.loads(payload)
+    else:
+        print("⚠️ orjson no está instalado: solo se mide la librería estándar")
+
+    for name, seconds in results.items():
+        print(f"  {name:<14} {seconds * 1000:9.1f} ms")
+
+    if serialization.orjson is not None:
+        print(f"\n  dumps: orjson {results['json dumps'] / results['orjson dumps']:.1f}x más rápido")
+        print(f"  loads: orjson {results['json loads'] / results['orjson loads']:.1f}x más rápido")
+
+
+if __name__ == '__main__':
+    main()
@@ -87,6 +87,7 @@ a = Analysis(
     binaries=[],
     datas=[
         ('phone_generator.py', '.'),
+        ('phone_utils.py', '.'),
         ('config.py', '.'),
         ('config_loader.py', 'client'),
         ('build_info.json', '.'),
@@ -0,0 +1,90 @@
+"""
+serialization.py - Capa única de serialización JSON
+
+La usan el JSON provider de Flask (jsonify / request.get_json) y Socket.IO
+(SocketIO(json=serialization)). Usa orjson si está instalado y, si no, la
+librería estándar; en ambos casos datetime, date y time se serializan en
+ISO 8601 sin convertirlos a mano.
+
+Expone la misma interfaz que el módulo json (dumps/loads) para poder
+pasarse como módulo a python-socketio.
+"""
+import json as _json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Argumentos de json.dumps que orjson reproduce tal cual (salida compacta, UTF-8)
+_ORJSON_COMPATIBLE_KWARGS = {'separators', 'ensure_ascii'}
+
+
+def _default(obj):
+    """Tipos extra que la librería estándar no sabe serializar"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj) -> bytes:
+    """Serializar a JSON compacto en UTF-8 (bytes), la forma más rápida"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return _json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj, **kwargs) -> str:
+    """
+    Equivalente a json.dumps. Con orjson solo se aceptan separators y
+    ensure_ascii (que no alteran el significado); cualquier otra opción
+    (indent, sort_keys, cls...) usa la librería estándar.
+    """
+    if orjson is not None and set(kwargs) <= _ORJSON_COMPATIBLE_KWARGS:
+        return dumps_bytes(obj).decode('utf-8')
+    kwargs.setdefault('default', _default)
+    return _json.dumps(obj, **kwargs)
+
+
+def loads(s, **kwargs):
+    """Equivalente a json.loads (acepta str o bytes)"""
+    if orjson is not None and not kwargs:
+        return orjson.loads(s)
+    return _json.loads(s, **kwargs)
+
+
+def init_app(app):
+    """
+    Hacer que jsonify y request.get_json usen este módulo (Flask >= 2.2).
+    En versiones anteriores de Flask no hace nada.
+    """
+    try:
+        from flask.json.provider import DefaultJSONProvider
+    except ImportError:
+        return False
+
+    class FastJSONProvider(DefaultJSONProvider):
+        sort_keys = False
+
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            return loads(s, **kwargs)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+    app.json = FastJSONProvider(app)
+    return True
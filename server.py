@@ -1,23 +1,45 @@
-﻿from flask import Flask, request, jsonify, send_file
+﻿from flask import Flask, request, jsonify, send_file, make_response, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, event
+from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, Index, event, case, or_, and_, func, text, bindparam, select, cast, table, column, literal_column
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import Pool
 from datetime import datetime, timedelta
 import bcrypt
 import jwt
 import json
+import base64
+import codecs
+import csv
+import gzip
+import hashlib
+import heapq
+import io
 import os
 import logging
 import shutil
 import re
 import secrets
+import tempfile
+import time
+import itertools
+import threading
+import zlib
+from collections import OrderedDict
 from functools import wraps
 from dateutil.relativedelta import relativedelta
+import serialization
+import phone_utils
+import socketio_queue
+
+try:
+    import brotli  # Opcional: Content-Encoding br
+except ImportError:
+    brotli = None
 
 # Importar configuración centralizada (carga .env automáticamente)
 try:
@@ -43,8 +65,41 @@ except ImportError:
     AUTH_TOKENS = {'dev-key-change-in-production': 'Desarrollador'}
     RATE_LIMIT_PER_HOUR = 1000
     IMPORT_RATE_LIMIT_PER_MINUTE = 10
+    IMPORT_CHUNK_SIZE = 500
+    IMPORT_SPOOL_DIR = 'import_spool'
+    IMPORT_JOB_POLL_SECONDS = 2
+    IMPORT_JOB_MAX_ERRORS = 1000
     DB_POOL_SIZE = 10
     DB_MAX_OVERFLOW = 20
+    CONTACTS_PAGE_SIZE = 500
+    CONTACTS_MAX_PAGE_SIZE = 5000
+    CONTACT_CHANGES_MAX = 5000
+    TOMBSTONE_RETENTION_DAYS = 30
+    CONTACTS_SEARCH_LIMIT = 50
+    CONTACTS_SEARCH_MAX_LIMIT = 500
+    STREAM_BATCH_SIZE = 500
+    CONTACT_JSON_CACHE_SIZE = 50000
+    CONTACT_NOTE_PREVIEW_LENGTH = 60
+    CONTACT_PATCH_WINDOW_MS = 100
+    EXPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+    EXPORT_CACHE_DIR = 'export_cache'
+    EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+    EXPORT_PREGENERATE_FORMATS = ['xlsx']
+    EXPORT_PREGENERATE_MIN_ROWS = 1000
+    SOCKETIO_HTTP_COMPRESSION = True
+    SOCKETIO_COMPRESSION_THRESHOLD = 1024
+    SOCKETIO_MESSAGE_QUEUE = None
+    LOCK_BACKEND = 'memory'
+    LOCK_JOURNAL_INTERVAL_SECONDS = 1
+    SOCKETIO_CHANNEL = 'callmanager'
+    BACKGROUND_TASKS_LOCK_FILE = 'contacts.db.tasks.lock'
+    RESPONSE_COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 1024
+    GZIP_COMPRESSION_LEVEL = 5
+    BROTLI_COMPRESSION_QUALITY = 5
+    STATUS_AUTO_PROTECTED = ['INTERESADO', 'SERVICIOS_ACTIVOS', 'NO_EXISTE', 'SIN_RED', 'NO_CONTACTO']
+    AGING_INTERVAL_SECONDS = 3600
+    AGING_FULL_PASS_HOURS = 24
 
 # ========== LOGGING ==========
 logging.basicConfig(
@@ -60,24 +115,46 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 app.config['SECRET_KEY'] = SECRET_KEY
+serialization.init_app(app)  # jsonify con orjson si está instalado
 
 # ========== RATE LIMITING ==========
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=[f"{RATE_LIMIT_PER_HOUR} per hour"]
+    default_limits=[f"{RATE_LIMIT_PER_HOUR} per hour"],
+    headers_enabled=True  # X-RateLimit-* y Retry-After en los 429 (el cliente espera lo indicado)
 )
 
-socketio = SocketIO(app, cors_allowed_origins=SOCKETIO_CORS_ORIGINS, async_mode=SOCKETIO_ASYNC_MODE)
+# Varios workers: los emit se relayan por la cola para llegar a los clientes de todos
+socketio_queue_options = {}
+if SOCKETIO_MESSAGE_QUEUE:
+    client_manager = socketio_queue.client_manager_for(SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL)
+    if client_manager is not None:
+        socketio_queue_options['client_manager'] = client_manager
+    else:
+        socketio_queue_options.update(message_queue=SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL)
+
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=SOCKETIO_CORS_ORIGINS,
+    async_mode=SOCKETIO_ASYNC_MODE,
+    json=serialization,
+    http_compression=SOCKETIO_HTTP_COMPRESSION,
+    compression_threshold=SOCKETIO_COMPRESSION_THRESHOLD,
+    **socketio_queue_options
+)
 
 logger.info("=" * 60)
 logger.info("CallManager Server Starting")
 logger.info(f"Host: {SERVER_HOST}, Port: {SERVER_PORT}")
 logger.info(f"Rate Limiting: {RATE_LIMIT_PER_HOUR}/hora (global), {IMPORT_RATE_LIMIT_PER_MINUTE}/min (import)")
+logger.info(f"JSON: {serialization.BACKEND}")
+logger.info(f"Socket.IO message queue: {SOCKETIO_MESSAGE_QUEUE.split('://')[0] if SOCKETIO_MESSAGE_QUEUE else 'none (single process)'}")
 logger.info("=" * 60)
 
 # ========== DATABASE SETUP ==========
 os.makedirs(BACKUP_DIR, exist_ok=True)
+os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
 
 engine = create_engine(
     f'sqlite:///{DATABASE_PATH}',
@@ -113,9 +190,23 @@ session_factory = sessionmaker(bind=engine)
 Session = scoped_session(session_factory)
 
 
+def status_priority(status):
+    """Prioridad de ordenamiento de un estado (menor = se muestra primero)"""
+    return STATUS_PRIORITY.get(status, 999)
+
+
+def _default_priority(context):
+    """Default de Contact.priority cuando el status no se asignó explícitamente"""
+    return status_priority(context.get_current_parameters().get('status') or 'SIN GESTIONAR')
+
+
 class Contact(Base):
     __tablename__ = 'contacts'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Orden de lectura de /contacts: la BD devuelve las filas ya ordenadas
+        Index('ix_contacts_priority_order', 'priority', 'updated_at', 'id'),
+        {'extend_existing': True}
+    )
     
     id = Column(String, primary_key=True)
     phone = Column(String, nullable=False, index=True)
@@ -137,6 +228,14 @@ class Contact(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     version = Column(Integer, default=1)  # Versión para optimistic locking (incrementa con cada update)
+    priority = Column(Integer, default=_default_priority, index=True)  # Desnormalizado de STATUS_PRIORITY
+    seq = Column(Integer, default=0, index=True)  # Secuencia global del servidor en la última escritura (delta sync)
+
+
+@event.listens_for(Contact.status, 'set')
+def _sync_contact_priority(target, value, oldvalue, initiator):
+    """Mantener priority sincronizado con status en toda asignación vía ORM"""
+    target.priority = status_priority(value)
 
 
 class User(Base):
@@ -205,18 +304,357 @@ class CallLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
+class ContactTombstone(Base):
+    """
+    Lápida de un contacto borrado. Permite que /contacts/changes informe
+    borrados a los clientes que sincronizan de forma incremental.
+    """
+    __tablename__ = 'contact_tombstones'
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(String, primary_key=True)  # ID del contacto borrado
+    seq = Column(Integer, nullable=False, index=True)
+    deleted_by = Column(String)
+    deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ImportJob(Base):
+    """Importación asíncrona (/import?async=1): el cuerpo queda en spool_path"""
+    __tablename__ = 'import_jobs'
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(String, primary_key=True)
+    status = Column(String, default='queued', index=True)  # queued, running, done, failed
+    format = Column(String, default='json')
+    spool_path = Column(String, nullable=False)
+    payload_hash = Column(String, index=True)  # sha256 del cuerpo (evita encolar reintentos dos veces)
+    options = Column(Text, default='{}')
+    created_by = Column(String)
+    total_rows = Column(Integer)
+    rows_done = Column(Integer, default=0)  # Filas confirmadas: se reanuda desde aquí
+    inserted = Column(Integer, default=0)
+    updated = Column(Integer, default=0)
+    duplicates_merged = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    errors = Column(Text, default='[]')  # Primeros IMPORT_JOB_MAX_ERRORS errores
+    error = Column(Text)  # Motivo si status == failed
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class ServerState(Base):
+    """
+    Estado interno del servidor (clave/valor): fingerprints de configuración,
+    marcas de agua de jobs, contadores, etc.
+    """
+    __tablename__ = 'server_state'
+    __table_args__ = {'extend_existing': True}
+    
+    key = Column(String, primary_key=True)
+    value = Column(Text)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 Base.metadata.create_all(engine)
 
 
+def get_server_state(conn, key, default=None):
+    """Leer un valor de server_state usando una conexión/transacción Core"""
+    row = conn.execute(
+        text("SELECT value FROM server_state WHERE key = :key"), {'key': key}
+    ).fetchone()
+    return row[0] if row else default
+
+
+def set_server_state(conn, key, value):
+    """Guardar un valor en server_state usando una conexión/transacción Core"""
+    conn.execute(
+        text("INSERT OR REPLACE INTO server_state (key, value, updated_at) VALUES (:key, :value, :ts)"),
+        {'key': key, 'value': str(value), 'ts': datetime.utcnow()}
+    )
+
+
+def ensure_server_counter(conn, key):
+    """Crear el contador `key` en server_state (en 0) si no existe"""
+    conn.execute(
+        text("INSERT OR IGNORE INTO server_state (key, value, updated_at) VALUES (:key, '0', :ts)"),
+        {'key': key, 'ts': datetime.utcnow()}
+    )
+
+
+def following_server_counter(key):
+    """
+    Subconsulta SQL con el valor que devolverá el próximo
+    next_server_counter(conn, key) en la misma transacción (sin avanzarlo).
+    El contador debe existir (ensure_server_counter).
+    """
+    return (
+        select(cast(ServerState.value, Integer) + 1)
+        .where(ServerState.key == key)
+        .scalar_subquery()
+    )
+
+
+def next_server_counter(conn, key):
+    """
+    Incrementar y devolver un contador monotónico guardado en server_state.
+    Debe llamarse dentro de la transacción de escritura que lo usa: el nuevo
+    valor se hace visible a otros lectores junto con las filas que lo llevan.
+    """
+    ensure_server_counter(conn, key)
+    conn.execute(
+        text("UPDATE server_state SET value = CAST(value AS INTEGER) + 1, updated_at = :ts WHERE key = :key"),
+        {'key': key, 'ts': datetime.utcnow()}
+    )
+    return int(get_server_state(conn, key))
+
+
+# Contadores de escritura por familia de recursos (además de contact_seq).
+# Avanzan en la misma transacción que la escritura; son la base de los ETag.
+FAMILY_WRITE_COUNTERS = (
+    ((CallLog, UserMetrics), 'call_log_seq'),
+    ((User,), 'user_seq'),
+)
+
+
+@event.listens_for(session_factory, 'before_flush')
+def _stamp_write_sequences(session, flush_context, instances):
+    """
+    Asignar la secuencia global (contact_seq) a cada contacto insertado o
+    modificado y a cada lápida, e incrementar Contact.version en las
+    modificaciones. Un valor de secuencia por flush.
+    
+    También avanza call_log_seq / user_seq si el flush escribe esas tablas.
+    """
+    modified = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    new = [obj for obj in session.new if isinstance(obj, (Contact, ContactTombstone))]
+    dirty = [obj for obj in modified if isinstance(obj, (Contact, ContactTombstone))]
+    if new or dirty:
+        seq = next_server_counter(session.connection(), 'contact_seq')
+        for obj in new:
+            obj.seq = seq
+        for obj in dirty:
+            obj.seq = seq
+            if isinstance(obj, Contact):
+                obj.version = (obj.version or 1) + 1
+    
+    written = list(session.new) + modified + list(session.deleted)
+    for classes, key in FAMILY_WRITE_COUNTERS:
+        if any(isinstance(obj, classes) for obj in written):
+            next_server_counter(session.connection(), key)
+
+
+def rerank_contact_priorities(conn):
+    """
+    Recalcular Contact.priority en bloque si STATUS_PRIORITY cambió desde el
+    último arranque. Un solo UPDATE ... CASE; no se hace nada si el fingerprint coincide.
+    Las filas re-priorizadas reciben un nuevo seq (delta sync y ETag las ven).
+    """
+    fingerprint = hashlib.sha1(json.dumps(STATUS_PRIORITY, sort_keys=True).encode('utf-8')).hexdigest()
+    if get_server_state(conn, 'status_priority_fingerprint') == fingerprint:
+        return
+    
+    contacts = Contact.__table__
+    new_priority = case(STATUS_PRIORITY, value=contacts.c.status, else_=999)
+    seq = next_server_counter(conn, 'contact_seq')
+    result = conn.execute(
+        contacts.update()
+        .where(or_(contacts.c.priority.is_(None), contacts.c.priority != new_priority))
+        .values(priority=new_priority, seq=seq, version=func.coalesce(contacts.c.version, 1) + 1)
+    )
+    set_server_state(conn, 'status_priority_fingerprint', fingerprint)
+    logger.info(f"STATUS_PRIORITY changed: re-ranked {result.rowcount} contacts")
+
+
+# Columnas que, si están vacías en la fila que se conserva al fusionar
+# contactos del mismo teléfono, se completan con las de la otra
+PHONE_MERGE_FILL_COLUMNS = (
+    'note', 'assigned_to_user_id', 'assigned_to_team_id', 'assigned_to_team_name',
+    'last_called_by', 'last_called_by_user_id', 'last_called_time', 'reminder_time',
+)
+DEFAULT_STATUSES = (None, '', 'SIN GESTIONAR', 'SIN_GESTIONAR')
+
+
+def rekey_contact_phone_ids(conn):
+    """
+    Pasar los ids de contactos a la regla actual de phone_utils si cambió
+    PHONE_ID_SCHEME desde el último arranque (una sola vez).
+    
+    Solo se tocan filas cuyo id es el que daba la regla anterior para su
+    teléfono (legacy_phone_id). Si varias filas quedan con el mismo id se
+    fusionan: se conserva la editada más recientemente, completando sus
+    campos vacíos con las otras. Los ids que desaparecen dejan lápida
+    (delta sync) y call_logs pasa al id nuevo.
+    """
+    scheme = str(phone_utils.PHONE_ID_SCHEME)
+    if get_server_state(conn, 'phone_id_scheme') == scheme:
+        return
+    
+    contacts = Contact.__table__
+    moved = {}  # id nuevo -> ids viejos
+    for cid, phone in conn.execute(select(contacts.c.id, contacts.c.phone)):
+        new_id = phone_utils.normalize_phone(phone)
+        if new_id and new_id != cid and cid == phone_utils.legacy_phone_id(phone):
+            moved.setdefault(new_id, []).append(cid)
+    
+    if moved:
+        old_ids = {cid for ids in moved.values() for cid in ids}
+        # Grupo de cada id nuevo: las filas que llegan y la que ya lo tenía (si no se va a otro id)
+        groups = {new_id: ids + ([new_id] if new_id not in old_ids else []) for new_id, ids in moved.items()}
+        
+        # Se leen y borran todas antes de insertar: un id nuevo puede ser el viejo de otra fila
+        rows = {}
+        affected = [cid for ids in groups.values() for cid in ids]
+        for i in range(0, len(affected), 500):
+            chunk = affected[i:i + 500]
+            rows.update((row['id'], dict(row)) for row in conn.execute(
+                select(contacts).where(contacts.c.id.in_(chunk))
+            ).mappings())
+            conn.execute(contacts.delete().where(contacts.c.id.in_(chunk)))
+        
+        seq = next_server_counter(conn, 'contact_seq')
+        now = datetime.utcnow()
+        merged = 0
+        for new_id, ids in groups.items():
+            members = sorted((rows[cid] for cid in ids if cid in rows),
+                             key=lambda row: row['updated_at'] or datetime.min, reverse=True)
+            keep = dict(members[0], id=new_id, seq=seq, version=(members[0]['version'] or 1) + 1)
+            for other in members[1:]:
+                for name in PHONE_MERGE_FILL_COLUMNS:
+                    if not keep[name] and other[name]:
+                        keep[name] = other[name]
+                if keep['status'] in DEFAULT_STATUSES and other['status'] not in DEFAULT_STATUSES:
+                    keep['status'] = other['status']
+                    keep['priority'] = status_priority(other['status'])
+            merged += len(members) - 1
+            conn.execute(contacts.insert().values(**keep))
+            conn.execute(
+                CallLog.__table__.update().where(CallLog.__table__.c.contact_id.in_(moved[new_id]))
+                .values(contact_id=new_id)
+            )
+        
+        for old_id in old_ids - set(moved):
+            conn.execute(
+                text("INSERT OR REPLACE INTO contact_tombstones (id, seq, deleted_by, deleted_at) "
+                     "VALUES (:id, :seq, 'phone_id_scheme', :ts)"),
+                {'id': old_id, 'seq': seq, 'ts': now}
+            )
+        logger.info(
+            f"Migración: ids de teléfono al esquema {scheme}: {len(old_ids)} contactos, "
+            f"{merged} duplicados fusionados"
+        )
+    set_server_state(conn, 'phone_id_scheme', scheme)
+
+
+# ========== BÚSQUEDA DE TEXTO COMPLETO (FTS5) ==========
+
+# Separadores que se quitan del teléfono antes de indexarlo (solo dígitos)
+PHONE_SEPARATORS = (' ', '-', '(', ')', '+', '.')
+
+CONTACT_FTS_AVAILABLE = False
+
+
+def _sql_phone_digits(column):
+    """Expresión SQL que deja solo los dígitos de un teléfono"""
+    expr = column
+    for sep in PHONE_SEPARATORS:
+        expr = f"replace({expr}, '{sep}', '')"
+    return expr
+
+
+def _contacts_fts_values(alias):
+    """Valores (rowid, name, phone, note) a indexar para la fila `alias` (new/old/contacts)"""
+    return (
+        f"{alias}.rowid, {alias}.name, "
+        f"{_sql_phone_digits(f'{alias}.phone')} || ' ' || {alias}.id, "
+        f"coalesce({alias}.note, '')"
+    )
+
+
+def ensure_contact_search_index():
+    """
+    Crear la tabla FTS5 contacts_fts (name, dígitos del teléfono + id, note)
+    y los triggers que la mantienen sincronizada con contacts. Se enlaza por
+    rowid. Al crearla por primera vez se indexan los contactos existentes.
+    Si SQLite no trae FTS5, /contacts/search usa LIKE.
+    """
+    global CONTACT_FTS_AVAILABLE
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'"
+            )).fetchone()
+            if not exists:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE contacts_fts USING fts5("
+                    "name, phone, note, tokenize = 'unicode61', prefix = '2 3 4')"
+                ))
+                conn.execute(text(
+                    f"INSERT INTO contacts_fts (rowid, name, phone, note) "
+                    f"SELECT {_contacts_fts_values('contacts')} FROM contacts"
+                ))
+                logger.info("Migración: índice de búsqueda contacts_fts creado")
+            
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+                f"INSERT INTO contacts_fts (rowid, name, phone, note) VALUES ({_contacts_fts_values('new')}); "
+                "END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+                "DELETE FROM contacts_fts WHERE rowid = old.rowid; "
+                "END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF name, phone, note ON contacts BEGIN "
+                "DELETE FROM contacts_fts WHERE rowid = old.rowid; "
+                f"INSERT INTO contacts_fts (rowid, name, phone, note) VALUES ({_contacts_fts_values('new')}); "
+                "END"
+            ))
+        CONTACT_FTS_AVAILABLE = True
+    except Exception as e:
+        logger.warning(f"FTS5 no disponible, la búsqueda usará LIKE: {e}")
+        CONTACT_FTS_AVAILABLE = False
+
+
+def ensure_schema():
+    """
+    Ajustes de esquema/datos que create_all() no aplica sobre tablas existentes.
+    Es idempotente: se ejecuta en cada arranque.
+    """
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(contacts)"))]
+        if 'priority' not in columns:
+            conn.execute(text("ALTER TABLE contacts ADD COLUMN priority INTEGER DEFAULT 999"))
+            logger.info("Migración: columna contacts.priority agregada")
+        if 'seq' not in columns:
+            conn.execute(text("ALTER TABLE contacts ADD COLUMN seq INTEGER DEFAULT 0"))
+            logger.info("Migración: columna contacts.seq agregada")
+        
+        for index in Contact.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        
+        # La paginación por cursor ordena por updated_at: no puede haber NULLs
+        conn.execute(text(
+            "UPDATE contacts SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) "
+            "WHERE updated_at IS NULL"
+        ))
+        
+        rerank_contact_priorities(conn)
+        rekey_contact_phone_ids(conn)
+    
+    ensure_contact_search_index()
+
+
+ensure_schema()
+
+
 # ========== VALIDACIÓN Y AUTENTICACIÓN ==========
 
 def validate_phone(phone):
     """Validar formato de teléfono"""
-    if not phone or not isinstance(phone, str):
-        return False, "Teléfono inválido: debe ser una cadena"
-    if not re.match(PHONE_REGEX, phone):
-        return False, f"Teléfono no cumple formato: {PHONE_REGEX}"
-    return True, ""
+    return phone_utils.validate_phone(phone, PHONE_REGEX)
 
 def validate_name(name):
     """Validar nombre de contacto"""
@@ -293,35 +731,8 @@ def verify_jwt_token(token: str):
         return None
 
 def normalize_phone(phone: str) -> str:
-    """
-    Normalizar número telefónico:
-    - Remover caracteres especiales
-    - Remover prefijo de país si es necesario
-    - Mantener solo dígitos
-    
-    Ejemplos:
-    +506-5123-4567 → 51234567
-    +1-555-123-4567 → 5551234567
-    555-123-4567 → 5551234567
-    """
-    if not phone:
-        return ""
-    
-    # Remover todos los caracteres que no sean dígitos o +
-    cleaned = re.sub(r'[^\d+]', '', str(phone))
-    
-    # Si comienza con +, remover el + y código de país
-    if cleaned.startswith('+'):
-        cleaned = cleaned[1:]  # Remover +
-        # Remover primer 1-3 dígitos (códigos de país comunes)
-        # +1 (USA), +506 (Costa Rica), +34 (España), etc.
-        if len(cleaned) > 10:
-            # Si tiene más de 10 dígitos después del +, probablemente tiene código país
-            # Asumir que es: [1-3 dígitos código][números locales]
-            # Para +506 específico: +506 = 3 dígitos, entonces remover primeros 3
-            cleaned = cleaned[3:] if len(cleaned) > 10 else cleaned[-10:]
-    
-    return cleaned
+    """Normalizar número telefónico (ver phone_utils.normalize_phone)"""
+    return phone_utils.normalize_phone(phone)
 
 def require_auth(f):
     """Decorador para validar autenticación en endpoints"""
@@ -393,48 +804,263 @@ def get_user_from_api_key(api_key: str):
         return None
 
 
+# ========== GET CONDICIONAL (ETag) ==========
+
+# Contadores de server_state de los que depende cada familia de endpoints
+ETAG_FAMILIES = {
+    'contacts': ('contact_seq',),
+    'metrics': ('call_log_seq', 'user_seq'),
+    'call_logs': ('call_log_seq', 'user_seq'),
+}
+
+
+def read_write_counters(keys):
+    """Leer contadores de server_state con una sola consulta SQL (sin ORM)"""
+    stmt = text("SELECT key, value FROM server_state WHERE key IN :keys").bindparams(
+        bindparam('keys', expanding=True)
+    )
+    with engine.connect() as conn:
+        values = dict(conn.execute(stmt, {'keys': list(keys)}).fetchall())
+    return [str(values.get(key, 0)) for key in keys]
+
+
+def compute_etag(family):
+    """
+    ETag fuerte de un GET: contadores de la familia + URL completa + API key
+    + Accept (JSON y NDJSON comparten URL).
+    Para contactos se agrega la hora actual porque visibility_months_ago
+    depende del reloj y no solo de las escrituras, y los cambios de locks
+    que aún no están en la BD (lock_manager.change_token).
+    """
+    parts = [family, request.full_path, request.headers.get('X-API-Key') or '', request.headers.get('Accept') or '']
+    parts.extend(read_write_counters(ETAG_FAMILIES[family]))
+    if family == 'contacts':
+        parts.append(datetime.now().strftime('%Y-%m-%d %H'))
+        parts.append(lock_manager.change_token())
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def conditional_get(family):
+    """
+    Decorador para GET con ETag: si If-None-Match coincide responde
+    304 Not Modified sin consultar contactos/llamadas ni serializar.
+    
+    Uso (debajo del decorador de autenticación):
+        @require_auth
+        @conditional_get('contacts')
+        def endpoint():
+            pass
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                etag = compute_etag(family)
+            except Exception as e:
+                logger.error(f"Error computing ETag for {request.path}: {e}")
+                return f(*args, **kwargs)
+            
+            # compress_response() agrega "-<codificación>" al ETag de respuestas comprimidas
+            candidates = [etag] + [f"{etag}-{encoding}" for encoding in COMPRESSION_ENCODINGS]
+            matched = next((tag for tag in candidates if request.if_none_match.contains(tag)), None)
+            if matched:
+                response = app.response_class(status=304)
+                response.set_etag(matched)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Accept')
+            return response
+        return decorated_function
+    return decorator
+
+
+# ========== COMPRESIÓN DE RESPUESTAS ==========
+
+# Codificaciones soportadas, en orden de preferencia del servidor
+COMPRESSION_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv',
+    'text/html', 'text/plain', 'text/css', 'application/javascript'
+}
+
+
+def negotiated_encoding():
+    """Codificación aceptada por el cliente (Accept-Encoding) o None"""
+    return request.accept_encodings.best_match(COMPRESSION_ENCODINGS)
+
+
+def _new_compressor(encoding):
+    if encoding == 'br':
+        return brotli.Compressor(quality=BROTLI_COMPRESSION_QUALITY)
+    return zlib.compressobj(GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+
+
+def _compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_COMPRESSION_QUALITY)
+    compressor = _new_compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks, encoding):
+    """
+    Comprimir una respuesta en streaming. Cada bloque se vacía (sync flush)
+    para que el cliente reciba los datos sin esperar al final.
+    """
+    compressor = _new_compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if encoding == 'br':
+            data = compressor.process(chunk) + compressor.flush()
+        else:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.finish() if encoding == 'br' else compressor.flush()
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Comprimir respuestas de texto/JSON según Accept-Encoding (br o gzip).
+    Las respuestas menores que COMPRESSION_MIN_SIZE se envían tal cual; las
+    de streaming se comprimen por bloques. El ETag lleva la codificación
+    como sufijo para que cada representación tenga su propio validador.
+    """
+    if not RESPONSE_COMPRESSION_ENABLED or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiated_encoding()
+    if encoding is None or response.direct_passthrough:
+        return response
+    
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(_compress_body(data, encoding))
+    
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
 # ========== ESTADOS DINÁMICOS Y VISIBILIDAD ==========
 
-def update_contact_status_by_visibility(contact):
+def run_auto_aging():
     """
-    Actualizar estado del contacto automáticamente basado en cuánto tiempo
-    lleva sin visibilidad (sin actualización de last_visibility_time)
+    Job de estados dinámicos por visibilidad (set-based).
     
-    Reglas:
+    Aplica STATUS_AUTO_RULES con un UPDATE en bloque por regla:
     - 3 meses sin visibilidad → NO_EXISTE
     - 6 meses sin visibilidad → SIN_RED
     - 8 meses sin visibilidad → NO_CONTACTO
     
-    NOTA: No sobrescribe estados establecidos manualmente, solo 
-    asigna estos estados si no han sido actualizados en meses.
+    NOTA: No sobrescribe estados establecidos manualmente (STATUS_AUTO_PROTECTED).
+    
+    Cada regla guarda una marca de agua (el cutoff de la corrida anterior) en
+    server_state, así cada corrida solo toca las filas que cruzaron el umbral
+    desde la última vez. La marca de agua no ve filas que cruzaron el umbral
+    estando protegidas y luego dejaron de estarlo, ni filas rellenadas con un
+    created_at antiguo: para esas se hace una pasada completa (sin límite
+    inferior) cada AGING_FULL_PASS_HOURS y siempre que se rellenaron filas.
+    Emite un único evento 'contacts_aged' con los IDs que cambiaron.
+    
+    Retorna: dict {estado: [ids]}
     """
+    db = Session()
+    now = datetime.utcnow()
+    changes = {}
     try:
-        if not contact.last_visibility_time:
-            contact.last_visibility_time = contact.created_at or datetime.now()
+        # Siguiente valor de contact_seq, reservado para las filas rellenadas y
+        # confirmado con next_server_counter si hubo alguna
+        reserved_seq = select(
+            func.coalesce(func.max(cast(ServerState.value, Integer)), 0) + 1
+        ).where(ServerState.key == 'contact_seq').scalar_subquery()
+        
+        # Primer statement de escritura: toma el lock de escritura de SQLite, así
+        # el SELECT de IDs y el UPDATE de cada regla ven exactamente las mismas filas
+        backfilled = db.query(Contact).filter(Contact.last_visibility_time.is_(None)).update({
+            Contact.last_visibility_time: func.coalesce(Contact.created_at, now),
+            Contact.version: func.coalesce(Contact.version, 1) + 1,
+            Contact.seq: reserved_seq
+        }, synchronize_session=False)
+        conn = db.connection()
+        seq = next_server_counter(conn, 'contact_seq') if backfilled else None
         
-        now = datetime.now()
+        last_full_pass = get_server_state(conn, 'aging_full_pass')
+        full_pass = bool(backfilled) or last_full_pass is None or (
+            now - datetime.fromisoformat(last_full_pass) >= timedelta(hours=AGING_FULL_PASS_HOURS)
+        )
         
-        # Calcular cuántos meses sin visibilidad
         for status_name, (months_threshold, description) in STATUS_AUTO_RULES.items():
-            cutoff_date = now - relativedelta(months=months_threshold)
+            cutoff = now - relativedelta(months=months_threshold)
+            watermark_key = f"aging_watermark:{status_name}:{months_threshold}"
+            watermark = get_server_state(conn, watermark_key)
+            
+            eligible = [
+                Contact.last_visibility_time < cutoff,
+                or_(Contact.status.is_(None), Contact.status.notin_(STATUS_AUTO_PROTECTED))
+            ]
+            if watermark and not full_pass:
+                eligible.append(Contact.last_visibility_time >= datetime.fromisoformat(watermark))
             
-            # Si la última visibilidad fue ANTES del umbral, aplicar el estado
-            if contact.last_visibility_time < cutoff_date:
-                # Solo cambiar si no es un estado manual importante
-                if contact.status not in ['INTERESADO', 'SERVICIOS_ACTIVOS', 'NO_EXISTE', 'SIN_RED', 'NO_CONTACTO']:
-                    contact.status = status_name
-                    logger.info(f"Auto-status for {contact.id}: {status_name} ({description})")
-                    return True
+            ids = [row[0] for row in db.query(Contact.id).filter(*eligible)]
+            if ids:
+                if seq is None:
+                    seq = next_server_counter(conn, 'contact_seq')
+                db.query(Contact).filter(*eligible).update({
+                    Contact.status: status_name,
+                    Contact.priority: status_priority(status_name),
+                    Contact.updated_at: now,
+                    Contact.version: Contact.version + 1,
+                    Contact.seq: seq
+                }, synchronize_session=False)
+                changes[status_name] = ids
+                logger.info(f"Auto-status {status_name} ({description}): {len(ids)} contacts")
+            
+            set_server_state(conn, watermark_key, cutoff.isoformat())
+        
+        if full_pass:
+            set_server_state(conn, 'aging_full_pass', now.isoformat())
+        db.commit()
     except Exception as e:
-        logger.error(f"Error updating visibility status for {contact.id}: {e}")
+        logger.error(f"Error in run_auto_aging: {e}")
+        db.rollback()
+        return {}
+    finally:
+        Session.remove()
     
-    return False
+    if changes:
+        socketio.emit('contacts_aged', {
+            'changes': changes,
+            'count': sum(len(ids) for ids in changes.values()),
+            'ts': now.isoformat()
+        })
+    
+    return changes
 
 
-def get_contacts_sorted_by_priority(db=None):
+def get_contacts_sorted_by_priority(db=None, fields=None):
     """
     Obtener todos los contactos ordenados por prioridad.
-    Prioridad según STATUS_PRIORITY (menores números = mayor prioridad).
+    Prioridad según STATUS_PRIORITY (menores números = mayor prioridad),
+    persistida en Contact.priority: la BD devuelve las filas ya ordenadas
+    usando el índice (priority, updated_at, id).
     
     Orden final:
     1. NC (No Contesta) - MÁXIMA PRIORIDAD
@@ -443,6 +1069,8 @@ def get_contacts_sorted_by_priority(db=None):
     4. INTERESADO - MEDIA
     5. SERVICIOS_ACTIVOS - BAJA
     6. NO_EXISTE, SIN_RED, NO_CONTACTO - MÍNIMA
+    
+    fields: proyección de parse_contact_fields() (None = entidad completa)
     """
     close_session = False
     if db is None:
@@ -450,31 +1078,246 @@ def get_contacts_sorted_by_priority(db=None):
         close_session = True
     
     try:
-        contacts = db.query(Contact).all()
-        
-        # Actualizar estados por visibilidad ANTES de ordenar
-        for contact in contacts:
-            update_contact_status_by_visibility(contact)
-        
-        # Commit de cambios de estado automático
-        db.commit()
-        
-        # Ordenar por prioridad usando STATUS_PRIORITY
-        def get_priority(contact):
-            # Obtener prioridad del estado, si no existe usar valor muy alto
-            return STATUS_PRIORITY.get(contact.status, 999)
+        # Solo lectura: los estados por visibilidad los aplica run_auto_aging() en background
+        contacts = contact_query(db, fields).order_by(Contact.priority, Contact.updated_at, Contact.id).all()
         
-        sorted_contacts = sorted(contacts, key=get_priority)
+        logger.debug(f"Contacts sorted by priority. Order: {[c.status for c in contacts[:5]]}")
         
-        logger.debug(f"Contacts sorted by priority. Order: {[c.status for c in sorted_contacts[:5]]}")
-        
-        return sorted_contacts
+        return contacts
     
     finally:
         if close_session:
             db.close()
 
 
+# ========== PROYECCIONES DE CONTACTOS (fields= / view=) ==========
+
+# Campos que se pueden pedir con ?fields= y las columnas SQL que necesita cada uno
+CONTACT_FIELD_COLUMNS = {
+    'id': (Contact.id,),
+    'phone': (Contact.phone,),
+    'name': (Contact.name,),
+    'status': (Contact.status,),
+    'note': (Contact.note,),
+    'note_preview': (func.substr(Contact.note, 1, CONTACT_NOTE_PREVIEW_LENGTH).label('note_preview'),),
+    'coords': (Contact.coords,),
+    'locked_by': (Contact.locked_by,),
+    'locked_until': (Contact.locked_until,),
+    'reminder_time': (Contact.reminder_time,),
+    'last_called_by': (Contact.last_called_by,),
+    'last_called_time': (Contact.last_called_time,),
+    'last_visibility_time': (Contact.last_visibility_time,),
+    'visibility_months_ago': (Contact.last_visibility_time,),
+    'editors_history': (Contact.editors_history,),
+    'created_at': (Contact.created_at,),
+    'updated_at': (Contact.updated_at,),
+    'version': (Contact.version,),
+    'priority': (Contact.priority,),
+}
+
+# Vistas con nombre (?view=); None = representación completa
+CONTACT_VIEWS = {
+    'full': None,
+    # Lo que muestra la lista del cliente (ModernContactCard) + lo necesario para ordenar/sincronizar
+    'summary': ('id', 'phone', 'name', 'status', 'note_preview', 'priority', 'updated_at', 'version'),
+}
+
+
+def parse_contact_fields(args):
+    """
+    Campos pedidos con ?fields=a,b,c o ?view=summary (fields tiene precedencia).
+    Retorna None para la representación completa. 'id' siempre se incluye.
+    Lanza ValueError si la vista o algún campo no existe.
+    """
+    raw_fields = args.get('fields')
+    if raw_fields:
+        requested = [name.strip() for name in raw_fields.split(',') if name.strip()]
+        unknown = [name for name in requested if name not in CONTACT_FIELD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+        return ('id',) + tuple(name for name in dict.fromkeys(requested) if name != 'id')
+    
+    view = args.get('view')
+    if view:
+        if view not in CONTACT_VIEWS:
+            raise ValueError(f"Vista desconocida: {view}. Disponibles: {', '.join(CONTACT_VIEWS)}")
+        return CONTACT_VIEWS[view]
+    return None
+
+
+def contact_query(db, fields=None):
+    """
+    Query de contactos: la entidad completa, o solo las columnas de los
+    campos pedidos (más priority/updated_at/id, necesarios para el cursor).
+    """
+    if fields is None:
+        return db.query(Contact)
+    columns = {}
+    for name in ('id', 'priority', 'updated_at') + tuple(fields):
+        for col in CONTACT_FIELD_COLUMNS[name]:
+            columns.setdefault(col.key, col)
+    return db.query(*columns.values()).select_from(Contact)
+
+
+def project_contact(row, fields):
+    """Diccionario con solo los campos pedidos de una fila de contact_query()"""
+    data = {}
+    for name in fields:
+        if name == 'coords':
+            data[name] = serialization.loads(row.coords or '{}')
+        elif name == 'editors_history':
+            data[name] = serialization.loads(row.editors_history or '[]')
+        elif name == 'visibility_months_ago':
+            data[name] = contact_visibility_months(row)
+        elif name in ('locked_by', 'locked_until'):
+            data[name] = contact_lock_fields(row)[name]
+        elif name == 'version':
+            data[name] = row.version if row.version is not None else 1
+        else:
+            data[name] = getattr(row, name)
+    return data
+
+
+def contact_serializer(fields):
+    """Función fila -> JSON (bytes) según la proyección pedida"""
+    if fields is None:
+        return contact_to_json
+    return lambda row: serialization.dumps_bytes(project_contact(row, fields))
+
+
+# ========== PAGINACIÓN POR CURSOR (KEYSET) ==========
+
+def encode_cursor(priority, updated_at, contact_id):
+    """Cursor opaco (base64 url-safe) con la clave de orden del último contacto entregado"""
+    raw = json.dumps([priority, updated_at.isoformat(), contact_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodificar cursor a (priority, updated_at, id). Lanza ValueError si es inválido."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        priority, updated_at, contact_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(priority), datetime.fromisoformat(updated_at), str(contact_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def get_contacts_page(db, limit, cursor=None, fields=None):
+    """
+    Obtener una página de contactos en orden estable (priority, updated_at, id).
+    
+    Usa keyset pagination (WHERE sobre la clave del último contacto entregado)
+    en lugar de OFFSET: el costo de cada página no depende de su profundidad y
+    no se saltan ni repiten filas aunque se inserten contactos entre páginas.
+    
+    Retorna: (contactos, next_cursor) - next_cursor es None en la última página
+    """
+    query = contact_query(db, fields)
+    
+    if cursor:
+        last_priority, last_updated, last_id = decode_cursor(cursor)
+        query = query.filter(
+            Contact.priority >= last_priority,
+            or_(
+                Contact.priority > last_priority,
+                Contact.updated_at > last_updated,
+                and_(Contact.updated_at == last_updated, Contact.id > last_id)
+            )
+        )
+    
+    # Pedir un registro extra para saber si hay página siguiente
+    rows = query.order_by(Contact.priority, Contact.updated_at, Contact.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.priority, last.updated_at, last.id)
+    
+    return rows, next_cursor
+
+
+def build_contact_search_query(q):
+    """
+    Convertir texto libre en una consulta FTS5 segura: cada término va entre
+    comillas con '*' (búsqueda por prefijo). Si el texto parece un teléfono
+    se reduce a sus dígitos y se busca solo en la columna phone.
+    """
+    if re.fullmatch(r'[\d\s\-\(\)\+\.]+', q):
+        digits = re.sub(r'\D', '', q)
+        return f'phone : "{digits}"*' if digits else ''
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', q))
+
+
+# Tabla FTS5 (solo las columnas que se usan para unir y ordenar)
+contacts_fts = table('contacts_fts', column('rowid'), column('rank'))
+
+
+def search_contacts(db, q, limit, fields=None):
+    """
+    Buscar contactos por nombre, teléfono o nota. Con FTS5 los resultados
+    vienen ordenados por relevancia (bm25) y luego por prioridad.
+    """
+    if CONTACT_FTS_AVAILABLE:
+        match = build_contact_search_query(q)
+        if not match:
+            return []
+        return contact_query(db, fields).join(
+            contacts_fts, contacts_fts.c.rowid == literal_column('contacts.rowid')
+        ).filter(
+            text("contacts_fts MATCH :match")
+        ).params(match=match).order_by(contacts_fts.c.rank, Contact.priority).limit(limit).all()
+    
+    pattern = f"%{q}%"
+    return contact_query(db, fields).filter(
+        or_(Contact.name.ilike(pattern), Contact.phone.like(pattern), Contact.note.ilike(pattern))
+    ).order_by(Contact.priority, Contact.updated_at, Contact.id).limit(limit).all()
+
+
+# ========== RESPUESTAS NDJSON (STREAMING) ==========
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """True si el cliente pidió ?stream=1 o prefiere Accept: application/x-ndjson"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_response(build_query, serialize, headers=None):
+    """
+    Respuesta NDJSON (un objeto JSON por línea) generada mientras se recorre
+    la consulta con yield_per: la memoria no crece con el tamaño de la tabla.
+    serialize(row) devuelve la línea ya codificada (bytes).
+    
+    build_query(db) recibe una sesión propia del generador (la del request
+    ya se cerró cuando empieza el envío). Si falla a mitad de camino se
+    emite una última línea {"error": ...}: el status 200 ya fue enviado.
+    """
+    def generate():
+        db = session_factory()
+        try:
+            lines = []
+            for row in build_query(db).yield_per(STREAM_BATCH_SIZE):
+                lines.append(serialize(row))
+                if len(lines) >= STREAM_BATCH_SIZE:
+                    yield b'\n'.join(lines) + b'\n'
+                    lines = []
+            if lines:
+                yield b'\n'.join(lines) + b'\n'
+        except Exception as e:
+            logger.error(f"Error streaming {request.path}: {e}")
+            yield serialization.dumps_bytes({'error': str(e)}) + b'\n'
+        finally:
+            db.close()
+    
+    return app.response_class(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+
 # ========== BACKUP ==========
 
 def create_backup():
@@ -509,67 +1352,827 @@ def cleanup_old_backups():
         logger.error(f"Error cleaning old backups: {e}")
 
 
+def contact_visibility_months(r):
+    """Meses desde la última visibilidad (depende del reloj, no se cachea)"""
+    if not r.last_visibility_time:
+        return None
+    delta = relativedelta(datetime.now(), r.last_visibility_time)
+    return delta.months + (delta.years * 12)
+
+
+def contact_lock_fields(r):
+    """
+    locked_by/locked_until vigentes: con LOCK_BACKEND=memory los de la fila
+    pueden ir atrasados hasta la próxima escritura del journal.
+    """
+    locked_by, locked_until = lock_manager.lock_fields(
+        r.id, getattr(r, 'locked_by', None), getattr(r, 'locked_until', None)
+    )
+    return {'locked_by': locked_by, 'locked_until': locked_until}
+
+
+def _contact_base_dict(r):
+    """
+    Campos de un contacto que solo cambian con una escritura (todo menos
+    visibility_months_ago y el lock, ver contact_lock_fields)
+    """
+    return {
+        'id': r.id,
+        'phone': r.phone,
+        'name': r.name,
+        'status': r.status,
+        'note': r.note,
+        'coords': serialization.loads(r.coords or '{}'),
+        'reminder_time': r.reminder_time,
+        'last_called_by': r.last_called_by,
+        'last_called_time': r.last_called_time,
+        'last_visibility_time': r.last_visibility_time,
+        'editors_history': serialization.loads(r.editors_history or '[]'),
+        'created_at': r.created_at,
+        'updated_at': r.updated_at,
+        'version': r.version if r.version is not None else 1,
+        'priority': r.priority
+    }
+
+
 def contact_to_dict(r):
     """Convertir Contact ORM a diccionario"""
     try:
-        # Incluir información de estado dinámico
-        visibility_months = None
-        if r.last_visibility_time:
-            delta = relativedelta(datetime.now(), r.last_visibility_time)
-            visibility_months = delta.months + (delta.years * 12)
-        
-        return {
-            'id': r.id,
-            'phone': r.phone,
-            'name': r.name,
-            'status': r.status,
-            'note': r.note,
-            'coords': json.loads(r.coords or '{}'),
-            'locked_by': r.locked_by,
-            'locked_until': r.locked_until.isoformat() if r.locked_until else None,
-            'reminder_time': r.reminder_time.isoformat() if r.reminder_time else None,
-            'last_called_by': r.last_called_by,
-            'last_called_time': r.last_called_time.isoformat() if r.last_called_time else None,
-            'last_visibility_time': r.last_visibility_time.isoformat() if hasattr(r, 'last_visibility_time') and r.last_visibility_time else None,
-            'visibility_months_ago': visibility_months,  # Información para UI
-            'editors_history': json.loads(r.editors_history or '[]'),
-            'created_at': r.created_at.isoformat() if hasattr(r, 'created_at') and r.created_at else None,
-            'updated_at': r.updated_at.isoformat() if hasattr(r, 'updated_at') and r.updated_at else None,
-            'version': r.version if hasattr(r, 'version') else 1
-        }
+        data = _contact_base_dict(r)
+        data.update(contact_lock_fields(r))
+        data['visibility_months_ago'] = contact_visibility_months(r)  # Información para UI
+        return data
     except Exception as e:
         logger.error(f"Error converting contact {r.id}: {e}")
         raise
 
 
-def cleanup_expired_locks():
-    """Liberar locks vencidos periódicamente"""
-    db = Session()
-    try:
-        expired = db.query(Contact).filter(
-            Contact.locked_until < datetime.utcnow(),
-            Contact.locked_by.isnot(None)
-        ).all()
-        
-        for contact in expired:
-            logger.info(f"Lock expired for contact {contact.id} (was locked by {contact.locked_by})")
-            contact.locked_by = None
-            contact.locked_until = None
-            socketio.emit('contact_unlocked', {'id': contact.id}, broadcast=True)
-        
-        db.commit()
-        if expired:
-            logger.info(f"Cleaned {len(expired)} expired locks")
-    except Exception as e:
-        logger.error(f"Error in cleanup_expired_locks: {e}")
-        db.rollback()
-    finally:
-        Session.remove()
-
-
-@app.route('/auth/register', methods=['POST'])
-@limiter.limit("5 per minute")  # Limitar registros
-def register():
+class ContactJSONCache:
+    """
+    LRU acotado de contactos ya codificados en JSON (bytes), sin la llave
+    de cierre para poder agregar visibility_months_ago al leer.
+    
+    Una entrada por contacto, válida para su (version, seq): toda escritura
+    (ORM o SQL masivo) cambia ambos, así que una entrada vieja nunca se sirve
+    aunque otro proceso haya escrito. Las escrituras ORM de este proceso
+    además la descartan en after_flush.
+    """
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # id -> ((version, seq), fragmento)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, contact_id, key):
+        with self._lock:
+            entry = self._entries.get(contact_id)
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(contact_id)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, contact_id, key, fragment):
+        with self._lock:
+            self._entries[contact_id] = (key, fragment)
+            self._entries.move_to_end(contact_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def discard(self, contact_id):
+        with self._lock:
+            self._entries.pop(contact_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+contact_json_cache = ContactJSONCache(CONTACT_JSON_CACHE_SIZE)
+
+
+@event.listens_for(session_factory, 'after_flush')
+def _invalidate_contact_json_cache(session, flush_context):
+    """Descartar de la caché los contactos escritos en este flush"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Contact):
+            contact_json_cache.discard(obj.id)
+
+
+# ========== FEED DE CAMBIOS (contacts_patched) ==========
+# Cada flush ORM que modifica contactos deja un parche por contacto con solo
+# las columnas cambiadas y el salto de versión (from_version -> version). Al
+# confirmar la transacción los parches pasan a contact_patch_feed, que junta
+# los de un mismo contacto durante CONTACT_PATCH_WINDOW_MS y los emite en un
+# solo evento por grupo de salas. Un cliente aplica un parche si su versión
+# local es from_version; si no, le faltó un cambio y sincroniza con
+# GET /contacts/changes.
+
+# Columnas que no viajan en los parches (version va aparte; el historial se pide con la vista completa)
+PATCH_EXCLUDED_COLUMNS = ('seq', 'version', 'editors_history')
+ASSIGNMENT_COLUMNS = ('assigned_to_user_id', 'assigned_to_team_id')
+
+
+def _patch_value(key, value):
+    """Valor de una columna en un parche (mismo formato que GET /contacts)"""
+    if key == 'coords':
+        return serialization.loads(value or '{}')
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _patch_fields(values):
+    """Columnas de un parche: sin las excluidas, en formato JSON y con note_preview si cambia note"""
+    fields = {key: _patch_value(key, value) for key, value in values.items() if key not in PATCH_EXCLUDED_COLUMNS}
+    if 'note' in fields:
+        fields['note_preview'] = (fields['note'] or '')[:CONTACT_NOTE_PREVIEW_LENGTH]
+    return fields
+
+
+def contact_patch(obj):
+    """
+    Parche de un contacto modificado en el flush en curso, o None si no
+    cambió ninguna columna. Debe llamarse con el historial de atributos
+    aún presente (after_flush).
+    """
+    state = sa_inspect(obj)
+    changed = False
+    fields = {}
+    previous = {}
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        changed = True
+        if attr.key in ASSIGNMENT_COLUMNS and history.deleted:
+            previous[attr.key] = history.deleted[0]
+        fields[attr.key] = history.added[0] if history.added else None
+    if not changed:
+        return None
+    
+    rooms = set(contact_rooms(obj))
+    if previous:
+        # Reasignado: la asignación anterior también se entera
+        rooms.update(assignment_rooms(*(previous.get(key, getattr(obj, key)) for key in ASSIGNMENT_COLUMNS)))
+    return {
+        'id': obj.id,
+        'from_version': obj.version - 1,  # _stamp_write_sequences sube version en 1 por flush
+        'version': obj.version,
+        'fields': _patch_fields(fields),
+        'rooms': rooms,
+    }
+
+
+def contact_update_patch(contact, values):
+    """
+    Parche de una escritura SQL directa (conditional_contact_update), que
+    no pasa por after_flush. `contact` es la fila ya releída con la nueva
+    versión; se publica con contact_patch_feed.publish() tras el commit.
+    """
+    return {
+        'id': contact.id,
+        'from_version': contact.version - 1,
+        'version': contact.version,
+        'fields': _patch_fields(values),
+        'rooms': set(contact_rooms(contact)),
+    }
+
+
+class ContactPatchFeed:
+    """Parches pendientes por contacto, emitidos en lote al cerrar cada ventana"""
+    
+    def __init__(self, window_ms):
+        self.window = window_ms / 1000.0
+        self._pending = {}  # id -> parche (from_version del primero, version del último)
+        self._lock = threading.Lock()
+        self._scheduled = False
+    
+    def publish(self, patches):
+        with self._lock:
+            for patch in patches:
+                current = self._pending.get(patch['id'])
+                if current is None or patch['from_version'] > current['version']:
+                    # Nuevo, o no contiguo: el cliente verá el salto y sincronizará
+                    self._pending[patch['id']] = patch
+                elif patch['from_version'] == current['version']:
+                    current['fields'].update(patch['fields'])
+                    current['version'] = patch['version']
+                    current['rooms'] |= patch['rooms']
+                # from_version < version pendiente: parche viejo, ya cubierto
+            schedule = bool(self._pending) and not self._scheduled
+            self._scheduled = self._scheduled or schedule
+        if schedule:
+            socketio.start_background_task(self._flush_after_window)
+    
+    def _flush_after_window(self):
+        if self.window > 0:
+            socketio.sleep(self.window)
+        self.flush()
+    
+    def flush(self):
+        """Emitir los parches pendientes: un evento por grupo de salas"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        groups = {}
+        for patch in pending.values():
+            rooms = tuple(sorted(patch.pop('rooms')))
+            groups.setdefault(rooms, []).append(patch)
+        ts = datetime.utcnow().isoformat()
+        for rooms, patches in groups.items():
+            try:
+                socketio.emit('contacts_patched', {'patches': patches, 'ts': ts}, to=list(rooms))
+            except Exception as e:
+                logger.error(f"Error emitting contacts_patched: {e}")
+
+
+contact_patch_feed = ContactPatchFeed(CONTACT_PATCH_WINDOW_MS)
+
+
+@event.listens_for(session_factory, 'after_flush')
+def _collect_contact_patches(session, flush_context):
+    """Guardar en la sesión los parches de los contactos modificados en este flush"""
+    patches = []
+    for obj in session.dirty:
+        if isinstance(obj, Contact) and obj not in session.deleted:
+            patch = contact_patch(obj)
+            if patch:
+                patches.append(patch)
+    if patches:
+        session.info.setdefault('contact_patches', []).extend(patches)
+
+
+@event.listens_for(session_factory, 'after_commit')
+def _publish_contact_patches(session):
+    patches = session.info.pop('contact_patches', None)
+    if patches:
+        contact_patch_feed.publish(patches)
+
+
+@event.listens_for(session_factory, 'after_rollback')
+def _discard_contact_patches(session):
+    session.info.pop('contact_patches', None)
+
+
+def contact_to_json(r):
+    """
+    JSON (bytes) de un contacto: el fragmento estable sale de la caché; el
+    lock y visibility_months_ago se calculan en cada lectura.
+    """
+    key = (r.version, r.seq)
+    fragment = contact_json_cache.get(r.id, key)
+    if fragment is None:
+        try:
+            fragment = serialization.dumps_bytes(_contact_base_dict(r))[:-1]
+        except Exception as e:
+            logger.error(f"Error converting contact {r.id}: {e}")
+            raise
+        contact_json_cache.put(r.id, key, fragment)
+    return (
+        fragment + b',' + serialization.dumps_bytes(contact_lock_fields(r))[1:-1]
+        + b',"visibility_months_ago":' + serialization.dumps_bytes(contact_visibility_months(r)) + b'}'
+    )
+
+
+def contacts_json_array(rows):
+    """Arreglo JSON (bytes) de contactos, uniendo los fragmentos cacheados"""
+    return b'[' + b','.join(contact_to_json(r) for r in rows) + b']'
+
+
+def json_response_with_contacts(rows, envelope=None, items_key='items', status=200, fields=None):
+    """
+    Respuesta JSON con la lista de contactos ya codificada: sin envelope es
+    un arreglo; con envelope (dict) se agrega como envelope[items_key].
+    Con fields (proyección) las filas vienen de contact_query() y no usan la caché.
+    """
+    if fields is None:
+        body = contacts_json_array(rows)
+    else:
+        body = serialization.dumps_bytes([project_contact(r, fields) for r in rows])
+    if envelope is not None:
+        rest = serialization.dumps_bytes(envelope)
+        body = b'{"' + items_key.encode('ascii') + b'":' + body + (b',' + rest[1:] if envelope else b'}')
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def cleanup_expired_locks():
+    """
+    Liberar locks vencidos periódicamente (LOCK_BACKEND=database). Cada
+    liberación es un UPDATE condicional: si el lock se renovó o lo tomó
+    otro usuario desde la lectura, no se toca.
+    """
+    db = Session()
+    try:
+        now = datetime.utcnow()
+        expired = db.query(Contact.id, Contact.locked_by).filter(
+            Contact.locked_until < now,
+            Contact.locked_by.isnot(None)
+        ).all()
+        
+        contacts = Contact.__table__
+        released = []
+        for contact_id, owner in expired:
+            written = conditional_contact_update(
+                db, contact_id, {'locked_by': None, 'locked_until': None},
+                where=and_(contacts.c.locked_by == owner, contacts.c.locked_until < now), bump_version=False
+            )
+            if written is None:
+                continue
+            contact = db.query(Contact).populate_existing().get(contact_id)
+            released.append((contact_id, owner, contact_rooms(contact)))
+        
+        db.commit()
+        for contact_id, owner, rooms in released:
+            logger.info(f"Lock expired for contact {contact_id} (was locked by {owner})")
+            emit_contact_event('contact_unlocked', {'id': contact_id}, rooms=rooms)
+        if released:
+            logger.info(f"Cleaned {len(released)} expired locks")
+    except Exception as e:
+        logger.error(f"Error in cleanup_expired_locks: {e}")
+        db.rollback()
+    finally:
+        Session.remove()
+
+
+# ========== ESCRITURAS CONDICIONALES (CAS) ==========
+# Las escrituras de un contacto que dependen de su estado (lock, versión)
+# van en un solo UPDATE con esas condiciones en el WHERE: si otra escritura
+# ganó, no se actualiza ninguna fila y quien llama responde con la fila
+# actual, en vez de leer, comprobar en Python y escribir.
+
+def lock_free_condition(user, now):
+    """Condición SQL: el contacto no tiene un lock vigente de otro usuario"""
+    contacts = Contact.__table__
+    return or_(
+        contacts.c.locked_by.is_(None),
+        contacts.c.locked_by == user,
+        contacts.c.locked_until.is_(None),
+        contacts.c.locked_until <= now,
+    )
+
+
+def conditional_contact_update(db, contact_id, values, lock_user=None, expected_version=None, where=None,
+                               bump_version=True):
+    """
+    UPDATE de un contacto en una sola sentencia, con las condiciones
+    opcionales: lock libre para `lock_user`, version = `expected_version`
+    y `where`. Aplica el sello de toda escritura (seq, version + 1,
+    updated_at y priority si cambia status) en la transacción de `db`.
+    Las escrituras de locks usan bump_version=False: avanzan seq (delta
+    sync, caché) pero no la versión que comprueban las ediciones, así el
+    dueño de un lock puede guardar con la versión que leyó antes de tomarlo.
+    
+    Retorna los valores escritos (para contact_update_patch) o None si la
+    fila no existe o no cumplió las condiciones; quien llama hace commit o
+    rollback. contact_seq solo avanza si la fila se escribió: un UPDATE que
+    no aplica (journal sin cambios, lock ocupado) no invalida ETags ni
+    cachés.
+    """
+    now = datetime.utcnow()
+    values = dict(values, updated_at=now)
+    if 'status' in values:
+        values['priority'] = status_priority(values['status'])
+    
+    contacts = Contact.__table__
+    conditions = [contacts.c.id == contact_id]
+    if lock_user is not None:
+        conditions.append(lock_free_condition(lock_user, now))
+    if expected_version is not None:
+        conditions.append(func.coalesce(contacts.c.version, 1) == expected_version)
+    if where is not None:
+        conditions.append(where)
+    
+    conn = db.connection()
+    ensure_server_counter(conn, 'contact_seq')
+    stamp = {'seq': following_server_counter('contact_seq')}
+    if bump_version:
+        stamp['version'] = func.coalesce(contacts.c.version, 1) + 1
+    result = conn.execute(contacts.update().where(and_(*conditions)).values(**stamp, **values))
+    if result.rowcount != 1:
+        return None
+    next_server_counter(conn, 'contact_seq')  # Reservar el valor que tomó la fila
+    return values
+
+
+def parse_expected_version(value):
+    """Versión esperada enviada por el cliente (None si no la envía); ValueError si no es un entero"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"version debe ser un entero: {value!r}")
+
+
+def update_contact_fields(db, contact_id, fields, user, expected_version=None):
+    """
+    Validar y aplicar una edición (name, status, note, coords) como un
+    UPDATE condicional: el contacto no debe tener un lock vigente de otro
+    usuario y, si se indica, debe seguir en `expected_version`.
+    
+    Retorna (resultado, datos):
+    - ('updated', contacto), ('unchanged', None)
+    - ('invalid', mensaje), ('not_found', None)
+    - ('locked', {locked_by, locked_until, contact}) o
+      ('conflict', {expected_version, version, contact}) con la fila actual
+    """
+    now = datetime.utcnow()
+    values = {}
+    current = None
+    
+    if 'status' in fields:
+        values['status'] = str(fields['status']).strip()
+    
+    if 'note' in fields:
+        new_note = str(fields['note']).strip()
+        valid, msg = validate_note(new_note)
+        if not valid:
+            return 'invalid', f'Nota inválida: {msg}'
+        values['note'] = new_note
+    
+    if 'coords' in fields:
+        try:
+            values['coords'] = json.dumps(fields['coords'])
+        except Exception as e:
+            return 'invalid', f'Coordenadas inválidas: {e}'
+    
+    if 'name' in fields:
+        new_name = str(fields['name']).strip()
+        valid, msg = validate_name(new_name)
+        if not valid:
+            return 'invalid', f'Nombre inválido: {msg}'
+        # El historial necesita el nombre anterior: se lee la fila y el UPDATE
+        # exige que siga en esa versión (nadie escribió entre la lectura y la escritura)
+        current = db.query(Contact).get(contact_id)
+        if current is None:
+            return 'not_found', None
+        read_version = current.version or 1
+        if expected_version is not None and expected_version != read_version:
+            return 'conflict', {'expected_version': expected_version, 'version': read_version,
+                                'contact': contact_to_dict(current)}
+        expected_version = read_version
+        if new_name != current.name:
+            hist = json.loads(current.editors_history or '[]')
+            hist.insert(0, {
+                'user': user,
+                'field': 'name',
+                'old': current.name,
+                'new': new_name,
+                'ts': now.isoformat()
+            })
+            values['editors_history'] = json.dumps(hist[:20])  # Guardar últimos 20 cambios
+            values['name'] = new_name
+    
+    if not values:
+        return 'unchanged', None
+    values['last_called_by'] = user
+    values['last_called_time'] = now
+    
+    # Con locks en memoria el lock se comprueba aquí; la versión sigue en el WHERE
+    lock_in_sql = isinstance(lock_manager, DatabaseLockManager)
+    if not lock_in_sql:
+        holder = lock_manager.holder(db, contact_id)
+        if holder and holder.owner != user:
+            current = current or db.query(Contact).get(contact_id)
+            return 'locked', {**holder.to_dict(), 'contact': contact_to_dict(current) if current else None}
+    
+    written = conditional_contact_update(
+        db, contact_id, values, lock_user=user if lock_in_sql else None, expected_version=expected_version
+    )
+    if written is None:
+        db.rollback()
+        current = db.query(Contact).get(contact_id)
+        if current is None:
+            return 'not_found', None
+        holder = lock_manager.holder(db, contact_id)
+        if holder and holder.owner != user:
+            return 'locked', {**holder.to_dict(), 'contact': contact_to_dict(current)}
+        return 'conflict', {'expected_version': expected_version, 'version': current.version or 1,
+                            'contact': contact_to_dict(current)}
+    
+    contact = db.query(Contact).populate_existing().get(contact_id)
+    patch = contact_update_patch(contact, written)
+    data = contact_to_dict(contact)
+    db.commit()
+    contact_patch_feed.publish([patch])
+    return 'updated', data
+
+
+# ========== LOCKS DE CONTACTOS (LEASES) ==========
+# Dos backends con la misma interfaz (LOCK_BACKEND):
+# - memory: los leases viven en un dict + min-heap de vencimientos; tomar,
+#   renovar y liberar no tocan la BD. Un timer emite contact_unlocked en el
+#   instante exacto del vencimiento y un journal escribe los cambios en
+#   Contact.locked_by/locked_until cada LOCK_JOURNAL_INTERVAL_SECONDS para
+#   recuperarlos al reiniciar. Solo sirve con un proceso.
+# - database: cada operación lee y escribe la BD y cleanup_expired_locks
+#   libera los vencidos en cada ciclo de limpieza. Sirve con varios workers.
+
+
+class LockLease:
+    """Lock vigente de un contacto"""
+    __slots__ = ('contact_id', 'owner', 'expires_at', 'rooms')
+    
+    def __init__(self, contact_id, owner, expires_at, rooms):
+        self.contact_id = contact_id
+        self.owner = owner
+        self.expires_at = expires_at
+        self.rooms = rooms  # Salas de la asignación al tomar el lock (para avisar al vencer)
+    
+    def to_dict(self):
+        return {'id': self.contact_id, 'locked_by': self.owner, 'locked_until': self.expires_at.isoformat()}
+
+
+class DatabaseLockManager:
+    """Locks en Contact.locked_by/locked_until con UPDATE condicionales (varios workers)"""
+    
+    def lock_fields(self, contact_id, locked_by, locked_until):
+        """locked_by/locked_until a mostrar: los de la fila"""
+        return locked_by, locked_until
+    
+    def change_token(self):
+        """Parte del ETag de contactos: vacía, cada cambio de lock ya avanza contact_seq"""
+        return ''
+    
+    def holder(self, db, contact_id):
+        """Lease vigente del contacto o None"""
+        contact = db.query(Contact).get(contact_id)
+        if contact and contact.locked_by and contact.locked_until and contact.locked_until > datetime.utcnow():
+            return LockLease(contact.id, contact.locked_by, contact.locked_until, contact_rooms(contact))
+        return None
+    
+    def _write(self, db, contact_id, values, **conditions):
+        """
+        UPDATE condicional + commit; retorna las salas del contacto o None si
+        no se escribió. Sin parche: contact_locked/contact_unlocked avisan del cambio.
+        """
+        written = conditional_contact_update(db, contact_id, values, bump_version=False, **conditions)
+        if written is None:
+            db.rollback()
+            return None
+        rooms = contact_rooms(db.query(Contact).populate_existing().get(contact_id))
+        db.commit()
+        return rooms
+    
+    def acquire(self, db, contact_id, owner, minutes):
+        """
+        Tomar o renovar el lock en un solo UPDATE (libre, vencido o ya de owner).
+        Retorna (lease, None), (None, lease de otro usuario) o (None, None) si no existe.
+        """
+        for _ in range(2):  # Si el lock del otro venció entre el UPDATE y la lectura, reintentar
+            until = datetime.utcnow() + timedelta(minutes=minutes)
+            rooms = self._write(db, contact_id, {'locked_by': owner, 'locked_until': until}, lock_user=owner)
+            if rooms is not None:
+                return LockLease(contact_id, owner, until, rooms), None
+            current = self.holder(db, contact_id)
+            if current is not None or db.query(Contact.id).filter(Contact.id == contact_id).first() is None:
+                return None, current
+        return None, None
+    
+    def release(self, db, contact_id, owner):
+        """
+        Liberar el lock de owner en un solo UPDATE.
+        Retorna (lease liberado, None), (None, lease de otro usuario) o (None, None) si no estaba bloqueado.
+        """
+        rooms = self._write(
+            db, contact_id, {'locked_by': None, 'locked_until': None},
+            where=Contact.__table__.c.locked_by == owner
+        )
+        if rooms is not None:
+            return LockLease(contact_id, owner, datetime.utcnow(), rooms), None
+        current = self.holder(db, contact_id)
+        return None, current if current is not None and current.owner != owner else None
+    
+    def expire(self):
+        cleanup_expired_locks()
+
+
+class MemoryLockManager:
+    """Leases en memoria con min-heap de vencimientos y journal write-behind en la BD"""
+    
+    def __init__(self, journal_interval):
+        self.journal_interval = journal_interval
+        self._leases = {}  # contact_id -> LockLease
+        self._heap = []  # (expires_at, n, contact_id); entradas viejas se descartan al salir
+        self._counter = itertools.count()
+        self._journal = {}  # contact_id -> LockLease o None, pendientes de escribir
+        self._writing = {}  # Parte del journal que flush_journal está escribiendo
+        self._epoch = secrets.token_hex(4)  # Distingue los cambios de un arranque de los del anterior
+        self._changes = 0  # Tomas, renovaciones, liberaciones y vencimientos en este arranque
+        self._lock = threading.Lock()
+    
+    def _current(self, contact_id, now):
+        lease = self._leases.get(contact_id)
+        return lease if lease is not None and lease.expires_at > now else None
+    
+    def lock_fields(self, contact_id, locked_by, locked_until):
+        """
+        locked_by/locked_until a mostrar: el lease en memoria si existe o
+        está pendiente de escribir; si no, lo guardado en la fila (ya al día).
+        """
+        with self._lock:
+            known = contact_id in self._leases or contact_id in self._journal or contact_id in self._writing
+            lease = self._current(contact_id, datetime.utcnow())
+        if lease is not None:
+            return lease.owner, lease.expires_at
+        return (None, None) if known else (locked_by, locked_until)
+    
+    def change_token(self):
+        """
+        Parte del ETag de contactos: cambia con cada toma, renovación,
+        liberación o vencimiento, que se ven en las lecturas (lock_fields)
+        antes de que el journal avance contact_seq.
+        """
+        with self._lock:
+            return f"{self._epoch}.{self._changes}"
+    
+    def holder(self, db, contact_id):
+        with self._lock:
+            return self._current(contact_id, datetime.utcnow())
+    
+    def acquire(self, db, contact_id, owner, minutes):
+        with self._lock:
+            current = self._current(contact_id, datetime.utcnow())
+        if current and current.owner != owner:
+            return None, current
+        rooms = current.rooms if current else None
+        if rooms is None:
+            # Solo lectura: existencia y salas de la asignación
+            contact = db.query(Contact).get(contact_id)
+            if contact is None:
+                return None, None
+            rooms = contact_rooms(contact)
+        
+        now = datetime.utcnow()
+        with self._lock:
+            current = self._current(contact_id, now)  # Otro pudo tomarlo durante la lectura
+            if current and current.owner != owner:
+                return None, current
+            lease = LockLease(contact_id, owner, now + timedelta(minutes=minutes), rooms)
+            self._leases[contact_id] = lease
+            self._journal[contact_id] = lease
+            self._changes += 1
+            heapq.heappush(self._heap, (lease.expires_at, next(self._counter), contact_id))
+        return lease, None
+    
+    def release(self, db, contact_id, owner):
+        with self._lock:
+            current = self._current(contact_id, datetime.utcnow())
+            if current is None:
+                return None, None
+            if current.owner != owner:
+                return None, current
+            del self._leases[contact_id]
+            self._journal[contact_id] = None
+            self._changes += 1
+        return current, None
+    
+    def pop_expired(self, now):
+        """Quitar y retornar los leases vencidos a `now`"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, _, contact_id = heapq.heappop(self._heap)
+                lease = self._leases.get(contact_id)
+                if lease is not None and lease.expires_at == expires_at:  # Si no, fue renovado o liberado
+                    del self._leases[contact_id]
+                    self._journal[contact_id] = None
+                    self._changes += 1
+                    expired.append(lease)
+        return expired
+    
+    def seconds_to_next_expiry(self, now):
+        with self._lock:
+            return (self._heap[0][0] - now).total_seconds() if self._heap else None
+    
+    def recover(self):
+        """Cargar los locks vigentes guardados en la BD (al arrancar)"""
+        db = Session()
+        try:
+            now = datetime.utcnow()
+            stored = db.query(Contact).filter(Contact.locked_by.isnot(None)).all()
+            with self._lock:
+                for contact in stored:
+                    if contact.locked_until and contact.locked_until > now:
+                        lease = LockLease(contact.id, contact.locked_by, contact.locked_until, contact_rooms(contact))
+                        self._leases[contact.id] = lease
+                        heapq.heappush(self._heap, (lease.expires_at, next(self._counter), contact.id))
+                    else:
+                        self._journal[contact.id] = None  # Venció con el servidor apagado
+            logger.info(f"Recovered {len(self._leases)} contact locks from database")
+        finally:
+            Session.remove()
+    
+    def flush_journal(self):
+        """
+        Escribir en la BD el último estado de los locks que cambiaron, con
+        UPDATE condicionales (solo si difiere). No cambian la versión del
+        contacto (ver conditional_contact_update): el dueño del lock guarda
+        con la versión que leyó aunque el journal se escriba entre medio.
+        """
+        with self._lock:
+            pending, self._journal = self._journal, {}
+            self._writing = pending
+        if not pending:
+            return
+        db = Session()
+        try:
+            contacts = Contact.__table__
+            for contact_id, lease in pending.items():
+                owner, until = (lease.owner, lease.expires_at) if lease else (None, None)
+                conditional_contact_update(
+                    db, contact_id, {'locked_by': owner, 'locked_until': until},
+                    where=or_(contacts.c.locked_by.is_distinct_from(owner), contacts.c.locked_until.is_distinct_from(until)),
+                    bump_version=False
+                )
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error writing lock journal: {e}")
+            db.rollback()
+            with self._lock:
+                for contact_id, lease in pending.items():
+                    self._journal.setdefault(contact_id, lease)  # Reintentar; un cambio más nuevo gana
+        finally:
+            with self._lock:
+                self._writing = {}
+            Session.remove()
+    
+    def expire(self):
+        pass  # Lo hace run() en el instante del vencimiento
+    
+    def run(self):
+        """
+        Tarea de fondo: emitir contact_unlocked al vencer cada lease y escribir
+        el journal. Duerme hasta el próximo vencimiento o la próxima escritura;
+        un lease nuevo vence al menos un minuto después de tomarse, así que
+        nunca queda antes de la próxima vuelta.
+        """
+        next_flush = time.time() + self.journal_interval
+        while True:
+            try:
+                now = datetime.utcnow()
+                for lease in self.pop_expired(now):
+                    logger.info(f"Lock expired for contact {lease.contact_id} (was locked by {lease.owner})")
+                    emit_contact_event('contact_unlocked', {
+                        'id': lease.contact_id,
+                        'expired': True,
+                        'ts': now.isoformat()
+                    }, rooms=lease.rooms)
+                if time.time() >= next_flush:
+                    self.flush_journal()
+                    next_flush = time.time() + self.journal_interval
+            except Exception as e:
+                logger.error(f"Error in lock timer: {e}")
+            
+            wait = next_flush - time.time()
+            to_expiry = self.seconds_to_next_expiry(datetime.utcnow())
+            if to_expiry is not None:
+                wait = min(wait, to_expiry)
+            socketio.sleep(max(wait, 0))
+
+
+if LOCK_BACKEND == 'memory':
+    lock_manager = MemoryLockManager(LOCK_JOURNAL_INTERVAL_SECONDS)
+    if SOCKETIO_MESSAGE_QUEUE:
+        logger.warning("LOCK_BACKEND=memory with SOCKETIO_MESSAGE_QUEUE: locks are not shared between workers")
+else:
+    lock_manager = DatabaseLockManager()
+
+
+def purge_old_tombstones():
+    """
+    Borrar lápidas más antiguas que TOMBSTONE_RETENTION_DAYS.
+    Guarda en server_state la secuencia más alta purgada (tombstone_floor):
+    un cliente con since menor a ese valor debe recargar completo.
+    """
+    db = Session()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        old = db.query(ContactTombstone).filter(ContactTombstone.deleted_at < cutoff)
+        floor = old.with_entities(func.max(ContactTombstone.seq)).scalar()
+        if floor is None:
+            return
+        
+        purged = old.delete(synchronize_session=False)
+        conn = db.connection()
+        current_floor = int(get_server_state(conn, 'tombstone_floor', 0))
+        set_server_state(conn, 'tombstone_floor', max(floor, current_floor))
+        db.commit()
+        logger.info(f"Purged {purged} contact tombstones (floor seq={floor})")
+    except Exception as e:
+        logger.error(f"Error in purge_old_tombstones: {e}")
+        db.rollback()
+    finally:
+        Session.remove()
+
+
+@app.route('/auth/register', methods=['POST'])
+@limiter.limit("5 per minute")  # Limitar registros
+def register():
     """
     Registrar nuevo usuario.
     
@@ -638,7 +2241,7 @@ def register():
         db.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/auth/login', methods=['POST'])
@@ -704,284 +2307,1537 @@ def login():
         }), 200
         
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error(f"Login error: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        Session.remove()
+
+
+@app.route('/auth/change-password', methods=['POST'])
+@require_auth
+def change_password():
+    """
+    Cambiar contraseña del usuario autenticado.
+    
+    Headers:
+    X-API-Key: api_key_valida (o usar JWT token)
+    
+    Body:
+    {
+        "old_password": "contraseña_actual",
+        "new_password": "nueva_contraseña",
+        "confirm_password": "nueva_contraseña"
+    }
+    """
+    db = Session()
+    try:
+        # Obtener usuario desde API Key
+        api_key = request.headers.get('X-API-Key')
+        user = db.query(User).filter_by(api_key=api_key, is_active=1).first()
+        
+        if not user:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        
+        data = request.get_json()
+        old_password = data.get('old_password', '').strip()
+        new_password = data.get('new_password', '').strip()
+        confirm_password = data.get('confirm_password', '').strip()
+        
+        # Validaciones
+        if not old_password:
+            return jsonify({'error': 'old_password requerida'}), 400
+        
+        if not verify_password(old_password, user.password_hash):
+            logger.warning(f"Failed password change attempt for user: {user.username}")
+            return jsonify({'error': 'Contraseña actual incorrecta'}), 401
+        
+        if len(new_password) < 4:
+            return jsonify({'error': 'Nueva contraseña debe tener mínimo 4 caracteres'}), 400
+        
+        if new_password != confirm_password:
+            return jsonify({'error': 'Las contraseñas no coinciden'}), 400
+        
+        # Actualizar contraseña
+        user.password_hash = hash_password(new_password)
+        db.commit()
+        
+        logger.info(f"Password changed for user: {user.username}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Contraseña actualizada exitosamente'
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Password change error: {e}")
+        db.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        Session.remove()
+
+
+# ========== IMPORTACIÓN MASIVA (UPSERT POR CHUNKS) ==========
+
+CONTACT_UPSERT_SQL = text("""
+    INSERT INTO contacts (
+        id, phone, name, status, note, coords, editors_history,
+        last_visibility_time, created_at, updated_at, version, priority, seq
+    ) VALUES (
+        :id, :phone, :name, :status, :note, :coords, '[]',
+        :now, :now, :now, 1, :priority, :seq
+    )
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name,
+        status = COALESCE(:status_update, contacts.status),
+        priority = COALESCE(:priority_update, contacts.priority),
+        note = COALESCE(:note_update, contacts.note),
+        updated_at = excluded.updated_at,
+        last_visibility_time = excluded.last_visibility_time,
+        version = COALESCE(contacts.version, 1) + 1,
+        seq = excluded.seq
+""").bindparams(bindparam('now', type_=DateTime()))
+
+
+def import_row_phone(c):
+    """Teléfono de una fila de /import tal como se valida y se guarda"""
+    return str(c.get('phone', '')).strip() if isinstance(c, dict) else ''
+
+
+def prepare_import_row(idx, c, normalized=None):
+    """
+    Validar y normalizar una fila de /import.
+    `normalized` es el (id, error) del teléfono ya calculado por lote con
+    phone_utils.normalize_phones; si falta se calcula aquí.
+    Retorna (fila, None) o (None, mensaje de error con el formato "Row N: ...").
+    """
+    if not isinstance(c, dict):
+        return None, f"Row {idx}: Se esperaba un objeto"
+    try:
+        # Validar teléfono y crear ID único (normalizado)
+        phone = import_row_phone(c)
+        if normalized is None:
+            normalized = phone_utils.normalize_phone_checked(phone, PHONE_REGEX)
+        cid, msg = normalized
+        if msg:
+            return None, f"Row {idx}: {msg}"
+        
+        # Validar nombre
+        name = str(c.get('name', f'Contacto {cid}')).strip()
+        valid, msg = validate_name(name)
+        if not valid:
+            return None, f"Row {idx}: {msg}"
+        
+        # Validar nota si existe
+        note = str(c.get('note', '')).strip()
+        valid, msg = validate_note(note)
+        if not valid:
+            return None, f"Row {idx}: {msg}"
+        
+        status = c.get('status', 'SIN GESTIONAR')  # Valor tal cual para contactos nuevos
+        status_update = str(c['status']).strip() if c.get('status') else None  # Solo si viene
+        return {
+            'id': cid,
+            'phone': phone,  # Guardar con formato original (+506...)
+            'name': name,
+            'status': status,
+            'priority': status_priority(status),
+            'note': note,
+            'coords': json.dumps(c.get('coords') or {}),
+            'status_update': status_update,
+            'priority_update': status_priority(status_update) if status_update else None,
+            'note_update': note or None,
+        }, None
+    except Exception as e:
+        logger.warning(f"Error importing row {idx}: {e}")
+        return None, f"Row {idx}: {str(e)}"
+
+
+class ContactImporter:
+    """
+    Upsert masivo de contactos por chunks dentro de la transacción de `db`.
+    
+    Por chunk: validación de todas las filas, un SELECT de los ids que ya
+    existen y un INSERT ... ON CONFLICT(id) DO UPDATE con executemany.
+    Los conteos son los mismos que con el procesamiento fila por fila: una
+    fila cuyo id ya existe (en la BD o antes en el mismo archivo) cuenta
+    como actualizada y como duplicado fusionado. Un contacto existente solo
+    cambia name, y status/note si vienen con valor.
+    """
+    
+    def __init__(self, db, max_errors=None):
+        self.db = db
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates_merged = 0
+        self.errors = []
+        self.error_count = 0
+        self.max_errors = max_errors  # None = guardar todos los mensajes
+        self._seq = None
+    
+    def _add_error(self, message):
+        self.error_count += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append(message)
+    
+    def add_chunk(self, rows, offset=0):
+        """
+        Procesar un chunk de tuplas (fila, error de lectura) de
+        iter_import_rows; `offset` es el índice de la primera (para "Row N")
+        """
+        prepared = []
+        ids, phone_errors = phone_utils.normalize_phones([import_row_phone(c) for c, _ in rows], PHONE_REGEX)
+        for idx, ((c, read_error), cid, phone_error) in enumerate(zip(rows, ids, phone_errors), start=offset):
+            if read_error:  # Fila que el lector no pudo interpretar
+                row, error = None, f"Row {idx}: {read_error}"
+            else:
+                row, error = prepare_import_row(idx, c, (cid, phone_error))
+            if error:
+                self._add_error(error)
+            else:
+                prepared.append(row)
+        if not prepared:
+            return
+        
+        ids = list({row['id'] for row in prepared})
+        existing = {cid for (cid,) in self.db.query(Contact.id).filter(Contact.id.in_(ids))}
+        
+        # Aplicar en orden las filas repetidas sobre una sola fila final por id
+        merged = {}
+        for row in prepared:
+            current = merged.get(row['id'])
+            if current is None and row['id'] not in existing:
+                merged[row['id']] = row
+                self.inserted += 1
+                continue
+            
+            self.updated += 1
+            self.duplicates_merged += 1
+            if current is None:
+                merged[row['id']] = row
+                continue
+            current['name'] = row['name']
+            if row['status_update']:
+                if row['id'] in existing:
+                    current['status_update'] = row['status_update']
+                    current['priority_update'] = row['priority_update']
+                else:
+                    current['status'] = row['status_update']
+                    current['priority'] = row['priority_update']
+            if row['note_update']:
+                if row['id'] in existing:
+                    current['note_update'] = row['note_update']
+                else:
+                    current['note'] = row['note_update']
+        
+        if self._seq is None:
+            self._seq = next_server_counter(self.db.connection(), 'contact_seq')
+        now = datetime.utcnow()
+        params = [dict(row, seq=self._seq, now=now) for row in merged.values()]
+        self.db.execute(CONTACT_UPSERT_SQL, params)
+        logger.debug(f"Import chunk at row {offset}: {len(prepared)} valid rows, {len(params)} upserts")
+    
+    def commit(self):
+        """Confirmar la transacción; la siguiente usa un nuevo contact_seq"""
+        self.db.commit()
+        self._seq = None
+    
+    def load_job(self, job):
+        """Continuar los conteos de un job interrumpido"""
+        self.inserted = job.inserted or 0
+        self.updated = job.updated or 0
+        self.duplicates_merged = job.duplicates_merged or 0
+        self.error_count = job.error_count or 0
+        self.errors = serialization.loads(job.errors or '[]')
+    
+    def save_job(self, job):
+        """Copiar los conteos al job (se confirman junto con el chunk)"""
+        job.inserted = self.inserted
+        job.updated = self.updated
+        job.duplicates_merged = self.duplicates_merged
+        job.error_count = self.error_count
+        job.errors = serialization.dumps(self.errors)
+    
+    def summary(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'duplicates_merged': self.duplicates_merged,
+            'errors': self.errors,
+            'total': self.inserted + self.updated
+        }
+
+
+def iter_chunks(iterable, size):
+    """Agrupar un iterable en listas de hasta `size` elementos: (offset, chunk)"""
+    chunk = []
+    offset = 0
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield offset, chunk
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        yield offset, chunk
+
+
+# ========== LECTURA INCREMENTAL DE IMPORTACIONES ==========
+
+IMPORT_FIELDS = ('phone', 'name', 'note', 'status', 'coords')
+
+# Content-Type -> formato; cualquier otro se trata como JSON (compatibilidad)
+IMPORT_FORMATS = {
+    'application/json': 'json',
+    'text/csv': 'csv',
+    NDJSON_MIMETYPE: 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+
+IMPORT_READ_SIZE = 64 * 1024
+
+
+IMPORT_CONTENT_ENCODINGS = ('identity', 'gzip')
+
+
+def import_content_encoding():
+    """Content-Encoding del cuerpo de /import ('identity' si no viene)"""
+    return (request.headers.get('Content-Encoding') or 'identity').strip().lower()
+
+
+def import_request_stream():
+    """Cuerpo de /import como stream binario, descomprimido al vuelo si viene en gzip"""
+    if import_content_encoding() == 'gzip':
+        return gzip.GzipFile(fileobj=request.stream, mode='rb')
+    return request.stream
+
+
+def import_format(mimetype):
+    """Formato del cuerpo de /import según el Content-Type"""
+    return IMPORT_FORMATS.get((mimetype or '').lower(), 'json')
+
+
+def parse_import_mapping(args):
+    """
+    Mapeo de columnas de ?map= (JSON): {"phone": "Telefono", "name": "Cliente"}.
+    Las claves son campos de contacto; los valores, la columna del CSV o la
+    clave del objeto JSON. Sin map= se usan los nombres de los campos.
+    Lanza ValueError si el mapeo no es válido.
+    """
+    raw = args.get('map')
+    if not raw:
+        return None
+    try:
+        mapping = serialization.loads(raw)
+    except Exception:
+        raise ValueError('map debe ser un objeto JSON')
+    if not isinstance(mapping, dict) or not all(isinstance(v, str) for v in mapping.values()):
+        raise ValueError('map debe ser un objeto JSON {campo: columna}')
+    unknown = set(mapping) - set(IMPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos desconocidos en map: {', '.join(sorted(unknown))}")
+    return mapping
+
+
+def _apply_import_mapping(obj, mapping):
+    """Renombrar las claves de un objeto importado según el mapeo"""
+    if not mapping or not isinstance(obj, dict):
+        return obj
+    row = {field: obj[source] for field, source in mapping.items() if source in obj}
+    for field in IMPORT_FIELDS:
+        if field not in mapping and field in obj:
+            row[field] = obj[field]
+    return row
+
+
+def iter_csv_rows(stream, mapping=None):
+    """
+    Filas de un CSV con cabecera, leído línea a línea. Las celdas vacías se
+    omiten (para que se apliquen los valores por defecto) y coords se
+    interpreta como JSON.
+    """
+    lines = (line.decode('utf-8-sig') if i == 0 else line.decode('utf-8')
+             for i, line in enumerate(stream))
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [h.strip() for h in header]
+    columns = {field: field for field in IMPORT_FIELDS}
+    columns.update(mapping or {})
+    missing = [source for source in (mapping or {}).values() if source not in header]
+    if missing:
+        raise ValueError(f"Columnas no encontradas en el CSV: {', '.join(missing)}")
+    positions = [(field, header.index(source)) for field, source in columns.items() if source in header]
+    
+    for values in reader:
+        if not any(values):
+            continue
+        row = {}
+        for field, pos in positions:
+            value = values[pos].strip() if pos < len(values) else ''
+            if value:
+                row[field] = value
+        if 'coords' in row:
+            try:
+                row['coords'] = serialization.loads(row['coords'])
+            except Exception:
+                yield None, 'coords no es JSON válido'
+                continue
+        yield row, None
+
+
+def iter_ndjson_rows(stream, mapping=None):
+    """Un objeto JSON por línea; una línea inválida cuenta como error de esa fila"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = serialization.loads(line)
+        except Exception:
+            yield None, 'JSON inválido'
+            continue
+        yield _apply_import_mapping(obj, mapping), None
+
+
+def iter_json_array(stream, mapping=None):
+    """
+    Elementos de una lista JSON leída por bloques: solo se mantiene en
+    memoria el elemento en curso, no la lista completa.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    
+    def fill(min_size=0):
+        """Leer al menos un bloque y hasta tener min_size caracteres sin consumir (o EOF)"""
+        nonlocal buf, pos, eof
+        pieces = [buf[pos:]]
+        size = len(pieces[0])
+        while not eof and (len(pieces) == 1 or size < min_size):
+            block = stream.read(IMPORT_READ_SIZE)
+            eof = not block
+            pieces.append(text_decoder.decode(block, final=eof))
+            size += len(pieces[-1])
+        buf = ''.join(pieces)
+        pos = 0
+    
+    def skip_space():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+    
+    skip_space()
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError('Se esperaba una lista de contactos')
+    pos += 1
+    while True:
+        skip_space()
+        if pos >= len(buf):
+            raise ValueError('JSON incompleto: falta "]"')
+        if buf[pos] == ']':
+            return
+        if started:
+            if buf[pos] != ',':
+                raise ValueError("JSON inválido: se esperaba ',' o ']'")
+            pos += 1
+            skip_space()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                if end < len(buf) or eof:  # Un número al final del bloque puede seguir
+                    break
+            except ValueError:
+                if eof:
+                    raise ValueError('JSON inválido en la lista de contactos')
+            # Incompleto: duplicar lo pendiente antes de reintentar, así un
+            # elemento que ocupa muchos bloques no se decodifica una vez por bloque
+            fill(2 * (len(buf) - pos))
+        pos = end
+        started = True
+        yield _apply_import_mapping(obj, mapping), None
+
+
+def iter_import_rows(stream, fmt, mapping=None):
+    """
+    Filas de un cuerpo de /import (stream binario) según su formato, como
+    tuplas (fila, None) o (None, error) para una fila que no se pudo leer.
+    Un cuerpo mal formado (no una fila) lanza ValueError.
+    """
+    if fmt == 'csv':
+        return iter_csv_rows(stream, mapping)
+    if fmt == 'ndjson':
+        return iter_ndjson_rows(stream, mapping)
+    return iter_json_array(stream, mapping)
+
+
+# ========== JOBS DE IMPORTACIÓN ASÍNCRONA ==========
+
+def import_job_to_dict(job):
+    """Estado de un job para /import/jobs/<id> e import_progress"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'format': job.format,
+        'rows_done': job.rows_done or 0,
+        'total_rows': job.total_rows,
+        'inserted': job.inserted or 0,
+        'updated': job.updated or 0,
+        'duplicates_merged': job.duplicates_merged or 0,
+        'error_count': job.error_count or 0,
+        'errors': serialization.loads(job.errors or '[]'),
+        'error': job.error,
+        'created_by': job.created_by,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at
+    }
+
+
+def spool_request_body(job_id):
+    """
+    Copiar el cuerpo del request (ya descomprimido) a IMPORT_SPOOL_DIR en
+    bloques, sin cargarlo entero en memoria. Retorna (ruta, sha256 hex,
+    bytes escritos).
+    """
+    path = os.path.join(IMPORT_SPOOL_DIR, f"{job_id}.upload")
+    digest = hashlib.sha256()
+    size = 0
+    stream = import_request_stream()
+    with open(path, 'wb') as f:
+        while True:
+            block = stream.read(64 * 1024)
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            size += len(block)
+    return path, digest.hexdigest(), size
+
+
+def enqueue_import_job(fmt='json', options=None):
+    """
+    Guardar el cuerpo en disco y encolar un ImportJob. Si ya hay un job
+    pendiente con el mismo contenido (reintento del cliente) se devuelve ese.
+    """
+    job_id = secrets.token_hex(8)
+    try:
+        path, payload_hash, size = spool_request_body(job_id)
+    except (OSError, EOFError, zlib.error) as e:  # gzip corrupto o truncado
+        spool_path = os.path.join(IMPORT_SPOOL_DIR, f"{job_id}.upload")
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+        return jsonify({'error': f'Cuerpo comprimido inválido: {e}'}), 400
+    if size == 0:
+        os.remove(path)
+        return jsonify({'error': 'Cuerpo vacío'}), 400
+    
+    db = Session()
+    try:
+        existing = db.query(ImportJob).filter(
+            ImportJob.payload_hash == payload_hash,
+            ImportJob.status.in_(['queued', 'running'])
+        ).first()
+        if existing:
+            os.remove(path)
+            logger.info(f"Import job {existing.id} already queued for this payload")
+            return jsonify({
+                'job_id': existing.id,
+                'status': existing.status,
+                'status_url': f"/import/jobs/{existing.id}",
+                'deduplicated': True
+            }), 200
+        
+        api_key = request.headers.get('X-API-Key')
+        user = get_user_from_api_key(api_key)
+        job = ImportJob(
+            id=job_id,
+            status='queued',
+            format=fmt,
+            spool_path=path,
+            payload_hash=payload_hash,
+            options=serialization.dumps(options or {}),
+            created_by=user.username if user else AUTH_TOKENS.get(api_key)
+        )
+        db.add(job)
+        db.commit()
+        logger.info(f"Import job {job_id} queued ({size} bytes, {fmt})")
+        
+        response = jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f"/import/jobs/{job_id}"
+        })
+        response.status_code = 202
+        response.headers['Location'] = f"/import/jobs/{job_id}"
+        return response
+    except Exception:
+        db.rollback()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        Session.remove()
+
+
+def open_import_rows(job):
+    """
+    (archivo, filas) del spool de un job, leídas de forma incremental en una
+    sola pasada: total_rows se conoce al terminar y mientras tanto la
+    posición en el archivo da el progreso.
+    """
+    mapping = serialization.loads(job.options or '{}').get('map')
+    spool = open(job.spool_path, 'rb')
+    return spool, iter_import_rows(spool, job.format, mapping)
+
+
+def import_job_rooms(db, job):
+    """Salas que siguen un job: quien lo subió, supervisores y la sala all"""
+    rooms = [ROOM_SUPERVISORS, ROOM_ALL]
+    user_id = db.query(User.id).filter(User.username == job.created_by).scalar() if job.created_by else None
+    if user_id:
+        rooms.append(user_room(user_id))
+    return rooms
+
+
+def emit_import_progress(job, rows_this_run, started, rooms, spool=None):
+    """
+    Evento import_progress con filas hechas, errores y ETA estimada. Sin
+    total_rows (primera pasada) el total se estima por los bytes leídos de
+    `spool` y se envía con total_rows_estimated=True.
+    """
+    total_rows = job.total_rows
+    bytes_done = total_bytes = None
+    if spool is not None and not spool.closed:
+        bytes_done, total_bytes = spool.tell(), os.fstat(spool.fileno()).st_size
+        if total_rows is None and bytes_done and job.rows_done:
+            total_rows = max(job.rows_done, round(job.rows_done * total_bytes / bytes_done))
+    eta = None
+    elapsed = time.time() - started
+    if total_rows is not None and rows_this_run and elapsed > 0:
+        eta = round((total_rows - job.rows_done) / (rows_this_run / elapsed), 1)
+    socketio.emit('import_progress', {
+        'job_id': job.id,
+        'status': job.status,
+        'rows_done': job.rows_done,
+        'total_rows': total_rows,
+        'total_rows_estimated': job.total_rows is None,
+        'bytes_done': bytes_done,
+        'total_bytes': total_bytes,
+        'error_count': job.error_count,
+        'eta_seconds': eta
+    }, to=rooms)
+
+
+def process_import_job(job_id):
+    """
+    Procesar un job por chunks. Cada chunk se confirma junto con rows_done,
+    así un job interrumpido (reinicio del servidor) se reanuda desde el
+    último chunk confirmado sin repetir ni perder filas.
+    """
+    db = Session()
+    try:
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if job.status == 'running':
+            logger.info(f"Resuming import job {job_id} at row {job.rows_done}")
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.utcnow()
+        db.commit()
+        
+        rooms = import_job_rooms(db, job)
+        importer = ContactImporter(db, max_errors=IMPORT_JOB_MAX_ERRORS)
+        importer.load_job(job)
+        start_row = job.rows_done or 0
+        started = time.time()
+        
+        spool, rows = open_import_rows(job)
+        with spool:
+            for offset, chunk in iter_chunks(itertools.islice(rows, start_row, None), IMPORT_CHUNK_SIZE):
+                importer.add_chunk(chunk, start_row + offset)
+                job.rows_done = start_row + offset + len(chunk)
+                importer.save_job(job)
+                importer.commit()
+                emit_import_progress(job, job.rows_done - start_row, started, rooms, spool)
+                socketio.sleep(0)  # Ceder a otras tareas entre chunks
+        
+        job.status = 'done'
+        job.total_rows = job.rows_done or 0
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        if os.path.exists(job.spool_path):
+            os.remove(job.spool_path)
+        
+        logger.info(
+            f"Import job {job_id} complete: {job.inserted} inserted, {job.updated} updated "
+            f"(merged {job.duplicates_merged} duplicates), {job.error_count} errors"
+        )
+        try:
+            # El job ya quedó done: un error al avisar no lo marca como failed
+            emit_import_progress(job, job.rows_done - start_row, started, rooms)
+            schedule_export_pregeneration(job.inserted + job.updated)
+            socketio.emit('bulk_update', {
+                'message': 'imported',
+                'job_id': job_id,
+                'inserted': job.inserted,
+                'updated': job.updated,
+                'duplicates_merged': job.duplicates_merged,
+                'errors': serialization.loads(job.errors or '[]')
+            })
+        except Exception as e:
+            logger.error(f"Error notifying import job {job_id} completion: {e}")
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {e}")
+        db.rollback()
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if job:
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            socketio.emit('import_progress', {'job_id': job_id, 'status': 'failed', 'error': str(e)},
+                          to=import_job_rooms(db, job))
+    finally:
+        Session.remove()
+
+
+def run_import_worker():
+    """Tarea background: procesar jobs en cola y reanudar los que quedaron a medias"""
+    while True:
+        try:
+            with app.app_context():
+                db = Session()
+                try:
+                    job = db.query(ImportJob.id).filter(
+                        ImportJob.status.in_(['queued', 'running'])
+                    ).order_by(ImportJob.created_at).first()
+                finally:
+                    Session.remove()
+                if job:
+                    process_import_job(job[0])
+                    continue
+        except Exception as e:
+            logger.error(f"Error in import worker: {e}")
+        socketio.sleep(IMPORT_JOB_POLL_SECONDS)
+
+
+def _import_accepted(response):
+    """El rate limit solo cuenta imports aceptados (no errores ni reintentos deduplicados)"""
+    return response.status_code in (201, 202)
+
+
+@app.route('/import', methods=['POST'])
+@limiter.limit(f"{IMPORT_RATE_LIMIT_PER_MINUTE} per minute", deduct_when=_import_accepted)  # Rate limiting: máximo N imports por minuto
+@require_auth
+def import_contacts():
+    """
+    Importar lote de contactos.
+    - Si el número YA existe: ACTUALIZA el registro antiguo (no crea duplicado)
+    - Si es nuevo: INSERTA nuevo registro
+    
+    Se procesa en chunks de IMPORT_CHUNK_SIZE filas (ver ContactImporter)
+    dentro de una sola transacción.
+    
+    Con ?async=1 el cuerpo se guarda en disco y se responde 202 con el
+    job_id; el progreso llega por el evento import_progress y por
+    GET /import/jobs/<id>.
+    
+    Acepta una lista JSON, CSV con cabecera (text/csv) o NDJSON
+    (application/x-ndjson); el cuerpo se lee de forma incremental y puede
+    venir comprimido (Content-Encoding: gzip).
+    ?map={"phone":"Telefono",...} indica qué columna corresponde a cada campo.
+    """
+    if import_content_encoding() not in IMPORT_CONTENT_ENCODINGS:
+        return jsonify({'error': f"Content-Encoding no soportado: {import_content_encoding()}"}), 415
+    fmt = import_format(request.mimetype)
+    try:
+        mapping = parse_import_mapping(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        try:
+            return enqueue_import_job(fmt, {'map': mapping} if mapping else None)
+        except Exception as e:
+            logger.error(f"Import enqueue error: {e}")
+            return jsonify({'error': str(e)}), 500
+    
+    db = Session()
+    importer = ContactImporter(db)
+    try:
+        rows = iter_import_rows(import_request_stream(), fmt, mapping)
+        try:
+            for offset, chunk in iter_chunks(rows, IMPORT_CHUNK_SIZE):
+                importer.add_chunk(chunk, offset)
+        except (ValueError, EOFError, gzip.BadGzipFile, zlib.error) as e:  # Cuerpo mal formado: no se guarda nada
+            db.rollback()
+            return jsonify({'error': str(e)}), 400
+
+        importer.commit()
+        result = importer.summary()
+        logger.info(
+            f"Import complete: {result['inserted']} inserted, {result['updated']} updated "
+            f"(merged {result['duplicates_merged']} duplicates), {len(result['errors'])} errors"
+        )
+        
+        schedule_export_pregeneration(result['inserted'] + result['updated'])
+        
+        socketio.emit('bulk_update', {
+            'message': 'imported',
+            'inserted': result['inserted'],
+            'updated': result['updated'],
+            'duplicates_merged': result['duplicates_merged'],
+            'errors': result['errors']
+        })
+        
+        return jsonify(result), 201
+
+    except Exception as e:
+        logger.error(f"Import error: {e}")
+        db.rollback()
+        return jsonify({'error': str(e), 'errors': importer.errors}), 500
+    finally:
+        Session.remove()
+
+
+@app.route('/import/jobs/<job_id>', methods=['GET'])
+@limiter.exempt
+@require_auth
+def get_import_job(job_id):
+    """Estado y progreso de un job de importación asíncrona"""
+    db = Session()
+    try:
+        job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+        if not job:
+            return jsonify({'error': 'Job no encontrado'}), 404
+        return jsonify(import_job_to_dict(job)), 200
+    except Exception as e:
+        logger.error(f"Error fetching import job {job_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        Session.remove()
+
+
+# ========== EXPORTACIÓN ==========
+
+# (campo, encabezado en CSV/xlsx); NDJSON usa el nombre del campo
+EXPORT_COLUMNS = (
+    ('id', 'ID'),
+    ('phone', 'Teléfono'),
+    ('name', 'Nombre'),
+    ('status', 'Estado'),
+    ('note', 'Nota'),
+    ('locked_by', 'Bloqueado Por'),
+    ('updated_at', 'Última Actualización'),
+    ('created_at', 'Creado'),
+)
+
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'ndjson': NDJSON_MIMETYPE,
+}
+
+
+def parse_export_statuses(args):
+    """Estados de ?status=NC,CUELGA (None = todos)"""
+    raw = args.get('status', '')
+    statuses = [s.strip() for s in raw.split(',') if s.strip()]
+    return statuses or None
+
+
+def build_export_query(db, statuses=None):
+    """Columnas exportadas en el orden de prioridad de GET /contacts"""
+    query = db.query(*[getattr(Contact, field) for field, _ in EXPORT_COLUMNS])
+    if statuses:
+        query = query.filter(Contact.status.in_(statuses))
+    return query.order_by(Contact.priority, Contact.updated_at, Contact.id)
+
+
+def export_row_values(row):
+    """Valores de una fila exportada (texto, fechas en ISO 8601)"""
+    return [
+        row.id,
+        row.phone,
+        row.name,
+        row.status,
+        row.note or '',
+        row.locked_by or '',
+        row.updated_at.isoformat() if row.updated_at else '',
+        row.created_at.isoformat() if row.created_at else '',
+    ]
+
+
+def export_filename(fmt):
+    return f'contactos_callmanager_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+
+
+def iter_export_chunks(fmt, statuses):
+    """
+    Bloques (bytes) de un export CSV o NDJSON, generados desde una consulta
+    yield_per en su propia sesión: STREAM_BATCH_SIZE filas por bloque.
+    El CSV lleva BOM para que Excel lo abra como UTF-8. Un error se
+    propaga: un archivo truncado no debe parecer completo.
+    """
+    db = session_factory()
+    try:
+        buffer = io.StringIO()
+        if fmt == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow([label for _, label in EXPORT_COLUMNS])
+            yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            write_row = lambda row: writer.writerow(export_row_values(row))
+        else:
+            write_row = lambda row: buffer.write(ndjson_export_row(row).decode('utf-8') + '\n')
+        
+        count = 0
+        for row in build_export_query(db, statuses).yield_per(STREAM_BATCH_SIZE):
+            write_row(row)
+            count += 1
+            if count % STREAM_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+        logger.info(f"Exported {count} contacts to {fmt.upper()}")
+    finally:
+        db.close()
+
+
+def ndjson_export_row(row):
+    return serialization.dumps_bytes(
+        {field: value for (field, _), value in zip(EXPORT_COLUMNS, export_row_values(row))}
+    )
+
+
+def write_xlsx_export(statuses, output):
+    """
+    Escribir el xlsx en `output` con openpyxl en modo write_only (las filas
+    van a disco según se agregan, no se arma el libro en memoria).
+    Retorna las filas escritas.
+    """
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Contactos')
+    sheet.append([label for _, label in EXPORT_COLUMNS])
+    
+    db = session_factory()
+    count = 0
+    try:
+        for row in build_export_query(db, statuses).yield_per(STREAM_BATCH_SIZE):
+            sheet.append(export_row_values(row))
+            count += 1
+    finally:
+        db.close()
+    
+    workbook.save(output)
+    logger.info(f"Exported {count} contacts to Excel")
+    return count
+
+
+class ExportCache:
+    """
+    Archivos de export en disco, por (formato, filtro, contact_seq).
+    
+    Toda escritura de contactos (ORM, SQL masivo o borrado) avanza
+    contact_seq, así que un archivo guardado con la secuencia actual es
+    idéntico a regenerarlo. Al guardar uno nuevo se borran las versiones
+    anteriores del mismo (formato, filtro) y, si se supera max_bytes, los
+    de uso más antiguo (mtime). start_background_tasks() la vacía al
+    arrancar: tras restaurar un backup la secuencia podría repetirse con
+    otros datos.
+    
+    El directorio lo comparten todas las réplicas, así que el estado sale
+    de listar el directorio y no de un índice en memoria: un proceso ve y
+    cuenta los archivos que guardaron los demás. open() entrega el archivo
+    ya abierto; si otra réplica lo borra después, el envío en curso sigue
+    leyendo el mismo inodo.
+    """
+    
+    _FILE_RE = re.compile(r'^(\w+)_([0-9a-f]{12})_(\d+)\.(\w+)$')
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    
+    @staticmethod
+    def key(fmt, statuses, seq):
+        return fmt, ','.join(sorted(statuses or [])), seq
+    
+    def _path(self, key):
+        fmt, filter_key, seq = key
+        digest = hashlib.sha1(filter_key.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.directory, f"{fmt}_{digest}_{seq}.{fmt}")
+    
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # En uso (Windows) o ya borrado
+    
+    def _scan(self):
+        """Exports terminados del directorio: [(mtime, ruta, bytes, (fmt, digest), seq)]"""
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return files
+        for name in names:
+            match = self._FILE_RE.match(name)
+            if not match or match.group(1) != match.group(4) or match.group(1) not in EXPORT_FORMATS:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # Lo borró otra réplica
+            files.append((st.st_mtime, path, st.st_size, match.group(1, 2), int(match.group(3))))
+        return files
+    
+    @property
+    def total_bytes(self):
+        return sum(size for _, _, size, _, _ in self._scan())
+    
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+    
+    def open(self, key):
+        """Archivo en caché abierto en binario, o None. Quien lo recibe lo cierra"""
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # Marca de uso para el desalojo
+        except OSError:
+            pass
+        return f
+    
+    def temp_path(self, key):
+        """Ruta temporal donde generar el archivo antes de put()"""
+        os.makedirs(self.directory, exist_ok=True)
+        return f"{self._path(key)}.{secrets.token_hex(4)}.tmp"
+    
+    def put(self, key, temp_path):
+        """Mover un archivo ya generado a la caché y aplicar los límites; retorna la ruta o None"""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(temp_path)
+            if size > self.max_bytes:
+                self._remove_file(temp_path)
+                return None
+            os.replace(temp_path, path)
+        except OSError:
+            # El temporal lo borró clear() de otra réplica, o el destino está abierto (Windows)
+            self._remove_file(temp_path)
+            return path if os.path.exists(path) else None
+        
+        with self._lock:
+            files = self._scan()
+            prefix = os.path.basename(path).rsplit('_', 1)[0]
+            kept = []
+            for entry in files:
+                _, entry_path, _, (fmt, digest), seq = entry
+                if entry_path == path:
+                    continue
+                if f"{fmt}_{digest}" == prefix and seq < int(key[2]):
+                    self._remove_file(entry_path)  # Versión anterior: ya no se va a pedir
+                else:
+                    kept.append(entry)
+            total = size + sum(entry[2] for entry in kept)
+            for _, evicted_path, evicted_size, _, _ in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                self._remove_file(evicted_path)
+                total -= evicted_size
+        return path
+    
+    def tee(self, chunks, key):
+        """Pasar los bloques de un export en streaming y guardarlos al terminar"""
+        temp_path = self.temp_path(key)
+        completed = False
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                self.put(key, temp_path)
+            else:
+                self._remove_file(temp_path)  # Error o descarga cancelada
+    
+    def clear(self):
+        """Borrar los exports de la caché, incluidos los que dejó una ejecución anterior"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if name.endswith(('.tmp',) + tuple(f".{fmt}" for fmt in EXPORT_FORMATS)):
+                    self._remove_file(os.path.join(self.directory, name))
+
+
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES)
+
+
+def current_contact_seq():
+    return read_write_counters(['contact_seq'])[0]
+
+
+def generate_cached_export(fmt, statuses, key):
+    """Generar un export directamente en la caché; retorna la ruta"""
+    temp_path = export_cache.temp_path(key)
+    try:
+        if fmt == 'xlsx':
+            with open(temp_path, 'wb') as f:
+                write_xlsx_export(statuses, f)
+        else:
+            with open(temp_path, 'wb') as f:
+                for chunk in iter_export_chunks(fmt, statuses):
+                    f.write(chunk)
+    except Exception:
+        export_cache._remove_file(temp_path)
+        raise
+    return export_cache.put(key, temp_path)
+
+
+def pregenerate_exports():
+    """Tarea background: dejar listos los exports completos tras una importación grande"""
+    for fmt in EXPORT_PREGENERATE_FORMATS:
+        try:
+            key = export_cache.key(fmt, None, current_contact_seq())
+            if not export_cache.contains(key):
+                generate_cached_export(fmt, None, key)
+                logger.info(f"Pre-generated {fmt} export (seq={key[2]})")
+        except Exception as e:
+            logger.error(f"Error pre-generating {fmt} export: {e}")
+
+
+def schedule_export_pregeneration(rows):
+    """Programar pregenerate_exports() si la importación fue grande"""
+    if export_cache.enabled and EXPORT_PREGENERATE_FORMATS and rows >= EXPORT_PREGENERATE_MIN_ROWS:
+        socketio.start_background_task(pregenerate_exports)
+
+
+@app.route('/export', methods=['GET'])
+@require_auth
+def export_contacts_excel():
+    """
+    Exportar contactos.
+    
+    Query params:
+    - format: xlsx (por defecto), csv o ndjson
+    - status: filtrar por estados separados por coma (ej. NC,CUELGA)
+    
+    CSV y NDJSON se envían en streaming mientras se recorre la consulta
+    (memoria constante, la descarga empieza enseguida). El xlsx se genera
+    en modo write_only sobre un archivo y luego se envía. Si los contactos
+    no cambiaron desde el último export igual, se sirve desde ExportCache.
+    """
+    fmt = request.args.get('format', 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format debe ser: {', '.join(EXPORT_FORMATS)}"}), 400
+    statuses = parse_export_statuses(request.args)
+    filename = export_filename(fmt)
+    
+    try:
+        key = None
+        if export_cache.enabled:
+            key = export_cache.key(fmt, statuses, current_contact_seq())  # Antes de leer los datos
+            cached = export_cache.open(key)
+            if cached is None and fmt == 'xlsx':
+                generate_cached_export(fmt, statuses, key)
+                cached = export_cache.open(key)
+            if cached is not None:
+                logger.debug(f"Export {fmt} served from cache (seq={key[2]})")
+                return send_file(cached, mimetype=EXPORT_FORMATS[fmt], as_attachment=True, download_name=filename)
+        
+        if fmt in ('csv', 'ndjson'):
+            chunks = iter_export_chunks(fmt, statuses)
+            if key is not None:
+                chunks = export_cache.tee(chunks, key)
+            return app.response_class(
+                stream_with_context(chunks),
+                mimetype=EXPORT_FORMATS[fmt],
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
+        
+        output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_MEMORY)
+        write_xlsx_export(statuses, output)
+        output.seek(0)
+        return send_file(output, mimetype=EXPORT_FORMATS['xlsx'], as_attachment=True, download_name=filename)
+    
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/contacts', methods=['GET'])
+@require_auth
+@conditional_get('contacts')
+def get_all():
+    """
+    Obtener contactos ordenados por prioridad, paginados por cursor.
+    
+    Orden:
+    1. NC (No Contesta) - MÁXIMA PRIORIDAD
+    2. CUELGA - ALTA PRIORIDAD
+    3. SIN_GESTIONAR - NORMAL
+    4. INTERESADO - MEDIA
+    5. SERVICIOS_ACTIVOS - BAJA
+    6. NO_EXISTE, SIN_RED, NO_CONTACTO - MÍNIMA
+    
+    Dentro de cada prioridad el orden es estable por (updated_at, id).
+    
+    Parámetros query:
+    - limit: Contactos por página (default: CONTACTS_PAGE_SIZE, máx: CONTACTS_MAX_PAGE_SIZE)
+    - cursor: Valor de next_cursor de la página anterior (opaco)
+    - all=1: Modo legacy, devuelve un arreglo con TODOS los contactos sin paginar
+    - stream=1 (o Accept: application/x-ndjson): TODOS los contactos como NDJSON,
+      un contacto por línea, con el server_seq en el header X-Server-Seq
+    - view=summary: Solo id, phone, name, status, note_preview, priority, updated_at, version
+    - fields=a,b,c: Solo los campos indicados (id siempre se incluye)
+    
+    Response (paginado):
+    {
+        "items": [...],
+        "next_cursor": "eyJ..." | null,
+        "limit": 500,
+        "server_seq": 1234
+    }
+    
+    server_seq se lee antes de la página: sirve como `since` para
+    /contacts/changes una vez terminada la carga completa.
+    """
+    try:
+        fields = parse_contact_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = Session()
+    try:
+        if wants_ndjson():
+            server_seq = int(get_server_state(db.connection(), 'contact_seq', 0))
+            return ndjson_response(
+                lambda stream_db: contact_query(stream_db, fields).order_by(Contact.priority, Contact.updated_at, Contact.id),
+                contact_serializer(fields),
+                headers={'X-Server-Seq': str(server_seq)}
+            )
+        
+        if request.args.get('all', '').lower() in ('1', 'true', 'yes'):
+            # Modo legacy: arreglo completo sin paginar
+            rows = get_contacts_sorted_by_priority(db, fields)
+            logger.debug(f"Retrieved {len(rows)} contacts (sorted by priority, unpaginated)")
+            return json_response_with_contacts(rows, fields=fields)
+        
+        limit = request.args.get('limit', CONTACTS_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, CONTACTS_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        server_seq = int(get_server_state(db.connection(), 'contact_seq', 0))
+        
+        try:
+            rows, next_cursor = get_contacts_page(db, limit, cursor, fields)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.debug(f"Retrieved page of {len(rows)} contacts (has_more={next_cursor is not None})")
+        return json_response_with_contacts(rows, {
+            'next_cursor': next_cursor,
+            'limit': limit,
+            'server_seq': server_seq
+        }, fields=fields)
+    except Exception as e:
+        logger.error(f"Error fetching contacts: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        Session.remove()
+
+
+@app.route('/contacts/changes', methods=['GET'])
+@require_auth
+@conditional_get('contacts')
+def get_contact_changes():
+    """
+    Delta sync: contactos insertados, actualizados o borrados desde una
+    secuencia del servidor.
+    
+    Parámetros query:
+    - since: server_seq recibido en la última sincronización (requerido)
+    - view / fields: Misma proyección que GET /contacts (aplica a upserts)
+    
+    Response:
+    {
+        "since": 1200,
+        "server_seq": 1234,
+        "upserts": [{...contacto...}],
+        "deletes": ["50688881234", ...],
+        "resync_required": false
+    }
+    
+    Si resync_required es true (demasiados cambios, lápidas ya purgadas o
+    secuencia desconocida) el cliente debe recargar con GET /contacts.
+    Aplicar primero deletes y después upserts.
+    """
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'Parámetro since requerido (entero >= 0)'}), 400
+    try:
+        fields = parse_contact_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = Session()
+    try:
+        conn = db.connection()
+        server_seq = int(get_server_state(conn, 'contact_seq', 0))
+        tombstone_floor = int(get_server_state(conn, 'tombstone_floor', 0))
+        
+        resync = {'since': since, 'server_seq': server_seq, 'upserts': [], 'deletes': [], 'resync_required': True}
+        if since > server_seq or since < tombstone_floor:
+            return jsonify(resync), 200
+        
+        upserts = contact_query(db, fields).filter(
+            Contact.seq > since, Contact.seq <= server_seq
+        ).order_by(Contact.seq).limit(CONTACT_CHANGES_MAX + 1).all()
+        if len(upserts) > CONTACT_CHANGES_MAX:
+            return jsonify(resync), 200
+        
+        deletes = db.query(ContactTombstone.id).filter(
+            ContactTombstone.seq > since, ContactTombstone.seq <= server_seq
+        ).all()
+        
+        logger.debug(f"Contact changes since {since}: {len(upserts)} upserts, {len(deletes)} deletes")
+        return json_response_with_contacts(upserts, {
+            'since': since,
+            'server_seq': server_seq,
+            'deletes': [row[0] for row in deletes],
+            'resync_required': False
+        }, items_key='upserts', fields=fields)
+    except Exception as e:
+        logger.error(f"Error fetching contact changes: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
-@app.route('/auth/change-password', methods=['POST'])
+@app.route('/contacts/search', methods=['GET'])
 @require_auth
-def change_password():
+@conditional_get('contacts')
+def search_contacts_endpoint():
     """
-    Cambiar contraseña del usuario autenticado.
+    Búsqueda de contactos en el servidor (FTS5 sobre nombre, teléfono y nota).
     
-    Headers:
-    X-API-Key: api_key_valida (o usar JWT token)
+    Parámetros query:
+    - q: Texto a buscar; cada palabra se busca por prefijo (requerido)
+    - limit: Máximo de resultados (default: CONTACTS_SEARCH_LIMIT, máx: CONTACTS_SEARCH_MAX_LIMIT)
+    - view / fields: Misma proyección que GET /contacts
     
-    Body:
+    Response:
     {
-        "old_password": "contraseña_actual",
-        "new_password": "nueva_contraseña",
-        "confirm_password": "nueva_contraseña"
+        "query": "juan 88",
+        "items": [...],
+        "count": 3
     }
     """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'error': 'Parámetro q requerido'}), 400
+    limit = request.args.get('limit', CONTACTS_SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, CONTACTS_SEARCH_MAX_LIMIT))
+    try:
+        fields = parse_contact_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     db = Session()
     try:
-        # Obtener usuario desde API Key
-        api_key = request.headers.get('X-API-Key')
-        user = db.query(User).filter_by(api_key=api_key, is_active=1).first()
-        
-        if not user:
-            return jsonify({'error': 'Usuario no encontrado'}), 404
-        
-        data = request.get_json()
-        old_password = data.get('old_password', '').strip()
-        new_password = data.get('new_password', '').strip()
-        confirm_password = data.get('confirm_password', '').strip()
-        
-        # Validaciones
-        if not old_password:
-            return jsonify({'error': 'old_password requerida'}), 400
-        
-        if not verify_password(old_password, user.password_hash):
-            logger.warning(f"Failed password change attempt for user: {user.username}")
-            return jsonify({'error': 'Contraseña actual incorrecta'}), 401
-        
-        if len(new_password) < 4:
-            return jsonify({'error': 'Nueva contraseña debe tener mínimo 4 caracteres'}), 400
-        
-        if new_password != confirm_password:
-            return jsonify({'error': 'Las contraseñas no coinciden'}), 400
-        
-        # Actualizar contraseña
-        user.password_hash = hash_password(new_password)
-        db.commit()
-        
-        logger.info(f"Password changed for user: {user.username}")
-        
-        return jsonify({
-            'success': True,
-            'message': 'Contraseña actualizada exitosamente'
-        }), 200
-        
+        rows = search_contacts(db, q, limit, fields)
+        logger.debug(f"Contact search '{q}': {len(rows)} results")
+        return json_response_with_contacts(rows, {
+            'query': q,
+            'count': len(rows)
+        }, fields=fields)
     except Exception as e:
-        logger.error(f"Password change error: {e}")
-        db.rollback()
+        logger.error(f"Error searching contacts: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
-@app.route('/import', methods=['POST'])
-@limiter.limit(f"{IMPORT_RATE_LIMIT_PER_MINUTE} per minute")  # Rate limiting: máximo N imports por minuto
+@app.route('/contacts/<contact_id>', methods=['GET'])
 @require_auth
-def import_contacts():
+@conditional_get('contacts')
+def get_contact(contact_id):
     """
-    Importar lote de contactos.
-    - Si el número YA existe: ACTUALIZA el registro antiguo (no crea duplicado)
-    - Si es nuevo: INSERTA nuevo registro
+    Obtener un contacto completo (o con ?fields=/?view=). La lista usa
+    view=summary y el cliente pide el detalle al abrir la edición.
     """
+    try:
+        fields = parse_contact_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     db = Session()
     try:
-        data = request.get_json(force=True)
-        if not isinstance(data, list):
-            return jsonify({'error': 'Se esperaba una lista de contactos'}), 400
-
-        inserted = 0
-        updated = 0
-        duplicates_merged = 0
-        errors = []
-
-        for idx, c in enumerate(data):
-            try:
-                # Validar teléfono
-                phone = str(c.get('phone', '')).strip()
-                valid, msg = validate_phone(phone)
-                if not valid:
-                    errors.append(f"Row {idx}: {msg}")
-                    continue
-
-                # Crear ID único (normalizado)
-                cid = normalize_phone(phone)
-                
-                if not cid:
-                    errors.append(f"Row {idx}: Teléfono no válido o vacío")
-                    continue
-                
-                # Validar nombre
-                name = str(c.get('name', f'Contacto {cid}')).strip()
-                valid, msg = validate_name(name)
-                if not valid:
-                    errors.append(f"Row {idx}: {msg}")
-                    continue
-
-                # Validar nota si existe
-                note = str(c.get('note', '')).strip()
-                valid, msg = validate_note(note)
-                if not valid:
-                    errors.append(f"Row {idx}: {msg}")
-                    continue
-
-                # ⭐ CLAVE: Buscar si el contacto EXISTE
-                obj = db.query(Contact).filter(Contact.id == cid).first()
-                
-                if obj:
-                    # ✅ EXISTE: Actualizar registro antiguo (no crear duplicado)
-                    old_name = obj.name
-                    old_status = obj.status
-                    
-                    # Actualizar campos si se proporcionan
-                    if name:
-                        obj.name = name
-                    if 'status' in c and c['status']:
-                        obj.status = str(c['status']).strip()
-                    if note:
-                        obj.note = note
-                    
-                    # Registrar que fue actualizado
-                    obj.updated_at = datetime.utcnow()
-                    # ⭐ NUEVO: Registrar que se vio (reset de visibilidad)
-                    obj.last_visibility_time = datetime.utcnow()
-                    
-                    logger.info(f"Updated existing contact: {cid} ({old_name} → {obj.name})")
-                    updated += 1
-                    duplicates_merged += 1
-                    
-                else:
-                    # ✅ NUEVO: Crear contacto nuevo
-                    obj = Contact(
-                        id=cid,
-                        phone=phone,  # Guardar con formato original (+506...)
-                        name=name,
-                        status=c.get('status', 'SIN GESTIONAR'),
-                        note=note,
-                        coords=json.dumps(c.get('coords') or {}),
-                        editors_history=json.dumps([]),
-                        last_visibility_time=datetime.utcnow(),  # ⭐ NUEVO: Inicializar visibilidad
-                        version=1
-                    )
-                    db.add(obj)
-                    inserted += 1
-                    logger.debug(f"Inserted new contact: {cid}")
-
-            except Exception as e:
-                errors.append(f"Row {idx}: {str(e)}")
-                logger.warning(f"Error importing row {idx}: {e}")
-
-        db.commit()
-        logger.info(f"Import complete: {inserted} inserted, {updated} updated (merged {duplicates_merged} duplicates)")
-        
-        socketio.emit('bulk_update', {
-            'message': 'imported',
-            'inserted': inserted,
-            'updated': updated,
-            'duplicates_merged': duplicates_merged,
-            'errors': errors
-        }, broadcast=True)
-        
-        return jsonify({
-            'inserted': inserted,
-            'updated': updated,
-            'duplicates_merged': duplicates_merged,
-            'errors': errors,
-            'total': inserted + updated
-        }), 201
-
+        row = contact_query(db, fields).filter(Contact.id == contact_id).first()
+        if not row:
+            return jsonify({'error': 'Contacto no encontrado'}), 404
+        return app.response_class(contact_serializer(fields)(row), mimetype='application/json')
     except Exception as e:
-        logger.error(f"Import error: {e}")
-        db.rollback()
-        return jsonify({'error': str(e), 'errors': errors}), 500
+        logger.error(f"Error fetching contact {contact_id}: {e}")
+        return jsonify({'error': str(e)}), 500
     finally:
         Session.remove()
 
 
-@app.route('/export', methods=['GET'])
+@app.route('/contacts/<contact_id>', methods=['PUT'])
 @require_auth
-def export_contacts_excel():
+def update_contact(contact_id):
     """
-    Exportar todos los contactos a Excel.
-    
-    Response: Archivo Excel (application/vnd.openxmlformats-officedocument.spreadsheetml.sheet)
+    Editar name, status, note y/o coords de un contacto. Con "version" en
+    el cuerpo el cambio solo se aplica si el contacto sigue en esa versión;
+    si otro escribió antes (o lo tiene bloqueado otro usuario) responde 409
+    con la fila actual en "contact".
     """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Se esperaba un objeto JSON'}), 400
+    try:
+        expected_version = parse_expected_version(payload.get('version'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     db = Session()
     try:
-        import pandas as pd
-        from io import BytesIO
-        
-        # Obtener contactos
-        rows = get_contacts_sorted_by_priority(db)
-        data = []
-        
-        for r in rows:
-            data.append({
-                'ID': r.id,
-                'Teléfono': r.phone,
-                'Nombre': r.name,
-                'Estado': r.status,
-                'Nota': r.note or '',
-                'Bloqueado Por': r.locked_by or '',
-                'Última Actualización': r.updated_at.isoformat() if r.updated_at else '',
-                'Creado': r.created_at.isoformat() if r.created_at else ''
-            })
-        
-        # Crear DataFrame
-        df = pd.DataFrame(data)
-        
-        # Crear archivo en memoria
-        output = BytesIO()
-        df.to_excel(output, index=False, sheet_name='Contactos')
-        output.seek(0)
-        
-        logger.info(f"Exported {len(data)} contacts to Excel")
+        user = get_user_from_api_key(request.headers.get('X-API-Key'))
+        username = user.username if user else 'api'
+        fields = {key: payload[key] for key in ('name', 'status', 'note', 'coords') if key in payload}
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'contactos_callmanager_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        )
-    
+        outcome, result = update_contact_fields(db, contact_id, fields, username, expected_version)
+        if outcome == 'updated':
+            logger.info(f"Contact {contact_id} updated by {username} (API)")
+            return jsonify(result)
+        if outcome == 'unchanged':
+            return jsonify({'error': 'Sin campos para actualizar (name, status, note, coords)'}), 400
+        if outcome == 'invalid':
+            return jsonify({'error': result}), 400
+        if outcome == 'not_found':
+            return jsonify({'error': 'Contacto no encontrado'}), 404
+        if outcome == 'locked':
+            return jsonify({'error': f"Bloqueado por {result['locked_by']}", 'reason': 'locked', **result}), 409
+        return jsonify({'error': 'El contacto cambió desde la versión enviada', 'reason': 'version', **result}), 409
     except Exception as e:
-        logger.error(f"Export error: {e}")
+        logger.error(f"Error updating contact {contact_id}: {e}")
+        db.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
-@app.route('/contacts', methods=['GET'])
-@require_auth
-def get_all():
+# ========== SALAS SOCKET.IO ==========
+# Cada conexión entra a las salas de su usuario y los eventos de un contacto
+# van solo a las salas de su asignación, en vez de a todos los clientes.
+
+SUPERVISOR_ROLES = ('TeamLead', 'ProjectManager', 'TI')
+ALL_ROOM_ROLES = ('ProjectManager', 'TI')  # Pueden pedir la sala "all" al conectar
+
+ROOM_ALL = 'all'  # Todos los eventos de contactos (admins y API keys de servicio)
+ROOM_SUPERVISORS = 'supervisors'  # Métricas en vivo (call_ended, import_progress)
+ROOM_UNASSIGNED = 'contacts:unassigned'  # Contactos sin asignar: todos los usuarios
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+def team_room(team_id):
+    return f"team:{team_id}"
+
+
+def socket_rooms_for(user, want_all=False):
+    """Salas de una conexión según el usuario dueño de su API key"""
+    rooms = [user_room(user.id), ROOM_UNASSIGNED]
+    if user.team_id:
+        rooms.append(team_room(user.team_id))
+    if user.role in SUPERVISOR_ROLES:
+        rooms.append(ROOM_SUPERVISORS)
+    if want_all and user.role in ALL_ROOM_ROLES:
+        rooms.append(ROOM_ALL)
+    return rooms
+
+
+def assignment_rooms(user_id, team_id):
+    """Salas de una asignación (usuario y/o equipo; sin asignar si no hay ninguno)"""
+    rooms = [ROOM_ALL]
+    if user_id:
+        rooms.append(user_room(user_id))
+    if team_id:
+        rooms.append(team_room(team_id))
+    if len(rooms) == 1:
+        rooms.append(ROOM_UNASSIGNED)
+    return rooms
+
+
+def contact_rooms(contact):
+    """Salas que reciben los eventos de un contacto según su asignación"""
+    return assignment_rooms(contact.assigned_to_user_id, contact.assigned_to_team_id)
+
+
+def emit_contact_event(event, data, contact=None, rooms=None):
+    """Emitir un evento de contacto a sus salas (`rooms` si el contacto ya no existe)"""
+    socketio.emit(event, data, to=rooms if rooms is not None else contact_rooms(contact))
+
+
+@socketio.on('connect')
+def on_connect(auth=None):
     """
-    Obtener todos los contactos ordenados por prioridad.
-    
-    Orden:
-    1. NC (No Contesta) - MÁXIMA PRIORIDAD
-    2. CUELGA - ALTA PRIORIDAD
-    3. SIN_GESTIONAR - NORMAL
-    4. INTERESADO - MEDIA
-    5. SERVICIOS_ACTIVOS - BAJA
-    6. NO_EXISTE, SIN_RED, NO_CONTACTO - MÍNIMA
-    
-    Los estados dinámicos se calculan automáticamente basados en visibilidad.
+    Unir la conexión a sus salas. La API key llega en el header X-API-Key
+    (o en auth={'api_key': ...}); auth={'all': True} pide la sala "all".
+    Una API key de servicio (AUTH_TOKENS, sin usuario) entra a "all".
     """
-    db = Session()
+    auth = auth if isinstance(auth, dict) else {}
+    api_key = request.headers.get('X-API-Key') or auth.get('api_key')
+    want_all = str(auth.get('all', '')).lower() in ('1', 'true', 'yes')
     try:
-        # Usar función que aplica ordenamiento y actualiza estados dinámicos
-        rows = get_contacts_sorted_by_priority(db)
-        out = [contact_to_dict(r) for r in rows]
-        logger.debug(f"Retrieved {len(out)} contacts (sorted by priority)")
-        return jsonify(out), 200
-    except Exception as e:
-        logger.error(f"Error fetching contacts: {e}")
-        return jsonify({'error': str(e)}), 500
+        user = get_user_from_api_key(api_key) if api_key else None
+        if user is not None:
+            rooms = socket_rooms_for(user, want_all)
+        elif validate_api_key(api_key)[0]:
+            rooms = [ROOM_ALL]
+        else:
+            rooms = []  # Sin credenciales válidas: solo eventos globales
+        for room in rooms:
+            join_room(room)
+        logger.debug(f"Socket {request.sid} joined rooms: {rooms}")
     finally:
-        db.remove()
+        Session.remove()
 
 
 @socketio.on('update_contact')
 def on_update(data):
-    """Actualizar campo de contacto con validación y historial"""
+    """
+    Actualizar campos de un contacto con validación e historial. Con
+    'version' (la que tiene el cliente) el cambio solo se aplica si nadie
+    escribió antes; si no, responde update_conflict con la fila actual.
+    """
     db = Session()
     try:
         cid = data.get('id')
@@ -991,84 +3847,28 @@ def on_update(data):
         if not cid:
             emit('error', {'message': 'ID de contacto requerido'})
             return
+        try:
+            expected_version = parse_expected_version(data.get('version'))
+        except ValueError as e:
+            emit('error', {'message': str(e)})
+            return
 
-        obj = db.query(Contact).get(cid)
-        if not obj:
+        outcome, result = update_contact_fields(db, cid, fields, user, expected_version)
+        if outcome == 'updated':
+            logger.info(f"Contact {cid} updated by {user}")  # El parche sale por contacts_patched
+        elif outcome == 'unchanged':
+            logger.debug(f"No changes for contact {cid}")
+        elif outcome == 'invalid':
+            emit('error', {'message': result})
+        elif outcome == 'not_found':
             logger.warning(f"Update attempt on non-existent contact: {cid}")
             emit('error', {'message': 'Contacto no encontrado'})
-            return
-
-        # Validar que no esté bloqueado por otro usuario
-        if obj.locked_by and obj.locked_by != user:
-            if obj.locked_until and obj.locked_until > datetime.utcnow():
-                logger.warning(f"Update denied: {cid} locked by {obj.locked_by}")
-                emit('lock_denied', {
-                    'id': cid,
-                    'locked_by': obj.locked_by,
-                    'locked_until': obj.locked_until.isoformat()
-                })
-                return
-
-        # Validar e aplicar cambios
-        changes_made = False
-        
-        if 'name' in fields:
-            new_name = str(fields['name']).strip()
-            valid, msg = validate_name(new_name)
-            if not valid:
-                emit('error', {'message': f'Nombre inválido: {msg}'})
-                return
-            
-            if new_name != obj.name:
-                hist = json.loads(obj.editors_history or '[]')
-                hist.insert(0, {
-                    'user': user,
-                    'field': 'name',
-                    'old': obj.name,
-                    'new': new_name,
-                    'ts': datetime.utcnow().isoformat()
-                })
-                obj.editors_history = json.dumps(hist[:20])  # Guardar últimos 20 cambios
-                obj.name = new_name
-                changes_made = True
-
-        if 'status' in fields:
-            obj.status = str(fields['status']).strip()
-            changes_made = True
-
-        if 'note' in fields:
-            new_note = str(fields['note']).strip()
-            valid, msg = validate_note(new_note)
-            if not valid:
-                emit('error', {'message': f'Nota inválida: {msg}'})
-                return
-            obj.note = new_note
-            changes_made = True
-
-        if 'coords' in fields:
-            try:
-                obj.coords = json.dumps(fields['coords'])
-                changes_made = True
-            except Exception as e:
-                emit('error', {'message': f'Coordenadas inválidas: {e}'})
-                return
-
-        if changes_made:
-            obj.last_called_by = user
-            obj.last_called_time = datetime.utcnow()
-            obj.updated_at = datetime.utcnow()
-            db.commit()
-            logger.info(f"Contact {cid} updated by {user}")
-
-            socketio.emit('contact_updated', {
-                'id': cid,
-                'fields': fields,
-                'user': user,
-                'ts': datetime.utcnow().isoformat(),
-                'contact': contact_to_dict(obj)
-            }, broadcast=True)
+        elif outcome == 'locked':
+            logger.warning(f"Update denied: {cid} locked by {result['locked_by']}")
+            emit('lock_denied', {'id': cid, **result})
         else:
-            logger.debug(f"No changes for contact {cid}")
+            logger.info(f"Update conflict on {cid}: expected v{result['expected_version']}, current v{result['version']}")
+            emit('update_conflict', {'id': cid, **result})
 
     except Exception as e:
         logger.error(f"Error updating contact {data.get('id', 'unknown')}: {e}")
@@ -1092,35 +3892,24 @@ def on_lock(data):
             dur = DEFAULT_LOCK_DURATION_MINUTES
             logger.warning(f"Invalid lock duration {data.get('duration_minutes')}, using default")
 
-        obj = db.query(Contact).get(cid)
-        if not obj:
+        # Si está bloqueado por otro usuario y todavía vigente, rechazar
+        lease, holder = lock_manager.acquire(db, cid, user, dur)
+        if holder:
+            logger.warning(f"Lock denied for {cid}: already locked by {holder.owner}")
+            emit('lock_denied', {**holder.to_dict(), 'message': f'Bloqueado por {holder.owner}'})
+            return
+        if lease is None:
             logger.warning(f"Lock attempt on non-existent contact: {cid}")
             emit('error', {'message': 'Contacto no encontrado'})
             return
-
-        # Si está bloqueado por otro usuario y todavía vigente, rechazar
-        if obj.locked_by and obj.locked_by != user:
-            if obj.locked_until and obj.locked_until > datetime.utcnow():
-                logger.warning(f"Lock denied for {cid}: already locked by {obj.locked_by}")
-                emit('lock_denied', {
-                    'id': cid,
-                    'locked_by': obj.locked_by,
-                    'locked_until': obj.locked_until.isoformat(),
-                    'message': f'Bloqueado por {obj.locked_by}'
-                })
-                return
-
-        obj.locked_by = user
-        obj.locked_until = datetime.utcnow() + timedelta(minutes=dur)
-        db.commit()
         logger.info(f"Contact {cid} locked by {user} for {dur} minutes")
 
-        socketio.emit('contact_locked', {
+        emit_contact_event('contact_locked', {
             'id': cid,
             'locked_by': user,
-            'locked_until': obj.locked_until.isoformat(),
+            'locked_until': lease.expires_at.isoformat(),
             'duration_minutes': dur
-        }, broadcast=True)
+        }, rooms=lease.rooms)
 
     except Exception as e:
         logger.error(f"Error locking contact {data.get('id', 'unknown')}: {e}")
@@ -1138,31 +3927,23 @@ def on_unlock(data):
         cid = data.get('id')
         user = data.get('user', 'unknown')
 
-        obj = db.query(Contact).get(cid)
-        if not obj:
-            logger.warning(f"Unlock attempt on non-existent contact: {cid}")
-            emit('error', {'message': 'Contacto no encontrado'})
-            return
-
-        # Solo el dueño del lock puede desbloquear (o admin con None)
-        if obj.locked_by and obj.locked_by != user:
-            logger.warning(f"Unlock denied: {cid} locked by {obj.locked_by}, attempted by {user}")
-            emit('error', {'message': f'Solo {obj.locked_by} puede desbloquear este contacto'})
+        # Solo el dueño del lock puede desbloquear
+        released, holder = lock_manager.release(db, cid, user)
+        if holder:
+            logger.warning(f"Unlock denied: {cid} locked by {holder.owner}, attempted by {user}")
+            emit('error', {'message': f'Solo {holder.owner} puede desbloquear este contacto'})
             return
 
-        if obj.locked_by:
-            obj.locked_by = None
-            obj.locked_until = None
-            db.commit()
+        if released:
             logger.info(f"Contact {cid} unlocked by {user}")
 
-            socketio.emit('contact_unlocked', {
+            emit_contact_event('contact_unlocked', {
                 'id': cid,
                 'unlocked_by': user,
                 'ts': datetime.utcnow().isoformat()
-            }, broadcast=True)
+            }, rooms=released.rooms)
         else:
-            logger.debug(f"Unlock request for already unlocked contact {cid}")
+            logger.debug(f"Unlock request for unlocked or non-existent contact {cid}")
 
     except Exception as e:
         logger.error(f"Error unlocking contact {data.get('id', 'unknown')}: {e}")
@@ -1173,14 +3954,32 @@ def on_unlock(data):
 
 
 def start_background_cleanup():
-    """Tarea background: limpiar locks vencidos y hacer backups periódicos"""
+    """Tarea background: limpiar locks vencidos, envejecer estados y hacer backups periódicos"""
     backup_counter = 0
+    aging_counter = 0
+    
+    # Aplicar estados por visibilidad al arrancar (la marca de agua evita repetir trabajo)
+    try:
+        with app.app_context():
+            run_auto_aging()
+    except Exception as e:
+        logger.error(f"Error in startup aging: {e}")
+    
     while True:
         socketio.sleep(CLEANUP_INTERVAL_SECONDS)
         
         try:
             with app.app_context():
-                cleanup_expired_locks()
+                lock_manager.expire()
+                purge_old_tombstones()
+                
+                # Envejecer estados cada (AGING_INTERVAL_SECONDS / CLEANUP_INTERVAL_SECONDS) ciclos
+                aging_counter += 1
+                aging_per_cycle = max(1, AGING_INTERVAL_SECONDS // CLEANUP_INTERVAL_SECONDS)
+                
+                if aging_counter >= aging_per_cycle:
+                    run_auto_aging()
+                    aging_counter = 0
                 
                 # Hacer backup cada (BACKUP_INTERVAL_MINUTES / CLEANUP_INTERVAL_SECONDS) ciclos
                 backup_counter += 1
@@ -1197,6 +3996,7 @@ def start_background_cleanup():
 
 @app.route('/metrics/personal', methods=['GET'])
 @require_role('Agent', 'TeamLead', 'ProjectManager', 'TI')
+@conditional_get('metrics')
 def get_personal_metrics(current_user):
     """
     Obtener métricas personales del usuario actual.
@@ -1232,11 +4032,12 @@ def get_personal_metrics(current_user):
         logger.error(f"Error fetching personal metrics: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/metrics/team', methods=['GET'])
 @require_role('TeamLead', 'ProjectManager', 'TI')
+@conditional_get('metrics')
 def get_team_metrics(current_user):
     """
     Obtener métricas del equipo del usuario.
@@ -1275,11 +4076,12 @@ def get_team_metrics(current_user):
         logger.error(f"Error fetching team metrics: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/metrics/all', methods=['GET'])
 @require_role('ProjectManager', 'TI')
+@conditional_get('metrics')
 def get_all_metrics(current_user):
     """
     Obtener métricas consolidadas de toda la organización.
@@ -1323,7 +4125,7 @@ def get_all_metrics(current_user):
         logger.error(f"Error fetching all metrics: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 # ========== ENDPOINTS DE RASTREO DE LLAMADAS ==========
@@ -1376,7 +4178,7 @@ def start_call_tracking(current_user):
         logger.error(f"Error iniciando rastreo de llamada: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/api/calls/end', methods=['POST'])
@@ -1465,7 +4267,7 @@ def end_call_tracking(current_user):
                 'calls_made': metrics.calls_made,
                 'avg_duration': metrics.avg_call_duration,
                 'total_talk_time': metrics.total_talk_time
-            }, skip_sid=request.sid, broadcast=True)
+            }, to=[ROOM_SUPERVISORS, ROOM_ALL, user_room(call_log.user_id)])
         except:
             pass  # No es crítico si SocketIO falla
         
@@ -1483,11 +4285,69 @@ def end_call_tracking(current_user):
         logger.error(f"Error finalizando rastreo de llamada: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
+
+
+def call_log_to_dict(call):
+    """Serializar un CallLog para /api/calls/log"""
+    return {
+        'call_id': call.id,
+        'user_id': call.user_id,
+        'contact_id': call.contact_id,
+        'contact_phone': call.contact_phone,
+        'start_time': call.start_time,
+        'end_time': call.end_time,
+        'duration_seconds': call.duration_seconds,
+        'status': call.status,
+        'notes': call.notes
+    }
+
+
+def build_call_log_query(db, role, team_id, args):
+    """Consulta de /api/calls/log con control de acceso y filtros opcionales"""
+    # Filtro base
+    query = db.query(CallLog)
+    
+    # Control de acceso
+    if role not in ['ProjectManager', 'TI']:
+        # TeamLead solo ve su equipo
+        team_users = db.query(User).filter_by(team_id=team_id).all()
+        user_ids = [u.id for u in team_users]
+        query = query.filter(CallLog.user_id.in_(user_ids))
+    
+    # Filtros opcionales
+    user_id = args.get('user_id')
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    
+    status = args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+    
+    start_date = args.get('start_date')
+    if start_date:
+        try:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+            query = query.filter(CallLog.start_time >= start_dt)
+        except:
+            pass
+    
+    end_date = args.get('end_date')
+    if end_date:
+        try:
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+            end_dt = end_dt.replace(hour=23, minute=59, second=59)
+            query = query.filter(CallLog.start_time <= end_dt)
+        except:
+            pass
+    
+    # Ordenar por fecha descendente
+    return query.order_by(CallLog.start_time.desc())
 
 
 @app.route('/api/calls/log', methods=['GET'])
 @require_role('TeamLead', 'ProjectManager', 'TI')
+@conditional_get('call_logs')
 def get_call_logs(current_user):
     """
     Obtener historial de llamadas (con filtros).
@@ -1498,72 +4358,35 @@ def get_call_logs(current_user):
     - end_date: Fecha fin (YYYY-MM-DD)
     - status: Filtrar por estado
     - limit: Máximo de registros (default: 100)
+    - stream=1 (o Accept: application/x-ndjson): NDJSON, una llamada por línea;
+      sin límite salvo que se indique `limit`
     
     Retorna:
     - Lista de llamadas con duración, estado, usuario, contacto
     """
+    role, team_id, args = current_user.role, current_user.team_id, request.args.copy()
+    
+    if wants_ndjson():
+        limit = request.args.get('limit', type=int)
+        return ndjson_response(
+            lambda stream_db: build_call_log_query(stream_db, role, team_id, args).limit(limit),
+            lambda call: serialization.dumps_bytes(call_log_to_dict(call))
+        )
+    
     db = Session()
     try:
         limit = request.args.get('limit', 100, type=int)
         limit = min(limit, 1000)  # Máximo 1000 registros
         
-        # Filtro base
-        query = db.query(CallLog)
-        
-        # Control de acceso
-        if current_user.role not in ['ProjectManager', 'TI']:
-            # TeamLead solo ve su equipo
-            team_users = db.query(User).filter_by(team_id=current_user.team_id).all()
-            user_ids = [u.id for u in team_users]
-            query = query.filter(CallLog.user_id.in_(user_ids))
-        
-        # Filtros opcionales
-        user_id = request.args.get('user_id')
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        
-        status = request.args.get('status')
-        if status:
-            query = query.filter_by(status=status)
-        
-        start_date = request.args.get('start_date')
-        if start_date:
-            try:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                query = query.filter(CallLog.start_time >= start_dt)
-            except:
-                pass
-        
-        end_date = request.args.get('end_date')
-        if end_date:
-            try:
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-                end_dt = end_dt.replace(hour=23, minute=59, second=59)
-                query = query.filter(CallLog.start_time <= end_dt)
-            except:
-                pass
-        
-        # Ordenar por fecha descendente y limitar
-        calls = query.order_by(CallLog.start_time.desc()).limit(limit).all()
-        
-        result = [{
-            'call_id': call.id,
-            'user_id': call.user_id,
-            'contact_id': call.contact_id,
-            'contact_phone': call.contact_phone,
-            'start_time': call.start_time.isoformat() if call.start_time else None,
-            'end_time': call.end_time.isoformat() if call.end_time else None,
-            'duration_seconds': call.duration_seconds,
-            'status': call.status,
-            'notes': call.notes
-        } for call in calls]
+        calls = build_call_log_query(db, role, team_id, args).limit(limit).all()
+        result = [call_log_to_dict(call) for call in calls]
         
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Error fetching call logs: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/config', methods=['GET'])
@@ -1612,7 +4435,7 @@ def update_config(current_user):
         logger.error(f"Error updating config: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/contacts/<contact_id>', methods=['DELETE'])
@@ -1639,19 +4462,26 @@ def delete_contact(contact_id):
         # Eliminar
         contact_name = contact.name
         contact_phone = contact.phone
+        rooms = contact_rooms(contact)
         db.delete(contact)
+        # Lápida para que los clientes con delta sync vean el borrado
+        db.merge(ContactTombstone(
+            id=contact_id,
+            deleted_by=user.username,
+            deleted_at=datetime.utcnow()
+        ))
         db.commit()
         
         logger.warning(f"Contact deleted by {user.username}: {contact_id} ({contact_name} {contact_phone})")
         
-        # Notificar a todos los clientes
-        socketio.emit('contact_deleted', {
+        # Notificar a las salas del contacto
+        emit_contact_event('contact_deleted', {
             'id': contact_id,
             'name': contact_name,
             'phone': contact_phone,
             'deleted_by': user.username,
             'ts': datetime.utcnow().isoformat()
-        }, broadcast=True)
+        }, rooms=rooms)
         
         return jsonify({
             'success': True,
@@ -1664,7 +4494,7 @@ def delete_contact(contact_id):
         db.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/api/generate_contacts', methods=['POST'])
@@ -1711,13 +4541,17 @@ def api_generate_contacts():
         # Opcionalmente guardar en BD
         if save_to_db:
             imported = 0
-            for p in phones:
+            ids, errors = phone_utils.normalize_phones([p['formatted'] for p in phones], PHONE_REGEX)
+            existing = {cid for (cid,) in db.query(Contact.id).filter(Contact.id.in_([cid for cid in ids if cid]))}
+            for p, contact_id, error in zip(phones, ids, errors):
                 try:
-                    # Evitar duplicados
-                    contact_id = p['number']
-                    existing = db.query(Contact).filter(Contact.id == contact_id).first()
+                    if error:
+                        logger.warning(f"Skipping generated phone {p['formatted']}: {error}")
+                        continue
                     
-                    if not existing:
+                    # Evitar duplicados
+                    if contact_id not in existing:
+                        existing.add(contact_id)
                         contact = Contact(
                             id=contact_id,
                             phone=p['formatted'],  # Guardar con formato
@@ -1740,7 +4574,7 @@ def api_generate_contacts():
             socketio.emit('bulk_update', {
                 'message': 'contacts_generated',
                 'count': imported
-            }, broadcast=True)
+            })
         
         return jsonify({
             'success': True,
@@ -1754,7 +4588,7 @@ def api_generate_contacts():
         db.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/health', methods=['GET'])
@@ -1763,7 +4597,7 @@ def health_check():
     try:
         db = Session()
         db.execute("SELECT 1")
-        db.remove()
+        Session.remove()
         return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow()}), 200
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -1793,7 +4627,7 @@ def list_users():
         logger.error(f"Error listing users: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
 
 
 @app.route('/admin/users/<user_id>', methods=['DELETE'])
@@ -1822,7 +4656,57 @@ def delete_user(user_id):
         db.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        db.remove()
+        Session.remove()
+
+
+# ========== TAREAS DE FONDO ==========
+
+_background_tasks_lock = None  # Archivo con flock: se mantiene abierto mientras viva el proceso
+
+
+def acquire_background_tasks_lock():
+    """
+    True si este proceso debe correr las tareas de fondo. Con varios workers
+    (gunicorn, réplicas en la misma máquina) solo uno obtiene el flock sobre
+    BACKGROUND_TASKS_LOCK_FILE; si muere, el sistema lo libera y lo toma el
+    worker que lo reemplaza.
+    """
+    global _background_tasks_lock
+    try:
+        import fcntl
+    except ImportError:
+        return True  # Windows: un solo proceso
+    lock_file = open(BACKGROUND_TASKS_LOCK_FILE, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _background_tasks_lock = lock_file
+    return True
+
+
+def start_background_tasks():
+    """Limpieza/backups y worker de importaciones, en un solo worker del despliegue"""
+    if isinstance(lock_manager, MemoryLockManager):
+        # Los leases son de este proceso: su timer corre aquí aunque no sea el líder
+        lock_manager.recover()
+        socketio.start_background_task(lock_manager.run)
+    
+    if not acquire_background_tasks_lock():
+        logger.info(f"Background tasks run in another worker (pid {os.getpid()} skips them)")
+        return False
+    logger.info(f"Background tasks running in pid {os.getpid()}")
+    
+    if export_cache.enabled:
+        export_cache.clear()  # Antes de pregenerar: los archivos viejos pueden no coincidir con la BD
+    
+    # Iniciar tarea de limpieza y backup
+    socketio.start_background_task(start_background_cleanup)
+    
+    # Worker de importaciones asíncronas (reanuda jobs interrumpidos)
+    socketio.start_background_task(run_import_worker)
+    return True
 
 
 if __name__ == '__main__':
@@ -1853,8 +4737,7 @@ if __name__ == '__main__':
     # Crear backup inicial
     create_backup()
 
-    # Iniciar tarea de limpieza y backup
-    socketio.start_background_task(start_background_cleanup)
+    start_background_tasks()
 
     # Ejecutar servidor
     socketio.run(app, host=SERVER_HOST, port=SERVER_PORT, debug=DEBUG)
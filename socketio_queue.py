@@ -0,0 +1,171 @@
+"""
+socketio_queue.py - Colas de mensajes para Socket.IO con varios workers
+
+Con SOCKETIO_MESSAGE_QUEUE cada socketio.emit se publica en una cola y
+cada worker lo entrega a sus propios clientes, así un evento emitido en
+un worker (o en una tarea de fondo) llega a todos los clientes conectados.
+
+- redis://, amqp://, kafka://...: los resuelve Flask-SocketIO (producción).
+- local://: bus en memoria entre servidores del mismo proceso (pruebas).
+- unix:///ruta/directorio: datagramas Unix entre procesos de la misma
+  máquina, sin servicios externos. Cada worker enlaza un socket en el
+  directorio y cada publicación se envía a todos los sockets presentes.
+
+Los transportes (LocalBus, UnixSocketBus) no dependen de python-socketio;
+LocalPubSubManager y UnixSocketPubSubManager los conectan a su PubSubManager.
+Con eventlet el proceso debe estar parcheado (monkey_patch), como con
+redis: el worker eventlet de gunicorn ya lo hace.
+"""
+import glob
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+
+import serialization
+
+try:
+    from socketio import PubSubManager
+except ImportError:
+    PubSubManager = None
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de un mensaje por socket Unix (el kernel puede limitarlo más)
+UNIX_MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+UNIX_SOCKET_SUFFIX = '.sock'
+
+
+class LocalBus:
+    """Bus en memoria: cada mensaje llega a todos los suscriptores del canal en este proceso"""
+
+    _subscribers = {}  # canal -> [queue.Queue]
+    _lock = threading.Lock()
+
+    def __init__(self, channel='socketio'):
+        self.channel = channel
+
+    def publish(self, message):
+        # Se serializa igual que en una cola real: cada suscriptor recibe su copia
+        data = serialization.dumps(message)
+        with self._lock:
+            inboxes = list(self._subscribers.get(self.channel, ()))
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def listen(self):
+        """Suscribirse ya y retornar un iterador (bloqueante) de mensajes"""
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(self.channel, []).append(inbox)
+
+        def messages():
+            try:
+                while True:
+                    yield serialization.loads(inbox.get())
+            finally:
+                with self._lock:
+                    self._subscribers[self.channel].remove(inbox)
+
+        return messages()
+
+
+class UnixSocketBus:
+    """Bus entre procesos de la misma máquina con datagramas Unix en `directory`"""
+
+    def __init__(self, directory, channel='socketio'):
+        self.directory = directory
+        self.channel = channel
+        os.makedirs(directory, exist_ok=True)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def _peers(self):
+        return glob.glob(os.path.join(glob.escape(self.directory), f'{self.channel}.*{UNIX_SOCKET_SUFFIX}'))
+
+    def publish(self, message):
+        data = serialization.dumps_bytes(message)
+        if len(data) > UNIX_MAX_MESSAGE_BYTES:
+            logger.error(f"Socket.IO message too large for unix queue ({len(data)} bytes), dropped")
+            return
+        for path in self._peers():
+            try:
+                self._sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Worker que terminó sin borrar su socket
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                logger.error(f"Error publishing to {path}: {e}")
+
+    def listen(self):
+        """Enlazar el socket de este proceso ya y retornar un iterador de mensajes"""
+        path = os.path.join(
+            self.directory, f'{self.channel}.{os.getpid()}.{uuid.uuid4().hex[:8]}{UNIX_SOCKET_SUFFIX}'
+        )
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UNIX_MAX_MESSAGE_BYTES)
+        except OSError:
+            pass
+        sock.bind(path)
+        os.chmod(path, 0o600)
+
+        def messages():
+            try:
+                while True:
+                    yield serialization.loads(sock.recv(UNIX_MAX_MESSAGE_BYTES))
+            finally:
+                sock.close()
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        return messages()
+
+
+if PubSubManager is not None:
+    class LocalPubSubManager(PubSubManager):
+        """Cola local:// para pruebas: relaya entre servidores Socket.IO del mismo proceso"""
+        name = 'local'
+
+        def __init__(self, channel='socketio', write_only=False, logger=None):
+            super().__init__(channel=channel, write_only=write_only, logger=logger)
+            self.bus = LocalBus(channel)
+
+        def _publish(self, data):
+            self.bus.publish(data)
+
+        def _listen(self):
+            return self.bus.listen()
+
+
+    class UnixSocketPubSubManager(PubSubManager):
+        """Cola unix:// entre workers de la misma máquina"""
+        name = 'unix'
+
+        def __init__(self, url, channel='socketio', write_only=False, logger=None):
+            super().__init__(channel=channel, write_only=write_only, logger=logger)
+            self.bus = UnixSocketBus(url[len('unix://'):], channel)
+
+        def _publish(self, data):
+            self.bus.publish(data)
+
+        def _listen(self):
+            return self.bus.listen()
+
+
+def client_manager_for(url, channel='socketio', write_only=False):
+    """
+    Manager para SOCKETIO_MESSAGE_QUEUE local:// o unix://; None para las
+    URLs que Flask-SocketIO resuelve por sí mismo (redis://, amqp://, ...).
+    """
+    if url.startswith('local://'):
+        return LocalPubSubManager(channel=channel, write_only=write_only)
+    if url.startswith('unix://'):
+        return UnixSocketPubSubManager(url, channel=channel, write_only=write_only)
+    return None
@@ -0,0 +1,94 @@
+"""
+conftest.py - Las pruebas que importan server.py usan una BD, spool,
+backups y caché de exportaciones temporales (nunca los del repo), y
+Socket.IO en modo threading para socketio.test_client().
+"""
+
+import gzip
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='callmanager-tests-')
+
+os.environ.update({
+    'DATABASE_PATH': os.path.join(TEST_DATA_DIR, 'contacts.db'),
+    'BACKUP_DIR': os.path.join(TEST_DATA_DIR, 'backups'),
+    'IMPORT_SPOOL_DIR': os.path.join(TEST_DATA_DIR, 'import_spool'),
+    'EXPORT_CACHE_DIR': os.path.join(TEST_DATA_DIR, 'export_cache'),
+    'LOG_FILE': os.path.join(TEST_DATA_DIR, 'callmanager.log'),
+    'SOCKETIO_ASYNC_MODE': 'threading',
+    'CONTACT_PATCH_WINDOW_MS': '0',
+    'LOCK_BACKEND': 'memory',
+    'EXPORT_PREGENERATE_FORMATS': '',
+})
+os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+
+
+@pytest.fixture
+def server():
+    """Módulo server con contactos, lápidas, jobs y locks vacíos"""
+    import server as module
+    module.limiter.enabled = False
+    with module.engine.begin() as conn:
+        for table_name in ('contacts', 'contact_tombstones', 'import_jobs'):
+            conn.execute(module.text(f"DELETE FROM {table_name}"))
+        conn.execute(module.text("DELETE FROM server_state WHERE key LIKE 'aging_%'"))
+    module.contact_json_cache.clear()
+    if isinstance(module.lock_manager, module.MemoryLockManager):
+        module.lock_manager = module.MemoryLockManager(module.LOCK_JOURNAL_INTERVAL_SECONDS)
+    yield module
+    module.Session.remove()
+
+
+@pytest.fixture
+def api_headers(server):
+    return {'X-API-Key': server.DEFAULT_API_KEY}
+
+
+class FlaskAdapter(BaseAdapter):
+    """
+    Adaptador de requests que envía las peticiones al test client de Flask.
+    Descomprime las respuestas (gzip, br) como lo haría urllib3.
+    """
+
+    def __init__(self, app):
+        super().__init__()
+        self.client = app.test_client()
+        self.sent = []  # Headers de cada petición enviada
+
+    def send(self, request, **kwargs):
+        self.sent.append(dict(request.headers))
+        flask_response = self.client.open(request.path_url, method=request.method,
+                                          headers=dict(request.headers), data=request.body)
+        response = requests.Response()
+        response.status_code = flask_response.status_code
+        response.headers = requests.structures.CaseInsensitiveDict(flask_response.headers)
+        body = flask_response.get_data()
+        encoding = flask_response.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'br':
+            import brotli
+            body = brotli.decompress(body)
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def flask_adapter(server):
+    """Montar con session.mount('http://server/', flask_adapter) para llamar al server desde el cliente"""
+    return FlaskAdapter(server.app)
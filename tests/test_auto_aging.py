@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+test_auto_aging.py - run_auto_aging: estados por visibilidad en bloque,
+evento contacts_aged y filas que la marca de agua no ve (pasada completa).
+"""
+
+from datetime import datetime, timedelta
+
+
+def add_contact(server, contact_id, status='SIN GESTIONAR', months_ago=4, **extra):
+    db = server.Session()
+    try:
+        seen = datetime.utcnow() - timedelta(days=31 * months_ago)
+        values = {'last_visibility_time': seen, 'created_at': seen, **extra}
+        db.add(server.Contact(id=contact_id, phone=contact_id, name=f'Contacto {contact_id}', status=status, **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def contact_status(server, contact_id):
+    with server.engine.connect() as conn:
+        return conn.execute(server.text("SELECT status FROM contacts WHERE id = :id"), {'id': contact_id}).scalar()
+
+
+def test_stale_contact_is_aged_and_broadcast(server, api_headers):
+    """Un contacto de 4 meses pasa a NO_EXISTE y todos los clientes reciben contacts_aged"""
+    add_contact(server, '88880001')
+    add_contact(server, '88880002', months_ago=1)
+    client = server.socketio.test_client(server.app, headers=api_headers)
+
+    changes = server.run_auto_aging()
+
+    assert changes == {'NO_EXISTE': ['88880001']}
+    assert contact_status(server, '88880001') == 'NO_EXISTE'
+    assert contact_status(server, '88880002') == 'SIN GESTIONAR'
+    events = [e for e in client.get_received() if e['name'] == 'contacts_aged']
+    assert len(events) == 1
+    assert events[0]['args'][0]['changes'] == {'NO_EXISTE': ['88880001']}
+    client.disconnect()
+
+
+def test_unprotected_row_is_aged_on_full_pass(server):
+    """Un contacto que cruzó el umbral protegido se envejece en la siguiente pasada completa"""
+    add_contact(server, '88880003', status='INTERESADO')
+    assert server.run_auto_aging() == {}
+
+    with server.engine.begin() as conn:
+        conn.execute(server.text("UPDATE contacts SET status = 'NC' WHERE id = '88880003'"))
+    assert server.run_auto_aging() == {}  # La marca de agua ya pasó su last_visibility_time
+
+    with server.engine.begin() as conn:
+        stale = (datetime.utcnow() - timedelta(hours=server.AGING_FULL_PASS_HOURS + 1)).isoformat()
+        server.set_server_state(conn, 'aging_full_pass', stale)
+    assert server.run_auto_aging() == {'NO_EXISTE': ['88880003']}
+
+
+def test_backfilled_row_is_aged_immediately(server):
+    """Una fila sin last_visibility_time se rellena con created_at y se envejece en la misma corrida"""
+    server.run_auto_aging()  # Deja marcas de agua
+    add_contact(server, '88880004')
+    with server.engine.begin() as conn:
+        conn.execute(server.text("UPDATE contacts SET last_visibility_time = NULL WHERE id = '88880004'"))
+
+    assert server.run_auto_aging() == {'NO_EXISTE': ['88880004']}
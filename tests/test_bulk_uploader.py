@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+test_bulk_uploader.py - BulkUploader con una sesión HTTP simulada:
+reintentos de _send (429 con Retry-After, 502/503/504, nunca un 500),
+traducción de "Row N" del servidor a filas del archivo y elección entre
+lotes y job ?async=1.
+"""
+
+import gzip
+import json
+
+import pytest
+import requests
+
+from client import bulk_uploader
+from client.bulk_uploader import BulkUploader
+
+
+class StubResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body if body is not None else {}
+        self.text = json.dumps(self._body)
+
+    def json(self):
+        return self._body
+
+
+class StubSession:
+    """Responde en orden con `responses` (StubResponse o excepción) y guarda las peticiones"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, data=None, **kwargs):
+        if hasattr(data, 'read'):
+            data = data.read()
+        self.requests.append({'method': method, 'url': url, 'data': data, **kwargs})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(bulk_uploader.time, 'sleep', waited.append)
+    return waited
+
+
+def uploader(responses, **kwargs):
+    instance = BulkUploader('http://server/', {'X-API-Key': 'k'}, **kwargs)
+    instance.session = StubSession(responses)
+    return instance
+
+
+def sent_rows(request):
+    return json.loads(gzip.decompress(request['data']))
+
+
+def test_429_waits_retry_after_without_spending_retries(sleeps):
+    up = uploader([StubResponse(429, headers={'Retry-After': '3'}), StubResponse(429), StubResponse(200, {'ok': 1})],
+                  max_retries=0)
+    assert up._send('POST', up.url, data=b'x') == {'ok': 1}
+    assert len(up.session.requests) == 3
+    assert sleeps[0] == 3.0
+    assert 0 < sleeps[1] <= bulk_uploader.BACKOFF_BASE_SECONDS * 2
+
+
+@pytest.mark.parametrize('status', sorted(bulk_uploader.RETRY_STATUS))
+def test_gateway_errors_are_retried(sleeps, status):
+    up = uploader([StubResponse(status), StubResponse(status, headers={'Retry-After': '1'}), StubResponse(200, {})],
+                  max_retries=2)
+    assert up._send('POST', up.url, data=b'x') == {}
+    assert len(up.session.requests) == 3
+    assert sleeps[1] == 1.0
+
+
+def test_gateway_errors_give_up_after_max_retries(sleeps):
+    up = uploader([StubResponse(503, {'error': 'mantenimiento'})] * 3, max_retries=2)
+    with pytest.raises(RuntimeError, match='HTTP 503: mantenimiento'):
+        up._send('POST', up.url, data=b'x')
+    assert len(up.session.requests) == 3
+
+
+def test_500_is_not_retried(sleeps):
+    up = uploader([StubResponse(500, {'error': 'fallo'}), StubResponse(200, {})])
+    with pytest.raises(RuntimeError, match='HTTP 500: fallo'):
+        up._send('POST', up.url, data=b'x')
+    assert len(up.session.requests) == 1 and sleeps == []
+
+
+def test_network_errors_are_retried_and_file_body_rewound(sleeps, tmp_path):
+    body = tmp_path / 'body'
+    body.write_bytes(b'contenido')
+    up = uploader([requests.ConnectionError('caída'), requests.Timeout('lento'), StubResponse(200, {})])
+    with open(body, 'rb') as f:
+        up._send('POST', up.url, data=f)
+    assert [r['data'] for r in up.session.requests] == [b'contenido'] * 3
+    assert len(sleeps) == 2
+
+
+def test_server_row_numbers_map_to_file_rows(sleeps):
+    rows = [
+        {'phone': '8888-1111', 'name': 'Ana'},
+        {'phone': 'abc', 'name': 'Sin teléfono'},  # Fila 2: la rechaza el cliente
+        {'phone': '8888-3333', 'name': ''},  # Fila 3: "Row 1" del primer lote
+        {'phone': '8888-4444', 'name': 'Luis'},
+        {'phone': '8888-5555', 'name': ''},  # Fila 5: "Row 1" del segundo lote
+    ]
+    up = uploader([
+        StubResponse(201, {'inserted': 1, 'updated': 0, 'duplicates_merged': 0, 'errors': ['Row 1: Nombre vacío']}),
+        StubResponse(201, {'inserted': 0, 'updated': 1, 'duplicates_merged': 1, 'errors': ['Row 1: Nombre vacío']}),
+    ], batch_size=3, max_workers=1)
+    progress = []
+
+    report = up.upload(rows, total_rows=5, progress=lambda done, total: progress.append((done, total)))
+
+    assert [len(sent_rows(r)) for r in up.session.requests] == [2, 2]
+    assert all('params' not in r for r in up.session.requests)
+    errors = sorted(report.errors, key=bulk_uploader._error_row)
+    assert errors[0].startswith('Fila 2: ')
+    assert errors[1:] == ['Fila 3: Nombre vacío', 'Fila 5: Nombre vacío']
+    assert (report.inserted, report.updated, report.duplicates_merged) == (1, 1, 1)
+    assert progress == [(3, 5), (5, 5)]
+
+
+def test_large_file_goes_as_async_job(sleeps):
+    rows = [{'phone': f'8888{n:04d}', 'name': f'C{n}'} for n in range(5)]
+    job = {'job_id': 'j1', 'status_url': '/import/jobs/j1', 'status': 'queued'}
+    done = {'status': 'done', 'rows_done': 5, 'total_rows': 5, 'inserted': 4, 'updated': 0, 'duplicates_merged': 0,
+            'error_count': 3, 'errors': ['Row 4: Teléfono inválido'], 'error': None}
+    up = uploader([StubResponse(202, job), StubResponse(200, dict(done, status='running', rows_done=2)),
+                   StubResponse(200, done)], async_min_rows=5)
+    progress = []
+
+    report = up.upload(iter(rows), progress=lambda done, total: progress.append((done, total)))
+
+    post, *polls = up.session.requests
+    assert post['params'] == {'async': '1'}
+    assert post['headers']['Content-Type'] == 'application/x-ndjson'
+    assert [json.loads(line) for line in gzip.decompress(post['data']).splitlines()] == rows
+    assert [p['url'] for p in polls] == ['http://server/import/jobs/j1'] * 2
+    assert progress == [(2, 5), (5, 5)]
+    assert report.inserted == 4
+    assert report.errors == ['Fila 5: Teléfono inválido'] and report.unlisted_errors == 2
+
+
+def test_small_file_without_total_goes_in_batches(sleeps):
+    rows = [{'phone': f'8888{n:04d}', 'name': f'C{n}'} for n in range(4)]
+    up = uploader([StubResponse(201, {'inserted': 4, 'updated': 0, 'duplicates_merged': 0, 'errors': []})],
+                  async_min_rows=5)
+    report = up.upload(iter(rows))
+    assert len(up.session.requests) == 1 and 'params' not in up.session.requests[0]
+    assert sent_rows(up.session.requests[0]) == rows
+    assert report.inserted == 4 and report.errors == []
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+test_client_export.py - contact_export del cliente: descarga de /export
+según la extensión y .json con los contactos completos (no la vista
+summary de la lista); un error no deja archivo.
+"""
+
+import csv
+import io
+import json
+
+from datetime import datetime
+
+import pytest
+import requests
+
+from client.contact_export import export_contacts, export_format
+
+
+def add_contact(server, contact_id, status, note):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status=status, note=note,
+                              created_at=now, last_visibility_time=now, coords='{"lat": 9.93}'))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+@pytest.fixture
+def session(flask_adapter):
+    session = requests.Session()
+    session.mount('http://server/', flask_adapter)
+    return session
+
+
+def test_export_format_from_extension():
+    assert export_format('/tmp/a.CSV') == 'csv'
+    assert export_format('/tmp/a.ndjson') == 'ndjson'
+    assert export_format('/tmp/a.json') == 'json'
+    assert export_format('/tmp/a.xlsx') == 'xlsx'
+    assert export_format('/tmp/contactos') == 'xlsx'
+
+
+def test_csv_comes_from_server_export(server, api_headers, session, tmp_path):
+    long_note = 'Nota larga ' * 30
+    add_contact(server, '88881111', 'NC', long_note)
+    add_contact(server, '88882222', 'CUELGA', '')
+    path = tmp_path / 'contactos.csv'
+
+    written = export_contacts('http://server', api_headers, str(path), statuses=['NC'], session=session)
+
+    assert written == path.stat().st_size
+    rows = list(csv.reader(io.StringIO(path.read_text(encoding='utf-8-sig'))))
+    assert rows[0] == [label for _, label in server.EXPORT_COLUMNS]
+    assert [row[0] for row in rows[1:]] == ['88881111']
+    assert rows[1][4] == long_note  # Nota completa, no note_preview
+    assert list(tmp_path.iterdir()) == [path]  # Sin temporales
+
+
+def test_json_has_full_contacts(server, api_headers, session, tmp_path):
+    long_note = 'Nota larga ' * 30
+    add_contact(server, '88881111', 'NC', long_note)
+    add_contact(server, '88882222', 'CUELGA', '')
+    path = tmp_path / 'contactos.json'
+
+    export_contacts('http://server', api_headers, str(path), session=session)
+
+    contacts = json.loads(path.read_text(encoding='utf-8'))
+    assert [c['id'] for c in contacts] == ['88881111', '88882222']
+    assert contacts[0]['note'] == long_note
+    assert contacts[0]['coords'] == {'lat': 9.93}
+    assert 'note_preview' not in contacts[0]
+
+
+def test_json_export_of_empty_list(server, api_headers, session, tmp_path):
+    path = tmp_path / 'vacio.json'
+    export_contacts('http://server', api_headers, str(path), session=session)
+    assert json.loads(path.read_text(encoding='utf-8')) == []
+
+
+def test_server_error_leaves_no_file(server, session, tmp_path):
+    path = tmp_path / 'contactos.xlsx'
+    with pytest.raises(Exception, match='API key'):
+        export_contacts('http://server', {'X-API-Key': 'no-valida'}, str(path), session=session)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+test_conditional_get.py - GET condicional (conditional_get): 304 con el
+mismo If-None-Match, ETag nuevo tras una escritura, el ETag con sufijo de
+compresión también valida, y ETagSession del cliente reutiliza la
+respuesta guardada cuando el servidor responde 304.
+"""
+
+from datetime import datetime
+
+from client.http_cache import ETagSession
+
+
+def add_contact(server, contact_id, note=''):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status='SIN GESTIONAR', note=note,
+                              created_at=now, last_visibility_time=now))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def test_same_etag_gets_304_until_a_write(server, api_headers):
+    add_contact(server, '88881111')
+    client = server.app.test_client()
+
+    first = client.get('/contacts', headers=api_headers)
+    assert first.status_code == 200 and first.headers['ETag']
+    etag = first.headers['ETag']
+
+    again = client.get('/contacts', headers={**api_headers, 'If-None-Match': etag})
+    assert again.status_code == 304 and again.get_data() == b''
+    assert again.headers['ETag'] == etag
+
+    add_contact(server, '88882222')
+    after_write = client.get('/contacts', headers={**api_headers, 'If-None-Match': etag})
+    assert after_write.status_code == 200
+    assert after_write.headers['ETag'] != etag
+    assert [c['id'] for c in after_write.get_json()['items']] == ['88881111', '88882222']
+
+
+def test_compressed_etag_still_matches(server, api_headers, monkeypatch):
+    monkeypatch.setattr(server, 'COMPRESSION_MIN_SIZE', 1)
+    add_contact(server, '88881111', note='Llamar en la tarde')
+    client = server.app.test_client()
+    headers = {**api_headers, 'Accept-Encoding': 'gzip'}
+
+    first = client.get('/contacts', headers=headers)
+    assert first.headers['Content-Encoding'] == 'gzip'
+    etag = first.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    again = client.get('/contacts', headers={**headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+
+
+def test_etag_session_reuses_cached_response_on_304(server, api_headers, flask_adapter):
+    add_contact(server, '88881111')
+    session = ETagSession()
+    adapter = flask_adapter
+    session.mount('http://server/', adapter)
+    headers = {**api_headers, 'Accept-Encoding': 'identity'}
+
+    first = session.get('http://server/contacts', params={'limit': 10}, headers=headers)
+    assert first.status_code == 200
+    second = session.get('http://server/contacts', params={'limit': 10}, headers=headers)
+    assert second is first
+    assert adapter.sent[1]['If-None-Match'] == first.headers['ETag']
+
+    add_contact(server, '88882222')
+    third = session.get('http://server/contacts', params={'limit': 10}, headers=headers)
+    assert third is not first and len(third.json()['items']) == 2
+
+    # Otra URL no comparte la entrada
+    session.get('http://server/contacts', params={'limit': 5}, headers=headers)
+    assert 'If-None-Match' not in adapter.sent[-1]
+
+    session.clear_cache()
+    session.get('http://server/contacts', params={'limit': 10}, headers=headers)
+    assert 'If-None-Match' not in adapter.sent[-1]
+
+
+def test_etag_session_evicts_oldest_entry(server, api_headers, flask_adapter):
+    session = ETagSession(max_entries=1)
+    adapter = flask_adapter
+    session.mount('http://server/', adapter)
+
+    session.get('http://server/contacts', params={'limit': 1}, headers=api_headers)
+    session.get('http://server/contacts', params={'limit': 2}, headers=api_headers)
+    session.get('http://server/contacts', params={'limit': 1}, headers=api_headers)
+    assert 'If-None-Match' not in adapter.sent[-1]
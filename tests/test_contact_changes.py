@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+test_contact_changes.py - GET /contacts/changes (delta sync): los upserts
+desde una secuencia, las lápidas que deja DELETE /contacts/<id> y
+resync_required cuando la secuencia no sirve.
+"""
+
+from datetime import datetime
+
+
+def add_contact(server, contact_id, **values):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status='SIN GESTIONAR',
+                              created_at=now, last_visibility_time=now, **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def admin_headers(server, monkeypatch):
+    """API key de un usuario TI (solo ProjectManager y TI borran contactos)"""
+    monkeypatch.setitem(server.AUTH_TOKENS, 'test-ti-key', 'test-ti')
+    db = server.Session()
+    try:
+        db.merge(server.User(id='test-ti', api_key='test-ti-key', username='test-ti', password_hash='x',
+                             role='TI', is_active=1))
+        db.commit()
+    finally:
+        server.Session.remove()
+    return {'X-API-Key': 'test-ti-key'}
+
+
+def changes(client, headers, since, **params):
+    response = client.get('/contacts/changes', query_string={'since': since, **params}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_changes_return_upserts_and_tombstones(server, api_headers, monkeypatch):
+    client = server.app.test_client()
+    start = changes(client, api_headers, 0)['server_seq']
+
+    add_contact(server, '88881111')
+    add_contact(server, '88882222')
+    body = changes(client, api_headers, start)
+    assert body['resync_required'] is False and body['deletes'] == []
+    assert [c['id'] for c in body['upserts']] == ['88881111', '88882222']
+    assert body['server_seq'] > start
+
+    response = client.delete('/contacts/88881111', headers=admin_headers(server, monkeypatch))
+    assert response.status_code == 200
+    after_delete = changes(client, api_headers, body['server_seq'], view='summary')
+    assert after_delete['upserts'] == [] and after_delete['deletes'] == ['88881111']
+    assert after_delete['server_seq'] > body['server_seq']
+
+    # Desde el principio: el borrado se ve como lápida, no como upsert
+    full = changes(client, api_headers, start, fields='id,status')
+    assert full['upserts'] == [{'id': '88882222', 'status': 'SIN GESTIONAR'}]
+    assert full['deletes'] == ['88881111']
+
+
+def test_changes_require_resync_for_unknown_sequence(server, api_headers):
+    client = server.app.test_client()
+    server_seq = changes(client, api_headers, 0)['server_seq']
+
+    body = changes(client, api_headers, server_seq + 100)
+    assert body['resync_required'] is True and body['upserts'] == [] and body['deletes'] == []
+
+    with server.engine.begin() as conn:
+        server.set_server_state(conn, 'tombstone_floor', server_seq)
+    try:
+        assert changes(client, api_headers, max(server_seq - 1, 0))['resync_required'] is True
+    finally:
+        with server.engine.begin() as conn:
+            server.set_server_state(conn, 'tombstone_floor', 0)
+
+    assert client.get('/contacts/changes', headers=api_headers).status_code == 400
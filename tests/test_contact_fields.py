@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+test_contact_fields.py - Proyecciones de contactos: parse_contact_fields
+(?fields= y ?view=), las vistas de CONTACT_VIEWS y que cada campo
+proyectado vale lo mismo que en la representación completa.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+
+def add_contact(server, contact_id, **values):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status='NC', created_at=now,
+                              last_visibility_time=now, coords='{"lat": 9.93}', editors_history='[]', **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def test_parse_fields_and_views(server):
+    parse = server.parse_contact_fields
+    assert parse({}) is None
+    assert parse({'view': 'full'}) is None
+    assert parse({'view': 'summary'}) == server.CONTACT_VIEWS['summary']
+    assert parse({'fields': ' status, id,name,status '}) == ('id', 'status', 'name')
+    assert parse({'fields': 'status', 'view': 'summary'}) == ('id', 'status')  # fields tiene precedencia
+    assert parse({'fields': ','}) == ('id',)
+
+    with pytest.raises(ValueError, match='coordenadas'):
+        parse({'fields': 'name,coordenadas'})
+    with pytest.raises(ValueError, match='mini'):
+        parse({'view': 'mini'})
+
+
+def test_views_only_use_known_fields(server):
+    for view, fields in server.CONTACT_VIEWS.items():
+        if fields is not None:
+            assert fields[0] == 'id'
+            assert set(fields) <= set(server.CONTACT_FIELD_COLUMNS), view
+    # Lo que usan la tarjeta del cliente y el orden de la lista
+    summary = server.CONTACT_VIEWS['summary']
+    assert {'phone', 'name', 'status', 'note_preview', 'priority', 'updated_at', 'version'} <= set(summary)
+
+
+def test_every_field_projects_like_full_contact(server, api_headers):
+    add_contact(server, '88881111', note='x' * (server.CONTACT_NOTE_PREVIEW_LENGTH + 10))
+    client = server.app.test_client()
+    full = client.get('/contacts/88881111', headers=api_headers).get_json()
+
+    names = [name for name in server.CONTACT_FIELD_COLUMNS if name != 'note_preview']
+    projected = client.get('/contacts', query_string={'all': 1, 'fields': ','.join(names)},
+                           headers=api_headers).get_json()[0]
+    assert projected == {name: full[name] for name in names}
+
+    summary = client.get('/contacts', query_string={'view': 'summary'}, headers=api_headers).get_json()['items'][0]
+    assert list(summary) == list(server.CONTACT_VIEWS['summary'])
+    assert summary['note_preview'] == full['note'][:server.CONTACT_NOTE_PREVIEW_LENGTH]
+    assert {k: v for k, v in summary.items() if k != 'note_preview'} == {k: full[k] for k in summary if k != 'note_preview'}
+
+
+def test_project_contact_defaults(server):
+    row = SimpleNamespace(id='88882222', coords=None, editors_history=None, version=None)
+    assert server.project_contact(row, ('id', 'coords', 'editors_history', 'version')) == {
+        'id': '88882222', 'coords': {}, 'editors_history': [], 'version': 1
+    }
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+test_contact_importer.py - ContactImporter / CONTACT_UPSERT_SQL dan los
+mismos conteos, errores y filas finales que el procesamiento fila por fila
+de antes, con repetidos dentro de un chunk, entre chunks y contra la BD.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+ROWS = [
+    {'phone': '8888-1111', 'name': 'Ana', 'status': 'NC'},
+    {'phone': '88881111', 'name': 'Ana María'},  # Repetido en el mismo chunk, sin status
+    {'phone': '8888-0000', 'name': 'Luis', 'note': 'Llamar en la tarde'},  # Ya existe en la BD
+    {'phone': 'abc', 'name': 'Sin teléfono'},
+    {'phone': '8888 1111', 'name': 'Ana M.', 'status': 'CUELGA'},  # Repetido en otro chunk
+    {'phone': '8888-2222', 'name': 'Pedro', 'note': ''},
+    {'phone': '8888-0000', 'name': '', 'status': ''},  # Nombre vacío: error de validación
+]
+
+
+def per_row_reference(server, existing, rows):
+    """Reglas del /import fila por fila original, sobre un dict id -> campos"""
+    store = {cid: dict(values) for cid, values in existing.items()}
+    counts = {'inserted': 0, 'updated': 0, 'duplicates_merged': 0}
+    error_rows = []
+    for idx, c in enumerate(rows):
+        cid, phone_error = server.phone_utils.normalize_phone_checked(str(c['phone']).strip(), server.PHONE_REGEX)
+        name = str(c.get('name', f'Contacto {cid}')).strip()
+        note = str(c.get('note', '')).strip()
+        if phone_error or not server.validate_name(name)[0]:
+            error_rows.append(idx)
+            continue
+        if cid in store:
+            obj = store[cid]
+            obj['name'] = name
+            if c.get('status'):
+                obj['status'] = c['status']
+            if note:
+                obj['note'] = note
+            counts['updated'] += 1
+            counts['duplicates_merged'] += 1
+        else:
+            store[cid] = {'name': name, 'status': c.get('status', 'SIN GESTIONAR'), 'note': note}
+            counts['inserted'] += 1
+    return store, counts, error_rows
+
+
+def add_existing(server):
+    db = server.Session()
+    try:
+        ts = datetime.utcnow() - timedelta(days=1)
+        db.add(server.Contact(id='88880000', phone='8888-0000', name='Luis', status='INTERESADO', note='Vieja',
+                              created_at=ts, updated_at=ts, last_visibility_time=ts))
+        db.commit()
+        contact = db.query(server.Contact).get('88880000')
+        return {'88880000': {'name': contact.name, 'status': contact.status, 'note': contact.note}}
+    finally:
+        server.Session.remove()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 4, 100])
+def test_chunked_upsert_matches_per_row_import(server, chunk_size):
+    existing = add_existing(server)
+    expected, counts, error_rows = per_row_reference(server, existing, ROWS)
+
+    db = server.Session()
+    try:
+        importer = server.ContactImporter(db)
+        for offset, chunk in server.iter_chunks([(c, None) for c in ROWS], chunk_size):
+            importer.add_chunk(chunk, offset)
+            importer.commit()
+        summary = importer.summary()
+
+        contacts = db.query(server.Contact).all()
+        stored = {c.id: {'name': c.name, 'status': c.status, 'note': c.note} for c in contacts}
+        priorities = {c.id: c.priority for c in contacts}
+        existing_version = next(c.version for c in contacts if c.id == '88880000')
+    finally:
+        server.Session.remove()
+
+    assert {key: summary[key] for key in counts} == counts
+    assert counts == {'inserted': 2, 'updated': 3, 'duplicates_merged': 3}
+    assert summary['total'] == 5
+    assert [int(e.split(':')[0].split()[1]) for e in summary['errors']] == error_rows == [3, 6]
+    assert stored == expected
+    assert stored['88881111'] == {'name': 'Ana M.', 'status': 'CUELGA', 'note': ''}
+    assert stored['88880000'] == {'name': 'Luis', 'status': 'INTERESADO', 'note': 'Llamar en la tarde'}
+    assert existing_version == 2
+    assert priorities == {cid: server.status_priority(values['status']) for cid, values in expected.items()}
+
+
+def test_max_errors_keeps_counting(server):
+    db = server.Session()
+    try:
+        importer = server.ContactImporter(db, max_errors=1)
+        importer.add_chunk([({'phone': 'abc'}, None), ('no es objeto', None), (None, 'Fila ilegible')])
+        importer.commit()
+    finally:
+        server.Session.remove()
+
+    assert importer.error_count == 3
+    assert len(importer.errors) == 1 and importer.errors[0].startswith('Row 0: ')
+    assert importer.summary()['total'] == 0
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+test_contact_json_cache.py - ContactJSONCache / contact_to_json: una
+escritura (ORM o SQL) reemplaza el fragmento guardado, y
+visibility_months_ago y el lock se calculan en cada lectura aunque el
+fragmento salga de la caché.
+"""
+
+import json
+
+from datetime import datetime, timedelta
+
+
+def add_contact(server, contact_id, **values):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status='SIN GESTIONAR',
+                              created_at=now, last_visibility_time=now, **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def read_json(server, contact_id):
+    db = server.Session()
+    try:
+        return json.loads(server.contact_to_json(db.query(server.Contact).get(contact_id)))
+    finally:
+        server.Session.remove()
+
+
+def test_write_replaces_cached_fragment(server):
+    add_contact(server, '88881111')
+    cache = server.contact_json_cache
+    first = read_json(server, '88881111')
+    hits = cache.hits
+    assert read_json(server, '88881111') == first
+    assert cache.hits == hits + 1
+
+    db = server.Session()
+    try:
+        db.query(server.Contact).get('88881111').name = 'Ana María'
+        db.commit()
+    finally:
+        server.Session.remove()
+    after_orm = read_json(server, '88881111')
+    assert after_orm['name'] == 'Ana María'
+    assert after_orm['version'] == first['version'] + 1
+
+    # UPDATE en SQL (otro proceso, importación masiva): la entrada no se descarta, pero su (version, seq) ya no coincide
+    with server.engine.begin() as conn:
+        seq = server.next_server_counter(conn, 'contact_seq')
+        conn.execute(server.text(
+            "UPDATE contacts SET note = 'Llamar', version = version + 1, seq = :seq WHERE id = '88881111'"
+        ), {'seq': seq})
+    after_sql = read_json(server, '88881111')
+    assert after_sql['note'] == 'Llamar' and after_sql['version'] == after_orm['version'] + 1
+
+
+def test_clock_and_lock_fields_are_fresh_on_hit(server):
+    add_contact(server, '88882222')
+    cache = server.contact_json_cache
+    db = server.Session()
+    try:
+        row = db.query(server.Contact).get('88882222')
+        assert json.loads(server.contact_to_json(row))['visibility_months_ago'] == 0
+
+        db.expunge(row)
+        row.last_visibility_time = datetime.now() - timedelta(days=100)  # Como si pasara el tiempo
+        hits = cache.hits
+        assert json.loads(server.contact_to_json(row))['visibility_months_ago'] == 3
+        assert cache.hits == hits + 1
+    finally:
+        server.Session.remove()
+
+    db = server.Session()
+    try:
+        lease, holder = server.lock_manager.acquire(db, '88882222', 'ana', 5)
+        assert lease is not None and holder is None
+    finally:
+        server.Session.remove()
+    hits = cache.hits
+    locked = read_json(server, '88882222')
+    assert cache.hits == hits + 1
+    assert locked['locked_by'] == 'ana' and locked['locked_until']
+
+
+def test_cache_is_bounded_lru(server):
+    cache = server.ContactJSONCache(2)
+    cache.put('a', (1, 1), b'{"id":"a"')
+    cache.put('b', (1, 2), b'{"id":"b"')
+    assert cache.get('a', (1, 1)) == b'{"id":"a"'
+    cache.put('c', (1, 3), b'{"id":"c"')
+
+    assert cache.get('b', (1, 2)) is None  # El menos usado sale primero
+    assert cache.get('a', (2, 4)) is None  # Otra versión no sirve
+    assert cache.get('c', (1, 3)) == b'{"id":"c"'
+    cache.discard('c')
+    assert cache.get('c', (1, 3)) is None
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+test_contact_locks.py - Locks en memoria (LOCK_BACKEND=memory): el lease
+se ve en las lecturas antes de que el journal lo escriba, la escritura del
+journal no cambia la versión con la que guarda el dueño del lock, el
+heap de vencimientos, la renovación y la recuperación al arrancar; un
+UPDATE que no aplica no avanza contact_seq y los cambios de leases
+cambian el ETag de /contacts.
+"""
+
+import json
+
+from datetime import datetime, timedelta
+
+
+def add_contact(server, contact_id, **values):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name='Ana', status='SIN GESTIONAR',
+                              created_at=now, last_visibility_time=now, **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def locked_by(server, contact_id):
+    with server.engine.connect() as conn:
+        return conn.execute(server.text("SELECT locked_by FROM contacts WHERE id = :id"), {'id': contact_id}).scalar()
+
+
+def test_lease_is_visible_before_journal_flush(server, api_headers):
+    add_contact(server, '88884444')
+    client = server.app.test_client()
+    socket = server.socketio.test_client(server.app, headers=api_headers)
+
+    socket.emit('lock_contact', {'id': '88884444', 'user': 'ana', 'duration_minutes': 5})
+
+    contact = client.get('/contacts/88884444', headers=api_headers).get_json()
+    assert contact['locked_by'] == 'ana' and contact['locked_until']
+    db = server.Session()
+    try:
+        row = db.query(server.Contact).get('88884444')
+        assert row.locked_by is None  # El journal todavía no lo escribió
+        assert json.loads(server.contact_to_json(row))['locked_by'] == 'ana'
+    finally:
+        server.Session.remove()
+
+    socket.emit('update_contact', {'id': '88884444', 'user': 'luis', 'fields': {'note': 'x'}})
+    denied = [e['args'][0] for e in socket.get_received() if e['name'] == 'lock_denied']
+    assert denied[-1]['contact']['locked_by'] == 'ana'
+
+    response = client.put('/contacts/88884444', data=json.dumps({'note': 'x', 'version': 1}),
+                          content_type='application/json', headers=api_headers)
+    assert response.status_code == 409
+    body = response.get_json()
+    assert body['reason'] == 'locked' and body['contact']['locked_by'] == 'ana'
+
+    socket.emit('unlock_contact', {'id': '88884444', 'user': 'ana'})
+    assert client.get('/contacts/88884444', headers=api_headers).get_json()['locked_by'] is None
+    socket.disconnect()
+
+
+def test_journal_flush_keeps_owner_version(server):
+    add_contact(server, '88885555')
+    db = server.Session()
+    try:
+        read_version = db.query(server.Contact).get('88885555').version
+        lease, holder = server.lock_manager.acquire(db, '88885555', 'ana', 5)
+        assert lease is not None and holder is None
+    finally:
+        server.Session.remove()
+
+    server.lock_manager.flush_journal()
+
+    db = server.Session()
+    try:
+        stored = db.query(server.Contact).get('88885555')
+        assert (stored.locked_by, stored.version) == ('ana', read_version)
+        outcome, result = server.update_contact_fields(db, '88885555', {'note': 'Llamar'}, 'ana', read_version)
+        assert outcome == 'updated' and result['version'] == read_version + 1
+        outcome, result = server.update_contact_fields(db, '88885555', {'note': 'Otra'}, 'luis', read_version + 1)
+        assert outcome == 'locked' and result['contact']['locked_by'] == 'ana'
+    finally:
+        server.Session.remove()
+
+
+def test_heap_expires_leases_in_order_and_skips_renewed(server):
+    add_contact(server, '88887001')
+    add_contact(server, '88887002')
+    manager = server.lock_manager
+    db = server.Session()
+    try:
+        first, _ = manager.acquire(db, '88887001', 'ana', 1)
+        second, _ = manager.acquire(db, '88887002', 'luis', 2)
+        renewed, _ = manager.acquire(db, '88887001', 'ana', 10)  # Renovar deja la entrada vieja en el heap
+        assert manager.acquire(db, '88887001', 'luis', 5) == (None, renewed)
+        assert manager.acquire(db, 'no-existe', 'luis', 5) == (None, None)
+    finally:
+        server.Session.remove()
+
+    now = datetime.utcnow()
+    assert 0 < manager.seconds_to_next_expiry(now) <= 60
+    assert manager.pop_expired(now + timedelta(minutes=3)) == [second]
+    assert manager.holder(None, '88887002') is None
+    assert manager.holder(None, '88887001') is renewed
+    assert manager.pop_expired(now + timedelta(minutes=11)) == [renewed]
+    assert manager.seconds_to_next_expiry(now) is None
+
+
+def test_release_is_journaled_and_flushed(server):
+    add_contact(server, '88887003')
+    manager = server.lock_manager
+    db = server.Session()
+    try:
+        manager.acquire(db, '88887003', 'ana', 5)
+        assert manager.release(db, '88887003', 'luis')[1].owner == 'ana'
+        manager.flush_journal()
+        assert locked_by(server, '88887003') == 'ana'
+        released, _ = manager.release(db, '88887003', 'ana')
+        assert released.owner == 'ana'
+        assert manager.release(db, '88887003', 'ana') == (None, None)
+    finally:
+        server.Session.remove()
+
+    assert locked_by(server, '88887003') == 'ana'  # Hasta la próxima escritura del journal
+    manager.flush_journal()
+    assert locked_by(server, '88887003') is None
+
+
+def test_recover_loads_live_locks_and_clears_expired(server):
+    add_contact(server, '88887004', locked_by='ana', locked_until=datetime.utcnow() + timedelta(minutes=5))
+    add_contact(server, '88887005', locked_by='luis', locked_until=datetime.utcnow() - timedelta(minutes=1))
+
+    manager = server.MemoryLockManager(server.LOCK_JOURNAL_INTERVAL_SECONDS)
+    manager.recover()
+
+    assert manager.holder(None, '88887004').owner == 'ana'
+    assert manager.holder(None, '88887005') is None
+    manager.flush_journal()
+    assert (locked_by(server, '88887004'), locked_by(server, '88887005')) == ('ana', None)
+
+
+def contact_seq(server):
+    with server.engine.connect() as conn:
+        return int(server.get_server_state(conn, 'contact_seq', 0))
+
+
+def test_unmatched_updates_do_not_advance_contact_seq(server):
+    add_contact(server, '88887006')
+    manager = server.lock_manager
+    db = server.Session()
+    try:
+        manager.acquire(db, '88887006', 'ana', 5)
+        manager.release(db, '88887006', 'ana')  # El journal queda con None y la fila ya está sin lock
+        seq = contact_seq(server)
+        manager.flush_journal()
+        assert contact_seq(server) == seq
+
+        assert server.conditional_contact_update(db, '88887006', {'note': 'x'}, expected_version=99) is None
+        assert server.conditional_contact_update(db, 'no-existe', {'note': 'x'}) is None
+        db.commit()
+        assert contact_seq(server) == seq
+
+        assert server.conditional_contact_update(db, '88887006', {'note': 'x'}) is not None
+        db.commit()
+        assert contact_seq(server) == seq + 1
+        assert db.query(server.Contact).populate_existing().get('88887006').seq == seq + 1
+    finally:
+        server.Session.remove()
+
+
+def test_lease_changes_invalidate_contacts_etag(server, api_headers):
+    add_contact(server, '88887007')
+    client = server.app.test_client()
+    etag = client.get('/contacts', headers=api_headers).headers['ETag']
+
+    db = server.Session()
+    try:
+        server.lock_manager.acquire(db, '88887007', 'ana', 5)
+    finally:
+        server.Session.remove()
+    locked = client.get('/contacts', headers={**api_headers, 'If-None-Match': etag})
+    assert locked.status_code == 200
+    assert locked.get_json()['items'][0]['locked_by'] == 'ana'
+    assert client.get('/contacts', headers={**api_headers, 'If-None-Match': locked.headers['ETag']}).status_code == 304
+
+    server.lock_manager.pop_expired(datetime.utcnow() + timedelta(minutes=6))
+    expired = client.get('/contacts', headers={**api_headers, 'If-None-Match': locked.headers['ETag']})
+    assert expired.status_code == 200
+    assert expired.get_json()['items'][0]['locked_by'] is None
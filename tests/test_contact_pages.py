@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+test_contact_pages.py - GET /contacts: recorrer next_cursor hasta el final
+devuelve cada contacto una sola vez en orden de prioridad; ?all=1 y
+?stream=1 (NDJSON) con proyecciones; cursor inválido -> 400.
+"""
+
+import json
+
+from datetime import datetime, timedelta
+
+STATUSES = ['INTERESADO', 'NC', 'SIN_GESTIONAR', 'NO_CONTACTO', 'CUELGA', 'NC', 'SERVICIOS_ACTIVOS']
+
+
+def add_contacts(server):
+    db = server.Session()
+    try:
+        base = datetime.utcnow() - timedelta(hours=1)
+        for n, status in enumerate(STATUSES):
+            db.add(server.Contact(id=f'8888{n:04d}', phone=f'8888{n:04d}', name=f'Contacto {n}', status=status,
+                                  note='Nota ' * 40, created_at=base, updated_at=base + timedelta(minutes=n),
+                                  last_visibility_time=base))
+        db.commit()
+    finally:
+        server.Session.remove()
+    return sorted((server.STATUS_PRIORITY[status], n) for n, status in enumerate(STATUSES))
+
+
+def test_cursor_walk_has_no_duplicates_or_gaps(server, api_headers):
+    expected = [f'8888{n:04d}' for _, n in add_contacts(server)]
+    client = server.app.test_client()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+        response = client.get('/contacts', query_string=params, headers=api_headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['items']) <= 3 and body['limit'] == 3
+        seen.extend(item['id'] for item in body['items'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 3
+
+
+def test_legacy_and_stream_modes_use_projection(server, api_headers):
+    expected = [f'8888{n:04d}' for _, n in add_contacts(server)]
+    client = server.app.test_client()
+
+    legacy = client.get('/contacts', query_string={'all': 1, 'fields': 'status'}, headers=api_headers)
+    assert legacy.status_code == 200
+    rows = legacy.get_json()
+    assert [row['id'] for row in rows] == expected
+    assert set(rows[0]) == {'id', 'status'}
+
+    stream = client.get('/contacts', query_string={'stream': 1, 'view': 'summary'}, headers=api_headers)
+    assert stream.status_code == 200
+    assert stream.mimetype == 'application/x-ndjson'
+    assert int(stream.headers['X-Server-Seq']) > 0
+    lines = [json.loads(line) for line in stream.get_data(as_text=True).splitlines() if line]
+    assert [line['id'] for line in lines] == expected
+    assert set(lines[0]) == set(server.CONTACT_VIEWS['summary'])
+    assert len(lines[0]['note_preview']) < len('Nota ' * 40)
+
+
+def test_invalid_cursor_is_rejected(server, api_headers):
+    client = server.app.test_client()
+    response = client.get('/contacts', query_string={'cursor': 'no-es-un-cursor'}, headers=api_headers)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
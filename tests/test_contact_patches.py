@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+test_contact_patches.py - ContactPatchFeed: parches contiguos de un
+contacto se fusionan en uno, los no contiguos reemplazan al pendiente, los
+viejos se descartan y cada grupo de salas recibe un solo contacts_patched.
+"""
+
+
+def patch(contact_id, from_version, fields, rooms=('all',)):
+    return {'id': contact_id, 'from_version': from_version, 'version': from_version + 1,
+            'fields': dict(fields), 'rooms': set(rooms)}
+
+
+def test_feed_coalesces_per_contact_and_room_group(server, monkeypatch):
+    scheduled, emitted = [], []
+    monkeypatch.setattr(server.socketio, 'start_background_task', lambda task: scheduled.append(task))
+    monkeypatch.setattr(server.socketio, 'emit', lambda event, data, to: emitted.append((event, data, sorted(to))))
+    feed = server.ContactPatchFeed(1000)
+
+    feed.publish([patch('a', 1, {'note': 'uno'}), patch('a', 2, {'status': 'NC'}, rooms=('all', 'team:t1'))])
+    feed.publish([patch('a', 3, {'note': 'tres'})])
+    feed.publish([patch('a', 2, {'note': 'viejo'})])  # Ya cubierto por el pendiente
+    feed.publish([patch('b', 1, {'name': 'Eva'}), patch('b', 4, {'name': 'Eva María'})])  # Salto: reemplaza
+    feed.publish([patch('c', 1, {'note': 'x'}), patch('d', 1, {'note': 'y'}, rooms=('user:u1',))])
+    assert len(scheduled) == 1  # Una sola ventana para todo el lote
+
+    feed.flush()
+
+    by_rooms = {tuple(rooms): data['patches'] for event, data, rooms in emitted if event == 'contacts_patched'}
+    assert sorted(by_rooms) == [('all',), ('all', 'team:t1'), ('user:u1',)]
+    assert by_rooms[('all', 'team:t1')] == [
+        {'id': 'a', 'from_version': 1, 'version': 4, 'fields': {'note': 'tres', 'status': 'NC'}}
+    ]
+    assert [(p['id'], p['from_version'], p['fields']) for p in by_rooms[('all',)]] == \
+        [('b', 4, {'name': 'Eva María'}), ('c', 1, {'note': 'x'})]
+    assert [p['id'] for p in by_rooms[('user:u1',)]] == ['d']
+
+    emitted.clear()
+    feed.flush()
+    assert emitted == []
+    feed.publish([patch('a', 4, {'note': 'cuatro'})])
+    assert len(scheduled) == 2  # Tras el flush se abre otra ventana
+
+
+def test_feed_delivers_to_room_members(server, api_headers, monkeypatch):
+    monkeypatch.setattr(server.socketio, 'start_background_task', lambda task: None)  # Se vacía a mano
+    socket = server.socketio.test_client(server.app, headers=api_headers)  # Con API key: sala all
+    socket.get_received()
+    feed = server.ContactPatchFeed(0)
+
+    feed.publish([patch('a', 1, {'note': 'uno'}), patch('b', 1, {'note': 'otro'}, rooms=('user:u1',))])
+    feed.flush()
+
+    events = [e['args'][0] for e in socket.get_received() if e['name'] == 'contacts_patched']
+    assert [[p['id'] for p in event['patches']] for event in events] == [['a']]
+    socket.disconnect()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+test_contact_search.py - /contacts/search: los triggers mantienen
+contacts_fts al día (insert, update, delete), cada término se busca por
+prefijo, comillas y operadores FTS5 se tratan como texto y sin FTS5 se
+usa LIKE.
+"""
+
+from datetime import datetime
+
+
+def add_contact(server, contact_id, name, note=''):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name=name, status='SIN GESTIONAR', note=note,
+                              created_at=now, last_visibility_time=now))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def search(server, headers, q):
+    response = server.app.test_client().get('/contacts/search', query_string={'q': q}, headers=headers)
+    assert response.status_code == 200
+    return [item['id'] for item in response.get_json()['items']]
+
+
+def test_build_query_quotes_terms_and_reduces_phones(server):
+    assert server.build_contact_search_query('Juan Pérez') == '"Juan"* "Pérez"*'
+    assert server.build_contact_search_query('juan AND OR NOT') == '"juan"* "AND"* "OR"* "NOT"*'
+    assert server.build_contact_search_query('"juan" (perez') == '"juan"* "perez"*'
+    assert server.build_contact_search_query('8888-1111') == 'phone : "88881111"*'
+    assert server.build_contact_search_query('+506 8888 1111') == 'phone : "50688881111"*'
+    assert server.build_contact_search_query('"') == ''
+    assert server.build_contact_search_query('--') == ''
+
+
+def test_triggers_follow_insert_update_and_delete(server, api_headers):
+    assert server.CONTACT_FTS_AVAILABLE
+    add_contact(server, '88881111', 'Juan Pérez', note='Llamar en la tarde')
+    add_contact(server, '88882222', 'María Rojas')
+    assert search(server, api_headers, 'juan') == ['88881111']
+    assert search(server, api_headers, 'tarde') == ['88881111']
+
+    db = server.Session()
+    try:
+        db.query(server.Contact).get('88881111').name = 'Julio Mora'
+        db.commit()
+    finally:
+        server.Session.remove()
+    assert search(server, api_headers, 'juan') == []
+    assert search(server, api_headers, 'mora') == ['88881111']
+
+    db = server.Session()
+    try:
+        db.delete(db.query(server.Contact).get('88881111'))
+        db.commit()
+    finally:
+        server.Session.remove()
+    assert search(server, api_headers, 'mora') == []
+    assert search(server, api_headers, 'maria') == ['88882222']  # unicode61 ignora las tildes
+
+
+def test_prefix_and_phone_matching(server, api_headers):
+    add_contact(server, '88881111', 'Juan Pérez')
+    add_contact(server, '88882222', 'Juana Rojas')
+    add_contact(server, '77773333', 'Pedro Soto')
+
+    assert sorted(search(server, api_headers, 'jua')) == ['88881111', '88882222']
+    assert search(server, api_headers, 'juan per') == ['88881111']
+    assert sorted(search(server, api_headers, '8888')) == ['88881111', '88882222']
+    assert search(server, api_headers, '7777-33') == ['77773333']
+
+
+def test_quotes_and_operators_are_plain_text(server, api_headers):
+    add_contact(server, '88881111', 'Juan Or', note='and')
+
+    assert search(server, api_headers, 'juan OR') == ['88881111']
+    assert search(server, api_headers, '"juan" AND') == ['88881111']
+    assert search(server, api_headers, 'NOT juan') == []
+    assert search(server, api_headers, '"') == []
+    assert search(server, api_headers, 'juan*') == ['88881111']
+
+
+def test_like_fallback_without_fts(server, api_headers, monkeypatch):
+    add_contact(server, '88881111', 'Juan Pérez', note='Llamar en la tarde')
+    add_contact(server, '88882222', 'María Rojas')
+    monkeypatch.setattr(server, 'CONTACT_FTS_AVAILABLE', False)
+
+    assert search(server, api_headers, 'uan') == ['88881111']  # Subcadena, no solo prefijo
+    assert search(server, api_headers, 'TARDE') == ['88881111']
+    assert search(server, api_headers, '8888') == ['88881111', '88882222']
+
+
+def test_index_is_rebuilt_from_existing_contacts(server, api_headers):
+    add_contact(server, '88881111', 'Juan Pérez')
+    with server.engine.begin() as conn:
+        conn.execute(server.text("DROP TABLE contacts_fts"))
+
+    server.ensure_contact_search_index()
+    server.ensure_contact_search_index()  # Idempotente
+
+    assert search(server, api_headers, 'juan') == ['88881111']
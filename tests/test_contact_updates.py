@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+test_contact_updates.py - Ediciones con compare-and-swap: conditional_contact_update,
+update_contact_fields y PUT /contacts/<id> (versión, payload del 409 y
+carrera por el lock con LOCK_BACKEND=database).
+"""
+
+import json
+import threading
+
+from datetime import datetime, timedelta
+
+
+def add_contact(server, contact_id, **values):
+    db = server.Session()
+    try:
+        now = datetime.utcnow()
+        db.add(server.Contact(id=contact_id, phone=contact_id, name=values.pop('name', 'Ana'),
+                              status='SIN GESTIONAR', created_at=now, last_visibility_time=now, **values))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def stored(server, contact_id):
+    with server.engine.connect() as conn:
+        return conn.execute(server.text("SELECT * FROM contacts WHERE id = :id"), {'id': contact_id}).one()
+
+
+def put_contact(server, contact_id, body, headers):
+    return server.app.test_client().put(f'/contacts/{contact_id}', data=json.dumps(body),
+                                        content_type='application/json', headers=headers)
+
+
+def test_conditional_update_checks_version(server):
+    add_contact(server, '88886001')
+    before = stored(server, '88886001')
+    db = server.Session()
+    try:
+        written = server.conditional_contact_update(db, '88886001', {'status': 'INTERESADO'}, expected_version=1)
+        db.commit()
+        assert written['priority'] == server.status_priority('INTERESADO')
+        assert server.conditional_contact_update(db, '88886001', {'note': 'tarde'}, expected_version=1) is None
+        db.rollback()
+    finally:
+        server.Session.remove()
+
+    after = stored(server, '88886001')
+    assert (after.status, after.version, after.note) == ('INTERESADO', 2, before.note)
+    assert after.seq > before.seq
+
+
+def test_conditional_update_respects_other_users_lock(server):
+    add_contact(server, '88886002', locked_by='ana', locked_until=datetime.utcnow() + timedelta(minutes=5))
+    db = server.Session()
+    try:
+        assert server.conditional_contact_update(db, '88886002', {'note': 'x'}, lock_user='luis') is None
+        assert server.conditional_contact_update(db, '88886002', {'note': 'x'}, lock_user='ana') is not None
+        db.commit()
+    finally:
+        server.Session.remove()
+    assert stored(server, '88886002').note == 'x'
+
+
+def test_update_contact_fields_name_conflict(server):
+    add_contact(server, '88886003', name='Ana')
+    db = server.Session()
+    try:
+        outcome, result = server.update_contact_fields(db, '88886003', {'name': 'Ana María'}, 'luis', 1)
+        assert outcome == 'updated'
+        change = result['editors_history'][0]
+        assert (change['user'], change['old'], change['new']) == ('luis', 'Ana', 'Ana María')
+
+        outcome, result = server.update_contact_fields(db, '88886003', {'name': 'Otra'}, 'eva', 1)
+        assert outcome == 'conflict'
+        assert (result['expected_version'], result['version'], result['contact']['name']) == (1, 2, 'Ana María')
+
+        assert server.update_contact_fields(db, '88886003', {}, 'eva')[0] == 'unchanged'
+        assert server.update_contact_fields(db, 'no-existe', {'note': 'x'}, 'eva')[0] == 'not_found'
+    finally:
+        server.Session.remove()
+
+
+def test_put_stale_version_gets_409_with_current_row(server, api_headers):
+    add_contact(server, '88886004')
+
+    first = put_contact(server, '88886004', {'note': 'Primero', 'version': 1}, api_headers)
+    assert first.status_code == 200
+    assert first.get_json()['version'] == 2
+
+    second = put_contact(server, '88886004', {'note': 'Segundo', 'version': 1}, api_headers)
+    assert second.status_code == 409
+    body = second.get_json()
+    assert (body['reason'], body['expected_version'], body['version']) == ('version', 1, 2)
+    assert body['contact']['note'] == 'Primero'
+
+    assert put_contact(server, '88886004', {'note': 'x', 'version': 'uno'}, api_headers).status_code == 400
+    assert put_contact(server, '88886004', {'version': 2}, api_headers).status_code == 400
+    assert stored(server, '88886004').note == 'Primero'
+
+
+def test_database_lock_race_has_one_winner(server, api_headers, monkeypatch):
+    monkeypatch.setattr(server, 'lock_manager', server.DatabaseLockManager())
+    add_contact(server, '88886005')
+    users = [f'agente{n}' for n in range(6)]
+    results = {}
+    start = threading.Barrier(len(users))
+
+    def take(user):
+        start.wait()
+        try:
+            lease, holder = server.lock_manager.acquire(server.Session(), '88886005', user, 5)
+            results[user] = (lease, holder)
+        finally:
+            server.Session.remove()
+
+    threads = [threading.Thread(target=take, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == len(users)
+    winners = [user for user, (lease, _) in results.items() if lease is not None]
+    assert len(winners) == 1
+    assert all(holder.owner == winners[0] for lease, holder in results.values() if lease is None)
+    row = stored(server, '88886005')
+    assert (row.locked_by, row.version) == (winners[0], 1)
+
+    response = put_contact(server, '88886005', {'note': 'x', 'version': 1}, api_headers)
+    assert response.status_code == 409
+    body = response.get_json()
+    assert (body['reason'], body['locked_by'], body['contact']['locked_by']) == ('locked', winners[0], winners[0])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+test_export.py - GET /export en csv, ndjson y xlsx: encabezados, filas en
+orden de prioridad, filtro status= y 400 con un formato desconocido.
+"""
+
+import csv
+import io
+import json
+
+from datetime import datetime, timedelta
+
+from openpyxl import load_workbook
+
+CONTACTS = [
+    ('88881111', 'Ana Pérez', 'INTERESADO', 'Llamar, en la tarde'),
+    ('88882222', 'Luis', 'NC', ''),
+    ('88883333', 'María', 'CUELGA', 'Segunda "llamada"'),
+]
+
+
+def add_contacts(server):
+    db = server.Session()
+    try:
+        base = datetime.utcnow() - timedelta(hours=1)
+        for n, (contact_id, name, status, note) in enumerate(CONTACTS):
+            db.add(server.Contact(id=contact_id, phone=f'+506 {contact_id}', name=name, status=status, note=note,
+                                  created_at=base, updated_at=base + timedelta(minutes=n), last_visibility_time=base))
+        db.commit()
+    finally:
+        server.Session.remove()
+
+
+def export(server, headers, **params):
+    response = server.app.test_client().get('/export', query_string=params, headers=headers)
+    assert response.status_code == 200
+    return response
+
+
+def test_csv_export(server, api_headers):
+    add_contacts(server)
+    response = export(server, api_headers, format='csv')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'].endswith('.csv"')
+
+    body = response.get_data()
+    assert body.startswith(b'\xef\xbb\xbf')  # BOM para Excel
+    rows = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+    assert rows[0] == [label for _, label in server.EXPORT_COLUMNS]
+    assert [row[0] for row in rows[1:]] == ['88882222', '88883333', '88881111']
+    assert rows[3][1:5] == ['+506 88881111', 'Ana Pérez', 'INTERESADO', 'Llamar, en la tarde']
+    assert rows[2][4] == 'Segunda "llamada"'
+
+
+def test_ndjson_export_with_status_filter(server, api_headers):
+    add_contacts(server)
+    response = export(server, api_headers, format='ndjson', status='NC, CUELGA')
+    assert response.mimetype == server.NDJSON_MIMETYPE
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == ['88882222', '88883333']
+    assert list(rows[0]) == [field for field, _ in server.EXPORT_COLUMNS]
+    assert rows[0]['locked_by'] == '' and rows[0]['note'] == ''
+    assert datetime.fromisoformat(rows[0]['updated_at'])
+
+
+def test_xlsx_export(server, api_headers):
+    add_contacts(server)
+    response = export(server, api_headers, status='INTERESADO')
+    assert response.mimetype == server.EXPORT_FORMATS['xlsx']
+
+    sheet = load_workbook(io.BytesIO(response.get_data()), read_only=True)['Contactos']
+    rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+    assert rows[0] == [label for _, label in server.EXPORT_COLUMNS]
+    assert len(rows) == 2
+    assert rows[1][:5] == ['88881111', '+506 88881111', 'Ana Pérez', 'INTERESADO', 'Llamar, en la tarde']
+
+
+def test_write_xlsx_export_returns_row_count(server):
+    add_contacts(server)
+    output = io.BytesIO()
+    assert server.write_xlsx_export(['NC', 'CUELGA'], output) == 2
+    assert server.write_xlsx_export(None, io.BytesIO()) == 3
+
+    output.seek(0)
+    sheet = load_workbook(output, read_only=True)['Contactos']
+    assert [row[0] for row in sheet.iter_rows(min_row=2, values_only=True)] == ['88882222', '88883333']
+
+
+def test_unknown_format_is_rejected(server, api_headers):
+    response = server.app.test_client().get('/export', query_string={'format': 'pdf'}, headers=api_headers)
+    assert response.status_code == 400
+    assert 'xlsx' in response.get_json()['error']
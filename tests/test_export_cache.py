@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+test_export_cache.py - ExportCache no toca el disco al crearse (importar
+server no borra nada); clear() vacía los exports de ejecuciones anteriores.
+Aciertos, desalojo por mtime y varias instancias (réplicas) sobre el mismo
+directorio; GET /export sirve desde la caché.
+"""
+
+import os
+
+
+def put(cache, key, body):
+    temp_path = cache.temp_path(key)
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+    return cache.put(key, temp_path)
+
+
+def read(cache, key):
+    f = cache.open(key)
+    if f is None:
+        return None
+    with f:
+        return f.read()
+
+
+def test_cache_is_cleared_explicitly_not_on_import(server, tmp_path):
+    leftover = tmp_path / 'csv_0123456789ab_41.csv'
+    unrelated = tmp_path / 'notas.txt'
+    leftover.write_bytes(b'id\n')
+    unrelated.write_bytes(b'x')
+
+    cache = server.ExportCache(str(tmp_path), 1024 * 1024)
+    assert leftover.exists()
+
+    key = cache.key('csv', None, 42)
+    path = put(cache, key, b'id,phone\n')
+    assert read(cache, key) == b'id,phone\n'
+
+    cache.clear()
+    assert not leftover.exists() and not os.path.exists(path)
+    assert unrelated.exists()
+    assert cache.open(key) is None and cache.total_bytes == 0
+
+
+def test_clear_without_directory(server, tmp_path):
+    cache = server.ExportCache(str(tmp_path / 'sin_crear'), 1024)
+    cache.clear()
+    assert not (tmp_path / 'sin_crear').exists()
+
+
+def test_hits_and_older_versions(server, tmp_path):
+    cache = server.ExportCache(str(tmp_path), 1024)
+    old = put(cache, cache.key('csv', ['NC'], 1), b'v1')
+    other_filter = put(cache, cache.key('csv', None, 1), b'todos')
+
+    put(cache, cache.key('csv', ['NC'], '2'), b'v2')  # contact_seq llega como texto de server_state
+
+    assert read(cache, cache.key('csv', ['NC'], 2)) == b'v2'
+    assert read(cache, cache.key('csv', ['NC'], 3)) is None
+    assert not os.path.exists(old)  # Versión anterior del mismo (formato, filtro)
+    assert os.path.exists(other_filter)
+    # Una secuencia vieja que termina tarde no borra la nueva
+    put(cache, cache.key('csv', ['NC'], 1), b'v1')
+    assert read(cache, cache.key('csv', ['NC'], 2)) == b'v2'
+
+
+def test_eviction_counts_files_of_other_replicas(server, tmp_path):
+    replica_a = server.ExportCache(str(tmp_path), 10)
+    replica_b = server.ExportCache(str(tmp_path), 10)
+    key_a, key_b, key_c = (replica_a.key(fmt, None, 1) for fmt in ('csv', 'ndjson', 'xlsx'))
+
+    path_a = put(replica_a, key_a, b'aaaa')
+    path_b = put(replica_b, key_b, b'bbbb')
+    os.utime(path_a, (1000, 1000))
+    os.utime(path_b, (2000, 2000))
+    assert replica_b.total_bytes == 8
+
+    assert read(replica_b, key_a) == b'aaaa'  # Acierto de lo que guardó la otra réplica: pasa a reciente
+    put(replica_a, key_c, b'cccc')
+
+    assert read(replica_a, key_b) is None  # El de uso más antiguo, aunque lo guardó la otra réplica
+    assert read(replica_b, key_a) == b'aaaa' and read(replica_b, key_c) == b'cccc'
+    assert replica_a.total_bytes == 8
+
+
+def test_open_file_survives_removal_by_other_replica(server, tmp_path):
+    replica_a = server.ExportCache(str(tmp_path), 1024)
+    replica_b = server.ExportCache(str(tmp_path), 1024)
+    key = replica_a.key('csv', None, 7)
+    put(replica_a, key, b'id,phone\n')
+
+    with replica_a.open(key) as f:
+        replica_b.clear()
+        assert f.read() == b'id,phone\n'
+    assert replica_a.open(key) is None
+
+
+def test_put_after_temp_removed_by_clear(server, tmp_path):
+    cache = server.ExportCache(str(tmp_path), 1024)
+    key = cache.key('csv', None, 3)
+    temp_path = cache.temp_path(key)
+    with open(temp_path, 'wb') as f:
+        f.write(b'x')
+    server.ExportCache(str(tmp_path), 1024).clear()
+    assert cache.put(key, temp_path) is None
+
+
+def test_export_endpoint_serves_from_cache(server, api_headers):
+    client = server.app.test_client()
+    first = client.get('/export?format=csv', headers=api_headers)
+    assert first.status_code == 200 and first.data  # Se guarda al terminar el streaming
+    key = server.export_cache.key('csv', None, server.current_contact_seq())
+    assert server.export_cache.contains(key)
+
+    second = client.get('/export?format=csv', headers=api_headers)
+    assert second.status_code == 200 and second.data == first.data
+    xlsx = client.get('/export?format=xlsx', headers=api_headers)
+    assert xlsx.status_code == 200 and xlsx.data[:2] == b'PK'
+    assert server.export_cache.contains(server.export_cache.key('xlsx', None, key[2]))
+    first.close(), second.close(), xlsx.close()
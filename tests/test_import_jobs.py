@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+test_import_jobs.py - /import síncrono responde 201 y avisa a todos con
+bulk_update; /import?async=1: el job se procesa en una pasada, termina en
+done con sus conteos y avisa con import_progress y bulk_update; en la
+primera pasada import_progress estima total_rows por los bytes leídos.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+
+def test_sync_import_notifies_every_client(server, api_headers):
+    client = server.app.test_client()
+    socket = server.socketio.test_client(server.app)  # Sin API key: no está en ninguna sala
+    rows = [{'phone': '8888-3333', 'name': 'Eva'}]
+
+    response = client.post('/import', data=json.dumps(rows), content_type='application/json', headers=api_headers)
+
+    assert response.status_code == 201
+    assert response.get_json()['inserted'] == 1
+    events = [e['args'][0] for e in socket.get_received() if e['name'] == 'bulk_update']
+    assert [e['inserted'] for e in events] == [1]
+    socket.disconnect()
+
+
+def test_async_import_job_ends_done(server, api_headers):
+    client = server.app.test_client()
+    socket = server.socketio.test_client(server.app, headers=api_headers)
+    rows = [{'phone': '8888-1111', 'name': 'Ana'}, {'phone': '88882222', 'name': 'Luis'}, {'phone': 'x', 'name': 'Mal'}]
+
+    response = client.post('/import?async=1', data=json.dumps(rows), content_type='application/json', headers=api_headers)
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    server.process_import_job(job_id)
+
+    job = client.get(f'/import/jobs/{job_id}', headers=api_headers).get_json()
+    assert job['status'] == 'done', job['error']
+    assert (job['inserted'], job['updated'], job['error_count'], job['total_rows']) == (2, 0, 1, 3)
+    with server.engine.connect() as conn:
+        assert conn.execute(server.text("SELECT COUNT(*) FROM contacts")).scalar() == 2
+
+    received = socket.get_received()
+    progress = [e['args'][0] for e in received if e['name'] == 'import_progress']
+    assert progress[0]['bytes_done'] == progress[0]['total_bytes'] > 0
+    assert progress[-1]['status'] == 'done'
+    assert [e['args'][0]['job_id'] for e in received if e['name'] == 'bulk_update'] == [job_id]
+    socket.disconnect()
+
+
+def test_progress_estimates_total_rows_from_spool(server, monkeypatch, tmp_path):
+    emitted = []
+    monkeypatch.setattr(server.socketio, 'emit', lambda event, data, **kwargs: emitted.append((event, data)))
+    spool_path = tmp_path / 'spool'
+    spool_path.write_bytes(b'x' * 1000)
+    job = SimpleNamespace(id='job-1', status='running', rows_done=40, total_rows=None, error_count=0)
+
+    with open(spool_path, 'rb') as spool:
+        spool.seek(250)  # Un cuarto del archivo leído
+        server.emit_import_progress(job, 40, time.time() - 2, ['all'], spool)
+    job.total_rows, job.status = 160, 'done'
+    server.emit_import_progress(job, 40, time.time() - 2, ['all'])
+
+    estimated, final = [data for event, data in emitted if event == 'import_progress']
+    assert (estimated['total_rows'], estimated['total_rows_estimated']) == (160, True)
+    assert (estimated['bytes_done'], estimated['total_bytes']) == (250, 1000)
+    assert 5 <= estimated['eta_seconds'] <= 7  # 120 filas a ~20 filas/s
+    assert (final['total_rows'], final['total_rows_estimated'], final['bytes_done']) == (160, False, None)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+test_import_readers.py - Lectores de /import: producen (fila, error), una
+fila ilegible no corta la importación y la lista JSON se lee por bloques
+sin decodificar un elemento largo una vez por bloque.
+"""
+
+import io
+import json
+
+import pytest
+
+
+def read(server, fmt, body, mapping=None):
+    return list(server.iter_import_rows(io.BytesIO(body), fmt, mapping))
+
+
+def test_json_array_across_small_blocks(server, monkeypatch):
+    monkeypatch.setattr(server, 'IMPORT_READ_SIZE', 3)
+    body = '﻿ [ {"phone": "8888-1111", "name": "Ñandú"} , 12345 ,"x",\n{"telefono": "8888-2222"}]'.encode('utf-8')
+
+    rows = read(server, 'json', body, {'phone': 'telefono'})
+
+    assert rows == [({'name': 'Ñandú'}, None), (12345, None), ('x', None), ({'phone': '8888-2222'}, None)]
+
+
+@pytest.mark.parametrize('body', [b'{"phone": "1"}', b'[{"phone": "1"}', b'[{"phone": "1"} {"phone": "2"}]', b'[{"phone": }]'])
+def test_malformed_json_array_raises(server, body):
+    with pytest.raises(ValueError):
+        read(server, 'json', body)
+
+
+def test_long_element_is_decoded_a_few_times(server, monkeypatch):
+    calls = []
+
+    class CountingDecoder(json.JSONDecoder):
+        def raw_decode(self, s, idx=0):
+            calls.append(len(s) - idx)
+            return super().raw_decode(s, idx)
+
+    monkeypatch.setattr(server.json, 'JSONDecoder', CountingDecoder)
+    monkeypatch.setattr(server, 'IMPORT_READ_SIZE', 64)
+    note = 'n' * 64 * 1000
+    body = json.dumps([{'phone': '8888-1111', 'note': note}]).encode('utf-8')
+
+    rows = read(server, 'json', body)
+
+    assert rows[0][0]['note'] == note
+    assert len(calls) < 20  # Por bloque serían ~1000
+    assert sum(calls) < 4 * len(body)
+
+
+def test_unreadable_rows_become_errors(server):
+    ndjson = b'{"phone": "8888-1111"}\n{malo\n\n{"phone": "8888-2222"}\n'
+    assert read(server, 'ndjson', ndjson) == [({'phone': '8888-1111'}, None), (None, 'JSON inválido'),
+                                              ({'phone': '8888-2222'}, None)]
+    csv_body = 'phone,name,coords\n8888-1111,Ana,\n8888-2222,Luis,{no\n'.encode('utf-8')
+    assert read(server, 'csv', csv_body) == [({'phone': '8888-1111', 'name': 'Ana'}, None),
+                                             (None, 'coords no es JSON válido')]
+
+    db = server.Session()
+    try:
+        importer = server.ContactImporter(db)
+        importer.add_chunk(read(server, 'ndjson', ndjson))
+        importer.commit()
+        result = importer.summary()
+    finally:
+        server.Session.remove()
+    assert (result['inserted'], result['errors']) == (2, ['Row 1: JSON inválido'])
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+test_phone_normalization.py - Motor de teléfonos de phone_utils: ids y
+formatos canónicos, y normalize_phones (lote) con exactamente el mismo
+resultado que validate_phone + normalize_phone fila por fila.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from phone_utils import (
+    PHONE_REGEX, format_dial, format_e164, legacy_phone_id, normalize_phone, normalize_phone_checked, normalize_phones,
+    parse_phone
+)
+
+try:
+    from hypothesis import given, settings, strategies as st
+except ImportError:
+    given = None
+
+# Caracteres de teléfonos reales y casos borde: separadores, +, letras,
+# dígitos y espacios Unicode (que \d y \s aceptan), saltos de línea
+ALPHABET = '0123456789' * 4 + ' -()+' * 3 + '.xA/\t\n\r\x0b\x1c ٣５ '
+
+
+def random_phone(rng):
+    length = rng.choice([0, 1, 5, 6, 7, 8, 10, 11, 12, 14, 20])
+    phone = ''.join(rng.choice(ALPHABET) for _ in range(length))
+    if rng.random() < 0.3:
+        phone = '+' + phone
+    return phone
+
+
+def scalar(phones, pattern=PHONE_REGEX):
+    results = [normalize_phone_checked(p, pattern) for p in phones]
+    return [cid for cid, _ in results], [error for _, error in results]
+
+
+def test_known_numbers():
+    """Ejemplos documentados en normalize_phone"""
+    ids, errors = normalize_phones(['+506-5123-4567', '555-123-4567', '(506) 8888 1111', '123', '', None, '+ - ( ) - ', '( - - - )'])
+    assert ids[:3] == ['51234567', '15551234567', '88881111']
+    assert errors[:3] == [None, None, None]
+    assert ids[3:] == [None, None, None, None, None]
+    assert errors[3].startswith('Teléfono no cumple formato')
+    assert errors[4] == errors[5] == 'Teléfono inválido: debe ser una cadena'
+    assert errors[6] == errors[7] == 'Teléfono no válido o vacío'
+
+
+def test_same_number_same_id():
+    """Las variantes de un mismo número dan el mismo id, E.164 y marcado"""
+    variants = ['+506 8888-1111', '+50688881111', '50688881111', '8888-1111', '(506) 8888 1111', '00506 8888 1111']
+    assert {normalize_phone(v) for v in variants} == {'88881111'}
+    assert {format_e164(v) for v in variants} == {'+50688881111'}
+    assert {format_dial(v) for v in variants} == {'88881111'}
+
+
+def test_foreign_numbers_keep_country_code():
+    """Los números extranjeros conservan el código de país (antes se cortaban 3 dígitos)"""
+    assert parse_phone('+1-555-123-4567') == ('1', '5551234567')
+    assert normalize_phone('+1-555-123-4567') == normalize_phone('15551234567') == '15551234567'
+    assert normalize_phone('+34 612 345 678') == '34612345678'
+    assert format_e164('+44 20 7946 0958') == '+442079460958'
+    assert format_dial('+34 612 345 678') == '0034612345678'
+    assert normalize_phone('') == format_e164(None) == ''
+
+
+def test_nanp_without_plus_same_id():
+    """Un número de NANP da el mismo id con +1, con 1 o sin código"""
+    variants = ['+1 555 123 4567', '+1-555-123-4567', '1-555-123-4567', '555-123-4567', '(555) 123-4567']
+    assert {normalize_phone(v) for v in variants} == {'15551234567'}
+    assert {format_dial(v) for v in variants} == {'0015551234567'}
+
+
+def test_legacy_ids():
+    """Ids de la regla anterior (para migrar filas existentes)"""
+    assert legacy_phone_id('50688881111') == '50688881111'
+    assert legacy_phone_id('+1-555-123-4567') == '51234567'
+    assert legacy_phone_id('+506 8888-1111') == '88881111'
+    assert legacy_phone_id('555-123-4567') == '5551234567'
+
+
+def test_random_equivalence():
+    """50.000 cadenas aleatorias (semilla fija): lote == fila por fila"""
+    rng = random.Random(20240501)
+    phones = [random_phone(rng) for _ in range(50000)]
+    assert normalize_phones(phones) == scalar(phones)
+
+
+def test_non_string_values():
+    """Valores que no son cadenas usan el camino por fila"""
+    phones = [12345678, 5.5, b'88881111', ['8888'], {}]
+    assert normalize_phones(phones) == scalar(phones)
+
+
+def test_custom_pattern():
+    """Con una regex distinta a la de defecto no se usa el atajo"""
+    pattern = r'^\d{8}$'
+    phones = ['88881111', '8888-1111', '+50688881111', '888811112']
+    assert normalize_phones(phones, pattern) == scalar(phones, pattern)
+
+
+if given is not None:
+    @settings(max_examples=2000)
+    @given(st.lists(st.one_of(
+        st.text(),
+        st.text(alphabet=ALPHABET),
+        st.from_regex(PHONE_REGEX, fullmatch=True),
+    ), max_size=50))
+    def test_property_equivalence(phones):
+        """Propiedad: para cualquier lista, lote == fila por fila"""
+        assert normalize_phones(phones) == scalar(phones)
+
+
+if __name__ == '__main__':
+    test_known_numbers()
+    test_same_number_same_id()
+    test_foreign_numbers_keep_country_code()
+    test_nanp_without_plus_same_id()
+    test_legacy_ids()
+    test_random_equivalence()
+    test_non_string_values()
+    test_custom_pattern()
+    print("✅ phone_utils: ids canónicos y lote equivalente a la versión por fila")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+test_phone_rekey.py - rekey_contact_phone_ids: los contactos guardados con
+la regla de ids anterior pasan al id canónico una sola vez, fusionando los
+duplicados y dejando lápida de los ids viejos.
+"""
+
+from datetime import datetime, timedelta
+
+
+def insert_contact(conn, server, contact_id, phone, age_days=0, **values):
+    ts = datetime.utcnow() - timedelta(days=age_days)
+    conn.execute(server.Contact.__table__.insert().values(
+        id=contact_id, phone=phone, name=f'Contacto {contact_id}', status=values.pop('status', 'SIN GESTIONAR'),
+        note=values.pop('note', ''), created_at=ts, updated_at=ts, last_visibility_time=ts, version=1, seq=0, **values
+    ))
+
+
+def test_legacy_ids_are_rekeyed_and_merged(server):
+    with server.engine.begin() as conn:
+        # Guardado con la regla vieja (506 sin + quedaba entero) y luego reimportado como 8888-1111
+        insert_contact(conn, server, '50688881111', '50688881111', age_days=10, note='Llamar en la tarde',
+                       status='INTERESADO', assigned_to_user_id='u1')
+        insert_contact(conn, server, '88881111', '8888-1111', age_days=1)
+        # La regla vieja cortaba 3 dígitos tras el +
+        insert_contact(conn, server, '51234567', '+1-555-123-4567')
+        # Cadena: el id nuevo de una fila es el viejo de otra
+        insert_contact(conn, server, '88883333', '+12388883333')
+        insert_contact(conn, server, '50688883333', '50688883333')
+        # Id que no salió del teléfono: no se toca
+        insert_contact(conn, server, 'manual-1', '50688882222')
+        conn.execute(server.CallLog.__table__.insert().values(
+            id='call-1', user_id='u1', contact_id='50688881111', start_time=datetime.utcnow()
+        ))
+        conn.execute(server.text("DELETE FROM server_state WHERE key = 'phone_id_scheme'"))
+        seq_before = int(server.get_server_state(conn, 'contact_seq', 0))
+
+        server.rekey_contact_phone_ids(conn)
+
+    with server.engine.connect() as conn:
+        rows = {row.id: row for row in conn.execute(server.text("SELECT * FROM contacts"))}
+        assert sorted(rows) == ['12388883333', '15551234567', '88881111', '88883333', 'manual-1']
+        merged = rows['88881111']
+        assert (merged.phone, merged.note, merged.status, merged.assigned_to_user_id) == \
+            ('8888-1111', 'Llamar en la tarde', 'INTERESADO', 'u1')
+        assert merged.priority == server.status_priority('INTERESADO')
+        assert rows['88883333'].phone == '50688883333'
+        assert all(row.seq > seq_before for cid, row in rows.items() if cid != 'manual-1')
+
+        tombstones = {row[0] for row in conn.execute(server.text("SELECT id FROM contact_tombstones"))}
+        assert tombstones == {'50688881111', '51234567', '50688883333'}
+        assert conn.execute(server.text("SELECT contact_id FROM call_logs WHERE id = 'call-1'")).scalar() == '88881111'
+        conn.execute(server.text("DELETE FROM call_logs WHERE id = 'call-1'"))
+        conn.commit()
+
+    with server.engine.begin() as conn:
+        server.rekey_contact_phone_ids(conn)  # Ya migrado: no hace nada
+        assert int(server.get_server_state(conn, 'contact_seq')) == max(row.seq for row in rows.values())
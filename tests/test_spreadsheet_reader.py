@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+test_spreadsheet_reader.py - Lectura de archivos a importar en el cliente:
+cabecera en la primera fila no vacía, celdas y filas vacías omitidas,
+teléfonos numéricos sin ".0" y CSV con BOM.
+"""
+
+import json
+
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from client.spreadsheet_reader import open_import_file
+
+
+def write_xlsx(path, rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def test_xlsx_header_empty_cells_and_numeric_phones(tmp_path):
+    path = tmp_path / 'contactos.xlsx'
+    write_xlsx(path, [
+        [None, None, None],  # Filas vacías antes de la cabecera
+        [],
+        [' phone ', 'name', None, 'note', 'reminder'],
+        [88881111.0, ' Ana ', 'sin columna', None, datetime(2026, 1, 5, 9, 30)],
+        [None, None, None, None, None],  # Fila vacía entre datos
+        ['8888-2222', 'Luis', None, '  ', None],
+        [50688883333, 'María', None, 'Llamar', None],
+    ])
+
+    rows, total = open_import_file(str(path))
+    rows = list(rows)
+
+    assert rows == [
+        {'phone': 88881111, 'name': 'Ana', 'reminder': '2026-01-05T09:30:00'},
+        {'phone': '8888-2222', 'name': 'Luis'},
+        {'phone': 50688883333, 'name': 'María', 'note': 'Llamar'},
+    ]
+    assert isinstance(rows[0]['phone'], int)
+    assert total == 6  # Según la dimensión de la hoja, que cuenta las filas vacías
+
+
+def test_csv_with_bom_and_empty_rows(tmp_path):
+    path = tmp_path / 'contactos.csv'
+    path.write_bytes('\ufeffphone,name,note\n8888-1111,Ana,\n,,\n 8888-2222 , Luis ,Llamar\n\n'.encode('utf-8'))
+
+    rows, total = open_import_file(str(path))
+
+    assert list(rows) == [{'phone': '8888-1111', 'name': 'Ana'}, {'phone': '8888-2222', 'name': 'Luis', 'note': 'Llamar'}]
+    assert total == 2
+
+
+def test_json_list_and_dict(tmp_path):
+    as_list = tmp_path / 'lista.json'
+    as_list.write_text(json.dumps([{'phone': '8888-1111'}, {'phone': '8888-2222'}]), encoding='utf-8')
+    as_dict = tmp_path / 'dict.json'
+    as_dict.write_text(json.dumps({'a': {'phone': '8888-1111'}}), encoding='utf-8')
+
+    rows, total = open_import_file(str(as_list))
+    assert (list(rows), total) == ([{'phone': '8888-1111'}, {'phone': '8888-2222'}], 2)
+    rows, total = open_import_file(str(as_dict))
+    assert (list(rows), total) == ([{'phone': '8888-1111'}], 1)
+
+
+def test_unsupported_extension(tmp_path):
+    with pytest.raises(ValueError, match='.txt'):
+        open_import_file(str(tmp_path / 'contactos.txt'))